@@ -14,5 +14,5 @@ async def trigger_epg_update(
     db: orm.Session = fastapi.Depends(get_db),
     current_user: User = fastapi.Depends(get_current_user)
 ):
-    await update_epg_task(db)
+    await update_epg_task(db, force=True)
     return {"message": "EPG update task completed successfully"}
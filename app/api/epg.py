@@ -1,11 +1,22 @@
+from typing import Optional
+
 import sqlalchemy.orm as orm
-from fastapi import APIRouter, Request, HTTPException, Depends
+from fastapi import APIRouter, Request, HTTPException, Depends, Query
 
+from app.models.programme import listing_categories
 from app.schemas.user import User
+from app.services.cache_manager import get_cache_usage
 from app.services.data import user_data_services as user_services
+from app.services.data.epg_data_services import get_categories_for_server
 from app.services.data.epg_data_services import get_channel_by_xmltv_id
-from app.services.data.epg_data_services import get_programmes_for_channel
+from app.services.data.epg_data_services import get_programme_grid
+from app.services.data.epg_data_services import get_programme_listing
+from app.services.data.epg_data_services import get_programmes_by_category
+from app.services.data.epg_data_services import get_programmes_by_person
+from app.services.data.epg_data_services import get_series_airings
+from app.services.data.epg_data_services import search_programmes
 from app.services.db_factory import get_db
+from app.services.epg_shards import epg_session
 from app.services.logger import get_logger
 from app.utils.XTream import XTream
 
@@ -27,10 +38,56 @@ def __get_provider(request: Request):
     return XTream(server, username, password)
 
 
+def get_epg_db(
+    current_user: User = Depends(user_services.get_current_user),
+    db: orm.Session = Depends(user_services.get_read_db)
+):
+    """Session on the database holding the current user's guides, see EPG_SHARDS."""
+    with epg_session(current_user.id, db) as epg_db:
+        yield epg_db
+
+
+def _listing_result(programme) -> dict:
+    return {
+        "start": programme.start_time,
+        "stop": programme.stop_time,
+        "title": programme.title or "",
+        "description": programme.description or "",
+        "categories": listing_categories(programme.categories),
+        "series_key": programme.series_key,
+        "season": programme.season,
+        "episode": programme.episode,
+    }
+
+
+def _channel_result(channel) -> dict:
+    display_names = channel.get_display_names()
+    icons = channel.get_icons()
+    return {
+        "id": channel.xmltv_id,
+        "name": display_names[0].get("text") if display_names else channel.xmltv_id,
+        "icon": icons[0].get("src") if icons else None,
+    }
+
+
+def _programme_result(programme, channel) -> dict:
+    return {
+        "start": programme.start_time,
+        "stop": programme.stop_time,
+        "title": programme.get_default_title(),
+        "description": programme.get_default_description(),
+        "categories": programme.get_categories(),
+        "series_key": programme.series_key,
+        "season": programme.season,
+        "episode": programme.episode,
+        "channel": _channel_result(channel),
+    }
+
+
 @router.get("/")
 async def get_epg_overview(
     current_user: User = Depends(user_services.get_current_user),
-    db: orm.Session = Depends(get_db)
+    db: orm.Session = Depends(user_services.get_read_db)
 ):
     """Get EPG overview for current user."""
     logger.info(f"GET /epg - Fetching EPG overview for user {current_user.email}")
@@ -66,6 +123,19 @@ async def refresh_epg_data(
         raise HTTPException(status_code=500, detail="Failed to refresh EPG")
 
 
+@router.get("/cache")
+async def get_epg_cache_usage(
+    current_user: User = Depends(user_services.get_current_user)
+):
+    """Report disk usage of the current user's downloaded EPG feeds."""
+    logger.info(f"GET /epg/cache - Fetching EPG cache usage for user {current_user.email}")
+    try:
+        return get_cache_usage(current_user.id)
+    except Exception as e:
+        logger.error(f"Failed to get EPG cache usage: {e}")
+        raise HTTPException(status_code=500, detail="Failed to retrieve EPG cache usage")
+
+
 @router.get("/channel/{channel_id}")
 async def get_epg_for_channel(
     channel_id: str,
@@ -112,8 +182,10 @@ async def get_channel_listing_from_epg(
     server_id: str,
     channel_id: str,
     request: Request,
+    start: Optional[int] = None,
+    end: Optional[int] = None,
     current_user: User = Depends(user_services.get_current_user),
-    db: orm.Session = Depends(get_db)
+    db: orm.Session = Depends(get_epg_db)
 ):
     logger.info(f"GET /listing/{server_id}/{channel_id} - Fetching EPG listings for user {current_user.email}")
     try:
@@ -123,20 +195,11 @@ async def get_channel_listing_from_epg(
             logger.warning(f"Channel not found: {channel_id} for user {current_user.email}, server {server_id}")
             raise HTTPException(status_code=404, detail="Channel not found")
 
-        # Get programmes for this channel
-        programmes = await get_programmes_for_channel(channel.id, db)
+        # Get programmes for this channel, start/end are UTC epoch seconds
+        programmes = await get_programme_listing(channel.id, db, start_time=start, end_time=end)
 
         # Convert to response format
-        sorted_listings = []
-        for programme in programmes:
-            listing = {
-                "start": programme.start_time,
-                "stop": programme.stop_time,
-                "title": programme.get_default_title(),
-                "description": programme.get_default_description(),
-                "categories": programme.get_categories() or []
-            }
-            sorted_listings.append(listing)
+        sorted_listings = [_listing_result(programme) for programme in programmes]
 
         logger.info(f"Successfully retrieved {len(sorted_listings)} EPG listings for channel {channel_id}")
         return sorted_listings
@@ -145,6 +208,142 @@ async def get_channel_listing_from_epg(
         raise HTTPException(status_code=500, detail="Failed to retrieve EPG listings")
 
 
+@router.get("/grid/{server_id}")
+async def get_guide_grid(
+    server_id: str,
+    start: Optional[int] = None,
+    hours: int = Query(4, ge=1, le=24),
+    channels: Optional[list[str]] = Query(None),
+    limit: int = Query(200, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    current_user: User = Depends(user_services.get_current_user),
+    db: orm.Session = Depends(get_epg_db)
+):
+    """Programmes overlapping a window of hours from start (UTC epoch seconds) on a page of a server's channels."""
+    logger.info(f"GET /grid/{server_id} - Fetching guide grid for user {current_user.email}")
+    try:
+        grid = await get_programme_grid(current_user.id, server_id, db, start=start, hours=hours, channels=channels,
+                                        limit=limit, offset=offset)
+        results = [{
+            "channel": _channel_result(channel),
+            "programmes": [_listing_result(programme) for programme in programmes],
+        } for channel, programmes in grid["results"]]
+        return {"total": grid["total"], "limit": limit, "offset": offset, "results": results}
+    except Exception as e:
+        logger.error(f"Failed to get guide grid for server {server_id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to retrieve guide grid")
+
+
+@router.get("/category/{server_id}")
+async def get_server_categories(
+    server_id: str,
+    current_user: User = Depends(user_services.get_current_user),
+    db: orm.Session = Depends(get_epg_db)
+):
+    """List the categories of a server's guide with their number of current and upcoming programmes."""
+    logger.info(f"GET /category/{server_id} - Fetching programme categories for user {current_user.email}")
+    try:
+        categories = await get_categories_for_server(current_user.id, server_id, db)
+        return [{"name": name, "programmes": count} for name, count in categories]
+    except Exception as e:
+        logger.error(f"Failed to get programme categories for server {server_id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to retrieve programme categories")
+
+
+@router.get("/category/{server_id}/{category}")
+async def get_category_programmes(
+    server_id: str,
+    category: str,
+    hours: int = Query(3, ge=1, le=48),
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+    current_user: User = Depends(user_services.get_current_user),
+    db: orm.Session = Depends(get_epg_db)
+):
+    """Programmes of a category on now or within the next hours, across all channels of a server."""
+    logger.info(f"GET /category/{server_id}/{category} - Fetching programmes for user {current_user.email}")
+    try:
+        found = await get_programmes_by_category(current_user.id, server_id, category, db, hours=hours,
+                                                 limit=limit, offset=offset)
+        results = [_programme_result(programme, channel) for programme, channel in found["results"]]
+        return {"total": found["total"], "limit": limit, "offset": offset, "results": results}
+    except Exception as e:
+        logger.error(f"Failed to get {category} programmes for server {server_id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to retrieve category programmes")
+
+
+@router.get("/people/{server_id}")
+async def get_person_programmes(
+    server_id: str,
+    name: str = Query(..., min_length=2, max_length=200),
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+    current_user: User = Depends(user_services.get_current_user),
+    db: orm.Session = Depends(get_epg_db)
+):
+    """Upcoming programmes on a server's channels crediting people whose name starts with name."""
+    logger.info(f"GET /people/{server_id} - Fetching programmes featuring '{name}' for user {current_user.email}")
+    try:
+        found = await get_programmes_by_person(current_user.id, server_id, name, db, limit=limit, offset=offset)
+        results = []
+        for programme, channel, person, role, character in found["results"]:
+            result = _programme_result(programme, channel)
+            result["person"] = {"name": person, "role": role, "character": character}
+            results.append(result)
+        return {"total": found["total"], "limit": limit, "offset": offset, "results": results}
+    except Exception as e:
+        logger.error(f"Failed to get programmes featuring '{name}' for server {server_id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to retrieve programmes")
+
+
+@router.get("/series/{series_key}")
+async def get_series(
+    series_key: str,
+    server_id: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=50),
+    new_only: bool = False,
+    current_user: User = Depends(user_services.get_current_user),
+    db: orm.Session = Depends(get_epg_db)
+):
+    """Next airings of a series on the user's channels, optionally only new episodes."""
+    logger.info(f"GET /series/{series_key} - Fetching airings for user {current_user.email}")
+    try:
+        airings = await get_series_airings(current_user.id, series_key, db, server_id=server_id, limit=limit,
+                                           new_only=new_only)
+        results = []
+        for programme, channel in airings:
+            result = _programme_result(programme, channel)
+            result["new"] = bool(programme.new)
+            results.append(result)
+        return results
+    except Exception as e:
+        logger.error(f"Failed to get airings of series {series_key}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to retrieve series airings")
+
+
+@router.get("/search")
+async def search_epg(
+    q: str = Query(..., min_length=1, max_length=200),
+    server_id: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    current_user: User = Depends(user_services.get_current_user),
+    db: orm.Session = Depends(get_epg_db)
+):
+    """Search the titles and descriptions of upcoming programmes on the user's channels."""
+    logger.info(f"GET /epg/search - Searching EPG for '{q}' for user {current_user.email}")
+    try:
+        found = await search_programmes(current_user.id, q, db, server_id=server_id, limit=limit, offset=offset)
+
+        results = [_programme_result(programme, channel) for programme, channel in found["results"]]
+
+        logger.info(f"EPG search for '{q}' matched {found['total']} programmes")
+        return {"total": found["total"], "limit": limit, "offset": offset, "results": results}
+    except Exception as e:
+        logger.error(f"Failed to search EPG for '{q}': {e}")
+        raise HTTPException(status_code=500, detail="Failed to search EPG")
+
+
 @router.get("/channel/url/{program_id}")
 async def get_live_stream(program_id: str, request: Request):
     logger.info(f"GET /channel/url/{program_id} - Fetching live stream URL")
@@ -108,7 +108,7 @@ async def generate_token(
 
 @router.get("/servers", response_model=list[server_schema.Server])
 async def get_servers(user: schema.User = fastapi.Depends(services.get_current_user),
-                      db: orm.Session = fastapi.Depends(get_db)):
+                      db: orm.Session = fastapi.Depends(services.get_read_db)):
     logger.info(f"GET /user/servers - Fetching servers for user: {user.email}")
     try:
         servers = await services.get_user_servers(user.id, db)
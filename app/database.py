@@ -1,19 +1,83 @@
 import os
+import sqlite3
+from typing import Any, Dict, List, Tuple
 
 import sqlalchemy as sa
 import sqlalchemy.ext.declarative as declarative
 import sqlalchemy.orm as orm
 
+from app.services.config import settings
+
 # Get the absolute path to the app directory
 APP_DIR = os.path.dirname(os.path.abspath(__file__))
 DEFAULT_DB_PATH = os.path.join(APP_DIR, "xtreamium.db")
 
 DATABASE_URL = os.environ.get('DATABASE_URL') or f"sqlite:///{DEFAULT_DB_PATH}"
-engine = sa.create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False}
-)
+
+# Oldest SQLite the EPG imports run on, they rely on INSERT ... RETURNING (3.35)
+# and UPDATE ... FROM (3.33)
+MIN_SQLITE_VERSION = (3, 35, 0)
+
+
+def check_sqlite_version(version: Tuple[int, ...] = sqlite3.sqlite_version_info) -> None:
+    """Refuse to run on a SQLite library older than MIN_SQLITE_VERSION"""
+    if tuple(version) < MIN_SQLITE_VERSION:
+        raise RuntimeError(f"SQLite {'.'.join(map(str, MIN_SQLITE_VERSION))} or newer is required, "
+                           f"found {'.'.join(map(str, version))}")
+
+
+def sqlite_profile_pragmas() -> List[str]:
+    """PRAGMA statements for the configured SQLite performance profile"""
+    return [
+        # Must come before any table is created
+        f"PRAGMA auto_vacuum={settings.SQLITE_AUTO_VACUUM}",
+        f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}",
+        f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}",
+        f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}",
+        # Negative values are in KiB rather than pages
+        f"PRAGMA cache_size=-{int(settings.SQLITE_CACHE_SIZE_KB)}",
+        f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}",
+        f"PRAGMA temp_store={settings.SQLITE_TEMP_STORE}",
+    ]
+
+
+def apply_sqlite_profile(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in sqlite_profile_pragmas():
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
+
+
+def engine_options(url: str) -> Dict[str, Any]:
+    """create_engine arguments for the backend the URL points at"""
+    if sa.engine.make_url(url).get_backend_name() == "sqlite":
+        # Sessions are shared with the background tasks' threads
+        return {"connect_args": {"check_same_thread": False}}
+    return {
+        "pool_size": settings.DATABASE_POOL_SIZE,
+        "max_overflow": settings.DATABASE_MAX_OVERFLOW,
+        "pool_timeout": settings.DATABASE_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DATABASE_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": settings.DATABASE_POOL_PRE_PING,
+    }
+
+
+def create_engine(url: str) -> sa.engine.Engine:
+    engine = sa.create_engine(url, **engine_options(url))
+    if engine.dialect.name == "sqlite":
+        check_sqlite_version()
+        if settings.SQLITE_PROFILE_ENABLED:
+            sa.event.listen(engine, "connect", apply_sqlite_profile)
+    return engine
+
+
+engine = create_engine(DATABASE_URL)
+# Replica serving read-only endpoints, the primary itself unless DATABASE_READ_URL is set
+read_engine = create_engine(settings.DATABASE_READ_URL) if settings.DATABASE_READ_URL else engine
 
 SessionLocal = orm.sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = orm.sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
 Base = declarative.declarative_base()
@@ -1,7 +1,16 @@
+from .category import Category
 from .channel import Channel
+from .db_maintenance import DBMaintenance
 from .epg import EPG
+from .epg_import import EPGImport
+from .epg_source import EPGSource, EPGSourceSubscription
+from .person import Person
 from .programme import Programme
+from . import programme_bucket  # noqa: F401 - registers the grid bucket table
+from . import programme_search  # noqa: F401 - registers the search index DDL
+from .refresh_schedule import RefreshSchedule
 from .server import Server
 from .user import User
 
-__all__ = ["User", "Server", "EPG", "Channel", "Programme"]
+__all__ = ["User", "Server", "EPG", "EPGImport", "EPGSource", "EPGSourceSubscription", "Category", "Channel",
+           "DBMaintenance", "Person", "Programme", "RefreshSchedule"]
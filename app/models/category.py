@@ -0,0 +1,36 @@
+import sqlalchemy as sa
+
+from app import database
+from app.models.programme import cascade_programme_deletes
+
+
+# Category names of an EPG source. Programmes refer to them by integer code so
+# the programme_categories index stays small
+class Category(database.Base):
+    class Config:
+        from_attributes = True
+
+    __tablename__ = "categories"
+
+    id = sa.Column(sa.Integer, primary_key=True)
+    source_id = sa.Column(sa.String(36), sa.ForeignKey("epg_sources.id"), nullable=False)
+    name = sa.Column(sa.String, nullable=False)
+
+    __table_args__ = (
+        sa.UniqueConstraint("source_id", "name", name="uq_category_source_name"),
+    )
+
+
+# Programme -> category index, filled when an import is published. The
+# programme's times are copied in (a missing stop time as the start time) so
+# genre listings are answered from the (category_id, stop_epoch) index alone.
+programme_categories = sa.Table(
+    "programme_categories", database.Base.metadata,
+    sa.Column("programme_id", sa.Integer, sa.ForeignKey("programmes.id", ondelete="CASCADE"), primary_key=True),
+    sa.Column("category_id", sa.Integer, sa.ForeignKey("categories.id"), primary_key=True),
+    sa.Column("start_epoch", sa.BigInteger, nullable=False),
+    sa.Column("stop_epoch", sa.BigInteger, nullable=False),
+    sa.Index("idx_programme_categories_time", "category_id", "stop_epoch", "start_epoch", "programme_id"),
+)
+
+cascade_programme_deletes(programme_categories)
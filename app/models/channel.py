@@ -17,8 +17,10 @@ class Channel(database.Base):
     id = sa.Column(sa.Integer, primary_key=True, index=True)
 
     # Foreign keys
-    user_id = sa.Column(sa.String(36), sa.ForeignKey("users.id"), nullable=False)
-    server_id = sa.Column(sa.Integer, sa.ForeignKey("servers.id"), nullable=False)
+    source_id = sa.Column(sa.String(36), sa.ForeignKey("epg_sources.id"), nullable=True, index=True)
+    # Owner of channels stored before EPG sources were shared, unset for new channels
+    user_id = sa.Column(sa.String(36), sa.ForeignKey("users.id"), nullable=True)
+    server_id = sa.Column(sa.String(36), sa.ForeignKey("servers.id"), nullable=True)
 
     # Channel identification
     xmltv_id = sa.Column(sa.String, nullable=False, index=True)  # The original channel ID from XMLTV
@@ -31,14 +33,18 @@ class Channel(database.Base):
     # Metadata
     date_created = sa.Column(sa.DateTime, default=dt.datetime.now(dt.timezone.utc))
     date_last_updated = sa.Column(sa.DateTime, default=dt.datetime.now(dt.timezone.utc))
+    # When the channel was last part of a published import, used by the retention job
+    last_seen_at = sa.Column(sa.DateTime, nullable=True, index=True)
 
     # Relationships
+    source = orm.relationship("EPGSource")
     user = orm.relationship("User")
     server = orm.relationship("Server")
     programmes = orm.relationship("Programme", back_populates="channel", cascade="all, delete-orphan")
 
     # Composite unique constraint to prevent duplicates
     __table_args__ = (
+        sa.UniqueConstraint('source_id', 'xmltv_id', name='uq_channel_source_xmltv'),
         sa.UniqueConstraint('user_id', 'server_id', 'xmltv_id', name='uq_channel_user_server_xmltv'),
     )
 
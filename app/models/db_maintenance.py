@@ -0,0 +1,25 @@
+import sqlalchemy as sa
+
+from app import database
+
+
+# Single row tracking how much EPG data changed since planner statistics were
+# last refreshed, and how the last maintenance run went
+class DBMaintenance(database.Base):
+    class Config:
+        from_attributes = True
+
+    __tablename__ = "db_maintenance"
+
+    id = sa.Column(sa.Integer, primary_key=True)
+    # Programme rows inserted, updated or deleted since the last run
+    rows_changed = sa.Column(sa.BigInteger, nullable=False, default=0)
+
+    last_run_at = sa.Column(sa.DateTime, nullable=True)
+    last_duration_seconds = sa.Column(sa.Float, nullable=True)
+    last_rows_changed = sa.Column(sa.BigInteger, nullable=True)
+    last_reindexed = sa.Column(sa.Boolean, nullable=True)
+
+    # EPG_PACK_COLD_FIELDS as of the last time every programme was converted to
+    # it, None if they never were. See convert_cold_fields
+    cold_fields_packed = sa.Column(sa.Boolean, nullable=True)
@@ -0,0 +1,51 @@
+import datetime as dt
+import uuid
+
+import sqlalchemy as sa
+
+from app import database
+from app.models.programme import IMPORT_STATE_COLUMNS, Programme
+
+
+class EPGImport(database.Base):
+    class Config:
+        from_attributes = True
+
+    __tablename__ = "epg_imports"
+
+    id = sa.Column(sa.String(36), primary_key=True, index=True, default=lambda: str(uuid.uuid4()))
+    user_id = sa.Column(sa.String(36), nullable=False)
+    server_id = sa.Column(sa.String(36), nullable=False)
+
+    # loading -> published | failed. Published makes the programmes the import
+    # added visible and hides the ones it retired, see store_epg_stream. Staged
+    # rows are garbage collected once finished
+    status = sa.Column(sa.String(16), nullable=False, default="loading", index=True)
+
+    started_at = sa.Column(sa.DateTime, default=lambda: dt.datetime.now(dt.timezone.utc))
+    finished_at = sa.Column(sa.DateTime, nullable=True)
+
+
+# Channels touched by an import, their programmes are replaced when it is published
+epg_import_channels = sa.Table(
+    "epg_import_channels", database.Base.metadata,
+    sa.Column("import_id", sa.String(36), primary_key=True),
+    sa.Column("channel_id", sa.Integer, primary_key=True),
+)
+
+# Staged programmes, mirroring the programmes table but for the import state
+# columns. action is one of
+#   insert - a new programme
+#   update - replaces programme_id with a new row
+#   keep   - programme_id is unchanged, only programme_id is set
+epg_import_programmes = sa.Table(
+    "epg_import_programmes", database.Base.metadata,
+    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("import_id", sa.String(36), nullable=False),
+    sa.Column("action", sa.String(8), nullable=False),
+    sa.Column("programme_id", sa.Integer, nullable=True),
+    *[sa.Column(column.name, column.type, nullable=True)
+      for column in Programme.__table__.columns if column.name not in ("id", *IMPORT_STATE_COLUMNS)],
+    sa.Index("idx_epg_import_programmes_action", "import_id", "action"),
+    sa.Index("idx_epg_import_programmes_programme", "import_id", "programme_id"),
+)
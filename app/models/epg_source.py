@@ -0,0 +1,45 @@
+import datetime as dt
+import uuid
+
+import sqlalchemy as sa
+from sqlalchemy import orm as orm
+
+from app import database
+
+
+# A distinct EPG feed, its channels and programmes are stored once and shared by all subscribers
+class EPGSource(database.Base):
+    class Config:
+        from_attributes = True
+
+    __tablename__ = "epg_sources"
+
+    id = sa.Column(sa.String(36), primary_key=True, index=True, default=lambda: str(uuid.uuid4()))
+    # Feed URL, or a private "<user_id>/<server_id>" key for servers without one
+    url = sa.Column(sa.String, nullable=False, unique=True)
+
+    # Hash of the last imported feed, lets other subscribers skip re-importing it
+    content_hash = sa.Column(sa.String(64), nullable=True)
+    last_imported_at = sa.Column(sa.DateTime, nullable=True)
+    # Latest programme end time (UTC) of the last imported feed
+    horizon_end = sa.Column(sa.DateTime, nullable=True)
+
+    date_created = sa.Column(sa.DateTime, default=lambda: dt.datetime.now(dt.timezone.utc))
+
+    subscriptions = orm.relationship("EPGSourceSubscription", back_populates="source")
+
+
+# Maps a user's server to the EPG source its guide is read from
+class EPGSourceSubscription(database.Base):
+    class Config:
+        from_attributes = True
+
+    __tablename__ = "epg_source_subscriptions"
+
+    user_id = sa.Column(sa.String(36), sa.ForeignKey("users.id"), primary_key=True)
+    server_id = sa.Column(sa.String(36), sa.ForeignKey("servers.id"), primary_key=True)
+    source_id = sa.Column(sa.String(36), sa.ForeignKey("epg_sources.id"), nullable=False, index=True)
+
+    date_created = sa.Column(sa.DateTime, default=lambda: dt.datetime.now(dt.timezone.utc))
+
+    source = orm.relationship("EPGSource", back_populates="subscriptions")
@@ -0,0 +1,45 @@
+import sqlalchemy as sa
+
+from app import database
+from app.models.programme import cascade_programme_deletes
+
+
+def person_key(name: str) -> str:
+    """Case-folded form of a name that prefix searches compare against"""
+    return " ".join(name.split()).casefold()
+
+
+# Cast and crew named in an EPG source's programme credits
+class Person(database.Base):
+    class Config:
+        from_attributes = True
+
+    __tablename__ = "people"
+
+    id = sa.Column(sa.Integer, primary_key=True)
+    source_id = sa.Column(sa.String(36), sa.ForeignKey("epg_sources.id"), nullable=False)
+    name = sa.Column(sa.String, nullable=False)
+    # person_key(name), for case-insensitive prefix searches on the index
+    name_key = sa.Column(sa.String, nullable=False)
+
+    __table_args__ = (
+        sa.UniqueConstraint("source_id", "name", name="uq_person_source_name"),
+        sa.Index("idx_people_source_key", "source_id", "name_key"),
+    )
+
+
+# Programme -> person index with the credit type (director, actor, ...) as
+# role and an actor's character, filled when an import is published. Times are
+# copied in as for programme_categories.
+programme_people = sa.Table(
+    "programme_people", database.Base.metadata,
+    sa.Column("programme_id", sa.Integer, sa.ForeignKey("programmes.id", ondelete="CASCADE"), primary_key=True),
+    sa.Column("person_id", sa.Integer, sa.ForeignKey("people.id"), primary_key=True),
+    sa.Column("role", sa.String(16), primary_key=True),
+    sa.Column("character", sa.String, nullable=True),
+    sa.Column("start_epoch", sa.BigInteger, nullable=False),
+    sa.Column("stop_epoch", sa.BigInteger, nullable=False),
+    sa.Index("idx_programme_people_time", "person_id", "stop_epoch", "start_epoch", "programme_id"),
+)
+
+cascade_programme_deletes(programme_people)
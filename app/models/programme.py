@@ -1,10 +1,135 @@
 import datetime as dt
+import functools
+import hashlib
 import json
+import zlib
+from typing import Dict, Optional, Tuple
 
 import sqlalchemy as sa
 from sqlalchemy import orm as orm
 
 from app import database
+from app.utils.episode_nums import season_episode
+
+# Rarely read JSON fields that can live in packed_fields instead of their own columns
+COLD_FIELDS = (
+    'credits', 'keywords', 'language', 'orig_language', 'length', 'icons', 'urls', 'countries',
+    'video', 'audio', 'previously_shown', 'premiere', 'last_chance', 'subtitles', 'ratings',
+    'star_ratings', 'reviews', 'images',
+)
+
+
+# Separates the category names in category_text
+CATEGORY_SEPARATOR = "\n"
+
+# Columns listings are built from. Categories are kept as their JSON objects,
+# which are short, so listings still return each category's lang
+LISTING_FIELDS = (
+    'channel_id', 'start_time', 'stop_time', 'title', 'description', 'categories', 'series_key', 'season',
+    'episode',
+)
+
+# Columns of idx_programme_listing on SQLite. Listings, now/next and grids
+# filter and sort on them, the other listing columns are read from the table
+LISTING_INDEX_FIELDS = ('channel_id', 'start_epoch', 'stop_epoch', 'title')
+
+# Columns tying a row to the import that added or retired it, see
+# store_epg_stream. They aren't staged, the publish jobs set them
+IMPORT_STATE_COLUMNS = ('added_by', 'removed_by')
+
+
+def _first_text(items) -> Optional[str]:
+    if items and isinstance(items, list):
+        first = items[0]
+        if isinstance(first, dict):
+            return first.get('text')
+        if isinstance(first, str):
+            return first
+    return None
+
+
+def display_columns(titles, descriptions, categories) -> Dict[str, Optional[str]]:
+    """Plain title, description and category_text for the parsed titles, descriptions and categories"""
+    names = [category.get('text') if isinstance(category, dict) else category for category in categories or []]
+    names = [name for name in names if isinstance(name, str) and name]
+    return {
+        'title': _first_text(titles),
+        'description': _first_text(descriptions),
+        'category_text': CATEGORY_SEPARATOR.join(names) or None,
+    }
+
+
+@functools.lru_cache(maxsize=4096)
+def listing_categories(categories: Optional[str]) -> Tuple[dict, ...]:
+    """Parsed categories column for listings, read-only and shared between rows.
+
+    A guide repeats a small set of category lists across its programmes, so
+    each distinct list is decoded once rather than for every listed row.
+    """
+    if not categories:
+        return ()
+    return tuple(json.loads(categories))
+
+
+def series_key(channel: Optional[str], title: Optional[str]) -> Optional[str]:
+    """Key grouping the airings of a title on a channel, from the XMLTV channel id and the case-folded title"""
+    if not channel or not title:
+        return None
+    title = " ".join(title.split()).casefold()
+    return hashlib.sha1(f"{channel}\x1f{title}".encode('utf-8')).hexdigest()[:20]
+
+
+def series_columns(channel: Optional[str], title: Optional[str], episode_nums) -> Dict:
+    """series_key, season and episode for a programme's channel, default title and parsed episode numbers"""
+    season, episode = season_episode(episode_nums)
+    return {'series_key': series_key(channel, title), 'season': season, 'episode': episode}
+
+
+def programme_delete_trigger(table_name: str) -> Tuple[str, str]:
+    """CREATE and DROP statements of the SQLite trigger deleting table_name's rows of every deleted programme"""
+    name = f"{table_name}_delete"
+    return (
+        f"CREATE TRIGGER IF NOT EXISTS {name} AFTER DELETE ON programmes BEGIN "
+        f"DELETE FROM {table_name} WHERE programme_id = old.id; END",
+        f"DROP TRIGGER IF EXISTS {name}",
+    )
+
+
+def cascade_programme_deletes(table: sa.Table) -> None:
+    """
+    Delete table's rows along with their programme on SQLite
+
+    SQLite doesn't enforce the programme_id foreign key's cascade unless
+    foreign keys are switched on, so a trigger removes the rows instead. It is
+    created and dropped with table.
+    """
+    create, drop = programme_delete_trigger(table.name)
+
+    def create_trigger(target, connection, **kw) -> None:
+        if connection.dialect.name == "sqlite":
+            connection.exec_driver_sql(create)
+
+    def drop_trigger(target, connection, **kw) -> None:
+        if connection.dialect.name == "sqlite":
+            connection.exec_driver_sql(drop)
+
+    sa.event.listen(table, "after_create", create_trigger)
+    sa.event.listen(table, "before_drop", drop_trigger)
+
+
+def pack_fields(values: Dict[str, Optional[str]]) -> Optional[bytes]:
+    """Compress the non-empty cold fields of a programme row into one blob"""
+    packed = {field: values[field] for field in COLD_FIELDS if values.get(field) is not None}
+    if not packed:
+        return None
+    return zlib.compress(json.dumps(packed, separators=(',', ':')).encode('utf-8'))
+
+
+def unpack_fields(blob: Optional[bytes]) -> Dict[str, str]:
+    """Inverse of pack_fields, returns the JSON text of each packed field"""
+    if not blob:
+        return {}
+    return json.loads(zlib.decompress(blob))
 
 
 class Programme(database.Base):
@@ -18,8 +143,12 @@ class Programme(database.Base):
     channel_id = sa.Column(sa.Integer, sa.ForeignKey(
         "channels.id"), nullable=False)
 
-    start_time = sa.Column(sa.String, nullable=False, index=True)
-    stop_time = sa.Column(sa.String, nullable=True, index=True)
+    start_time = sa.Column(sa.String, nullable=False)
+    stop_time = sa.Column(sa.String, nullable=True)
+
+    # start_time/stop_time as UTC seconds since the epoch, for range queries
+    start_epoch = sa.Column(sa.BigInteger, nullable=True)
+    stop_epoch = sa.Column(sa.BigInteger, nullable=True)
 
     # Optional programme attributes
     pdc_start = sa.Column(sa.String, nullable=True)
@@ -55,6 +184,28 @@ class Programme(database.Base):
     reviews = sa.Column(sa.Text, nullable=True)  # JSON array of review data
     images = sa.Column(sa.Text, nullable=True)  # JSON array of image data
 
+    # Default title/description and category names, derived from the JSON fields
+    # at import so listings don't have to decode them
+    title = sa.Column(sa.String, nullable=True)
+    description = sa.Column(sa.Text, nullable=True)
+    category_text = sa.Column(sa.String, nullable=True)
+
+    # Derived at import as well, see series_columns. season and episode are one-based
+    series_key = sa.Column(sa.String(20), nullable=True)
+    season = sa.Column(sa.Integer, nullable=True)
+    episode = sa.Column(sa.Integer, nullable=True)
+
+    # Compressed cold fields, see COLD_FIELDS and EPG_PACK_COLD_FIELDS
+    packed_fields = sa.Column(sa.LargeBinary, nullable=True)
+
+    # Hash of the content columns, lets refreshes skip rewriting unchanged rows
+    content_hash = sa.Column(sa.String(40), nullable=True)
+
+    # Import that added the row, which is hidden until that import is published,
+    # and import that replaced or dropped it, which hides it once published
+    added_by = sa.Column(sa.String(36), nullable=True)
+    removed_by = sa.Column(sa.String(36), nullable=True)
+
     # Metadata
     date_created = sa.Column(
         sa.DateTime, default=dt.datetime.now(dt.timezone.utc))
@@ -66,10 +217,35 @@ class Programme(database.Base):
 
     # Index for performance - commonly queried together
     __table_args__ = (
+        # Matches staged programmes against the stored ones during imports
         sa.Index('idx_programme_channel_start', 'channel_id', 'start_time'),
-        sa.Index('idx_programme_start_stop', 'start_time', 'stop_time'),
+        # Now/next and listings of a channel. On SQLite the index also holds the
+        # title, which is short, but not the descriptions and categories, which
+        # would make it a second copy of the table for every import to write
+        sa.Index('idx_programme_listing', *LISTING_INDEX_FIELDS).ddl_if(dialect='sqlite'),
+        sa.Index('idx_programme_channel_start_stop_epoch', 'channel_id', 'start_epoch',
+                 'stop_epoch').ddl_if(dialect='postgresql'),
+        sa.Index('idx_programme_start_stop_epoch', 'start_epoch', 'stop_epoch'),
+        sa.Index('idx_programme_series_start', 'series_key', 'start_epoch'),
+        sa.Index('idx_programme_series_episode', 'series_key', 'season', 'episode'),
+        # Rows of imports being published or cleaned up, few at any time
+        sa.Index('idx_programme_added_by', 'added_by', sqlite_where=sa.text('added_by IS NOT NULL'),
+                 postgresql_where=sa.text('added_by IS NOT NULL')),
+        sa.Index('idx_programme_removed_by', 'removed_by', sqlite_where=sa.text('removed_by IS NOT NULL'),
+                 postgresql_where=sa.text('removed_by IS NOT NULL')),
     )
 
+    def get_field_text(self, field_name):
+        """Return a field's JSON text, reading packed_fields when the column is empty"""
+        value = getattr(self, field_name, None)
+        if value is None and field_name in COLD_FIELDS and self.packed_fields:
+            cached = getattr(self, '_unpacked', None)
+            if cached is None or cached[0] is not self.packed_fields:
+                cached = (self.packed_fields, unpack_fields(self.packed_fields))
+                self._unpacked = cached
+            value = cached[1].get(field_name)
+        return value
+
     def get_titles(self):
         """Return parsed titles as Python objects"""
         if self.titles:
@@ -79,9 +255,12 @@ class Programme(database.Base):
     def set_titles(self, titles):
         """Store titles as JSON"""
         self.titles = json.dumps(titles)
+        self.title = display_columns(titles, None, None)['title']
 
     def get_default_title(self):
         """Return the first titles entry's text as default title"""
+        if self.title is not None:
+            return self.title
         titles = self.get_titles()
         if titles and isinstance(titles, list) and len(titles) > 0:
             first_title = titles[0]
@@ -93,6 +272,8 @@ class Programme(database.Base):
 
     def get_default_description(self):
         """Return the first descriptions entry's text as default description"""
+        if self.description is not None:
+            return self.description
         descriptions = self.get_descriptions()
         if descriptions and isinstance(descriptions, list) and len(descriptions) > 0:
             first_desc = descriptions[0]
@@ -111,6 +292,7 @@ class Programme(database.Base):
     def set_descriptions(self, descriptions):
         """Store descriptions as JSON"""
         self.descriptions = json.dumps(descriptions)
+        self.description = display_columns(None, descriptions, None)['description']
 
     def get_categories(self):
         """Return parsed categories as Python objects"""
@@ -121,11 +303,20 @@ class Programme(database.Base):
     def set_categories(self, categories):
         """Store categories as JSON"""
         self.categories = json.dumps(categories)
+        self.category_text = display_columns(None, None, categories)['category_text']
+
+    def get_category_names(self):
+        """Return the category names, from category_text when it is set"""
+        if self.category_text is not None:
+            return self.category_text.split(CATEGORY_SEPARATOR)
+        category_text = display_columns(None, None, self.get_categories())['category_text']
+        return category_text.split(CATEGORY_SEPARATOR) if category_text else []
 
     def get_credits(self):
         """Return parsed credits as Python objects"""
-        if self.credits:
-            return json.loads(self.credits)
+        credits = self.get_field_text('credits')
+        if credits:
+            return json.loads(credits)
         return {}
 
     def set_credits(self, credits):
@@ -135,7 +326,7 @@ class Programme(database.Base):
     # Helper methods for common JSON fields
     def get_json_field(self, field_name):
         """Generic method to get JSON field data"""
-        field_value = getattr(self, field_name, None)
+        field_value = self.get_field_text(field_name)
         if field_value:
             return json.loads(field_value)
         return [] if field_name in ['titles', 'sub_titles', 'descriptions', 'categories',
@@ -145,3 +336,9 @@ class Programme(database.Base):
     def set_json_field(self, field_name, value):
         """Generic method to set JSON field data"""
         setattr(self, field_name, json.dumps(value) if value else None)
+        if field_name == 'titles':
+            self.title = display_columns(value, None, None)['title']
+        elif field_name == 'descriptions':
+            self.description = display_columns(None, value, None)['description']
+        elif field_name == 'categories':
+            self.category_text = display_columns(None, None, value)['category_text']
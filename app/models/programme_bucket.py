@@ -0,0 +1,30 @@
+import sqlalchemy as sa
+
+from app import database
+from app.models.programme import cascade_programme_deletes
+
+BUCKET_SECONDS = 60 * 60
+# Programmes running longer than a week are only indexed for their first week
+MAX_BUCKETS = 7 * 24
+
+
+def bucket_range(start_epoch: int, stop_epoch: int) -> range:
+    """Hour buckets a programme, or a time window, from start_epoch up to stop_epoch overlaps"""
+    first = start_epoch // BUCKET_SECONDS
+    last = (max(stop_epoch, start_epoch + 1) - 1) // BUCKET_SECONDS
+    return range(first, min(last, first + MAX_BUCKETS - 1) + 1)
+
+
+# Programme ids of a channel by the hours they overlap, filled when an import is
+# published. A guide grid reads the few buckets its window covers instead of
+# range-scanning every programme that started before the window's end.
+programme_buckets = sa.Table(
+    "programme_buckets", database.Base.metadata,
+    sa.Column("channel_id", sa.Integer, primary_key=True),
+    sa.Column("bucket", sa.Integer, primary_key=True),
+    sa.Column("programme_id", sa.Integer, sa.ForeignKey("programmes.id", ondelete="CASCADE"), primary_key=True),
+    sa.Index("idx_programme_buckets_programme", "programme_id"),
+    sqlite_with_rowid=False,
+)
+
+cascade_programme_deletes(programme_buckets)
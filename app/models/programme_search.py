@@ -0,0 +1,72 @@
+import sqlalchemy as sa
+
+from app.models.programme import Programme
+
+# Full-text index over programme titles, sub-titles and descriptions. On SQLite
+# it is an FTS5 table keyed by programme id and kept in sync by triggers, so
+# every path that writes or deletes programmes maintains it. On PostgreSQL it is
+# a GIN expression index over PG_SEARCH_VECTOR.
+SEARCH_TABLE = "programme_search"
+
+
+def _sqlite_text(row: str, column: str) -> str:
+    return f"CASE WHEN json_valid({row}.{column}) THEN json_extract({row}.{column}, '$[0].text') END"
+
+
+def _sqlite_insert(row: str) -> str:
+    return (f"INSERT INTO {SEARCH_TABLE}(rowid, title, sub_title, description) VALUES ({row}.id, "
+            f"{row}.title, {_sqlite_text(row, 'sub_titles')}, {row}.description);")
+
+
+SQLITE_SEARCH_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+    "title, sub_title, description, tokenize = 'unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_insert AFTER INSERT ON programmes BEGIN "
+    f"{_sqlite_insert('new')} END",
+    f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_delete AFTER DELETE ON programmes BEGIN "
+    f"DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id; END",
+    f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_update AFTER UPDATE OF title, sub_titles, description "
+    f"ON programmes BEGIN DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id; {_sqlite_insert('new')} END",
+)
+
+SQLITE_SEARCH_DROP = (
+    f"DROP TRIGGER IF EXISTS {SEARCH_TABLE}_update",
+    f"DROP TRIGGER IF EXISTS {SEARCH_TABLE}_delete",
+    f"DROP TRIGGER IF EXISTS {SEARCH_TABLE}_insert",
+    f"DROP TABLE IF EXISTS {SEARCH_TABLE}",
+)
+
+
+# Title matches rank above sub-title matches, which rank above description matches
+PG_SEARCH_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce((sub_titles::jsonb -> 0 ->> 'text'), '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'C')"
+)
+
+PG_SEARCH_DDL = (f"CREATE INDEX IF NOT EXISTS idx_{SEARCH_TABLE} ON programmes USING gin (({PG_SEARCH_VECTOR}))",)
+PG_SEARCH_DROP = (f"DROP INDEX IF EXISTS idx_{SEARCH_TABLE}",)
+
+
+def _execute(connection, statements) -> None:
+    for statement in statements:
+        connection.exec_driver_sql(statement)
+
+
+def create_programme_search(target, connection, **kw) -> None:
+    """Create the search index for the connection's backend, others fall back to LIKE"""
+    if connection.dialect.name == "sqlite":
+        _execute(connection, SQLITE_SEARCH_DDL)
+    elif connection.dialect.name == "postgresql":
+        _execute(connection, PG_SEARCH_DDL)
+
+
+def drop_programme_search(target, connection, **kw) -> None:
+    if connection.dialect.name == "sqlite":
+        _execute(connection, SQLITE_SEARCH_DROP)
+    elif connection.dialect.name == "postgresql":
+        _execute(connection, PG_SEARCH_DROP)
+
+
+sa.event.listen(Programme.__table__, "after_create", create_programme_search)
+sa.event.listen(Programme.__table__, "before_drop", drop_programme_search)
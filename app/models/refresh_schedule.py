@@ -0,0 +1,29 @@
+import sqlalchemy as sa
+from sqlalchemy import orm as orm
+
+from app import database
+
+
+class RefreshSchedule(database.Base):
+    class Config:
+        from_attributes = True
+
+    __tablename__ = "epg_refresh_schedules"
+
+    server_id = sa.Column(sa.String(36), sa.ForeignKey("servers.id"), primary_key=True)
+    user_id = sa.Column(sa.String(36), sa.ForeignKey("users.id"), nullable=False)
+
+    # Hash of the last downloaded feed, used to tell whether the provider changed it
+    content_hash = sa.Column(sa.String(64), nullable=True)
+    # Latest programme stop time in the feed (UTC)
+    horizon_end = sa.Column(sa.DateTime, nullable=True)
+
+    last_checked = sa.Column(sa.DateTime, nullable=True)
+    last_changed = sa.Column(sa.DateTime, nullable=True)
+    # Smoothed number of seconds between observed feed changes
+    change_interval = sa.Column(sa.Float, nullable=True)
+
+    next_refresh = sa.Column(sa.DateTime, nullable=True, index=True)
+
+    server = orm.relationship("Server")
+    user = orm.relationship("User")
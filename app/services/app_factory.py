@@ -3,8 +3,11 @@ from fastapi.routing import APIRoute
 from fastapi_users import fastapi_users, FastAPIUsers
 from starlette.middleware.cors import CORSMiddleware
 
+from app import database
 from app.api import api_router
 from app.services.config import settings
+from app.services.epg_shards import dispose_shards
+from app.services.write_queue import start_writer, stop_writer
 
 
 def create_app():
@@ -18,6 +21,7 @@ def create_app():
     )
     setup_routers(app, fastapi_users)
     setup_cors_middleware(app)
+    setup_write_queue(app)
     # serve_static_app(app)
     return app
 
@@ -27,6 +31,12 @@ def setup_routers(app: FastAPI, fastapi_users: FastAPIUsers) -> None:
     use_route_names_as_operation_ids(app)
 
 
+def setup_write_queue(app: FastAPI) -> None:
+    app.add_event_handler("startup", lambda: start_writer(database.engine))
+    app.add_event_handler("shutdown", dispose_shards)
+    app.add_event_handler("shutdown", lambda: stop_writer(database.engine))
+
+
 def setup_cors_middleware(app):
     if settings.BACKEND_CORS_ORIGINS:
         origins = [str(origin) for origin in settings.BACKEND_CORS_ORIGINS]
@@ -0,0 +1,171 @@
+import os
+import shutil
+import time
+from typing import Dict, List, Optional
+
+import sqlalchemy.orm as orm
+from xdg_base_dirs import xdg_cache_home
+
+from app.models.server import Server
+from app.services.config import settings
+from app.services.logger import get_logger
+
+logger = get_logger(__name__)
+
+LAST_USED_MARKER = ".last_used"
+
+
+def get_cache_root() -> str:
+    return os.getenv("CACHE_PATH") or os.path.join(xdg_cache_home(), "xtreamium")
+
+
+def get_server_cache_dir(user_id, server_id) -> str:
+    return os.path.join(get_cache_root(), f"{user_id}", str(server_id))
+
+
+def mark_used(cache_dir: str) -> None:
+    """Record that a server's cache directory was just used, for LRU eviction"""
+    os.makedirs(cache_dir, exist_ok=True)
+    marker = os.path.join(cache_dir, LAST_USED_MARKER)
+    with open(marker, 'a'):
+        os.utime(marker)
+
+
+def _last_used(cache_dir: str) -> float:
+    marker = os.path.join(cache_dir, LAST_USED_MARKER)
+    if os.path.isfile(marker):
+        return os.path.getmtime(marker)
+    return os.path.getmtime(cache_dir)
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _list_server_dirs() -> List[Dict]:
+    """Return one entry per <user>/<server> directory in the cache"""
+    root = get_cache_root()
+    if not os.path.isdir(root):
+        return []
+
+    entries = []
+    for user_id in os.listdir(root):
+        user_dir = os.path.join(root, user_id)
+        if not os.path.isdir(user_dir):
+            continue
+        for server_id in os.listdir(user_dir):
+            path = os.path.join(user_dir, server_id)
+            if not os.path.isdir(path):
+                continue
+            entries.append({
+                "user_id": user_id,
+                "server_id": server_id,
+                "path": path,
+                "bytes": _dir_size(path),
+                "last_used": _last_used(path),
+            })
+    return entries
+
+
+def _remove_dir(path: str) -> None:
+    shutil.rmtree(path, ignore_errors=True)
+    # Drop the user directory too once its last server is gone
+    parent = os.path.dirname(path)
+    if os.path.isdir(parent) and not os.listdir(parent):
+        os.rmdir(parent)
+
+
+def get_cache_usage(user_id: Optional[str] = None) -> Dict:
+    """
+    Report how much disk the EPG cache uses
+
+    Args:
+        user_id: Only report this user's servers, all servers when None
+
+    Returns:
+        Dict with total bytes, configured cap and per-server entries. The cache
+        root is only logged, API users don't get to see the server's paths
+    """
+    entries = [entry for entry in _list_server_dirs() if user_id is None or entry["user_id"] == str(user_id)]
+    logger.debug(f"EPG cache in {get_cache_root()} holds {len(entries)} server caches")
+    return {
+        "total_bytes": sum(entry["bytes"] for entry in entries),
+        "max_bytes": settings.EPG_CACHE_MAX_BYTES,
+        "entries": [
+            {
+                "user_id": entry["user_id"],
+                "server_id": entry["server_id"],
+                "bytes": entry["bytes"],
+                "last_used": entry["last_used"],
+            }
+            for entry in entries
+        ],
+    }
+
+
+async def remove_orphaned_cache_dirs(db: orm.Session) -> int:
+    """
+    Remove cache directories for servers (or users) that no longer exist
+
+    Args:
+        db: Database session
+
+    Returns:
+        Number of server directories removed
+    """
+    known = {(owner_id, server_id) for owner_id, server_id in db.query(Server.owner_id, Server.id).all()}
+
+    removed = 0
+    for entry in _list_server_dirs():
+        if (entry["user_id"], entry["server_id"]) not in known:
+            logger.info(f"Removing orphaned EPG cache {entry['path']} ({entry['bytes']} bytes)")
+            _remove_dir(entry["path"])
+            removed += 1
+    return removed
+
+
+def evict_cache(max_bytes: int) -> int:
+    """
+    Delete least recently used server caches until the cache fits in max_bytes
+
+    Args:
+        max_bytes: Size cap in bytes, 0 disables eviction
+
+    Returns:
+        Number of bytes freed
+    """
+    if max_bytes <= 0:
+        return 0
+
+    entries = sorted(_list_server_dirs(), key=lambda entry: entry["last_used"])
+    total = sum(entry["bytes"] for entry in entries)
+
+    freed = 0
+    for entry in entries:
+        if total <= max_bytes:
+            break
+        logger.info(f"Evicting EPG cache {entry['path']} ({entry['bytes']} bytes, "
+                    f"last used {time.ctime(entry['last_used'])})")
+        _remove_dir(entry["path"])
+        total -= entry["bytes"]
+        freed += entry["bytes"]
+    return freed
+
+
+async def run_cache_maintenance(db: orm.Session) -> Dict:
+    """Remove orphaned cache directories then enforce the size cap"""
+    try:
+        removed = await remove_orphaned_cache_dirs(db)
+        freed = evict_cache(settings.EPG_CACHE_MAX_BYTES)
+        logger.info(f"EPG cache maintenance: removed {removed} orphaned directories, evicted {freed} bytes")
+        return {"orphans_removed": removed, "bytes_evicted": freed}
+    except Exception as e:
+        logger.error(f"EPG cache maintenance failed: {e}")
+        raise
@@ -1,4 +1,4 @@
-from typing import List
+from typing import Dict, List, Optional
 
 from pydantic.v1 import BaseSettings
 
@@ -16,5 +16,89 @@ class Settings(BaseSettings):
         "http://localhost:35729",
     ]
 
+    # Total size cap for the downloaded EPG cache, 0 disables eviction
+    EPG_CACHE_MAX_BYTES: int = 10 * 1024 ** 3
+
+    # How often the refresh task wakes up to look for servers that are due
+    EPG_REFRESH_CHECK_SECONDS: int = 60 * 60
+    # Refresh once the guide covers less than this many hours ahead
+    EPG_REFRESH_MIN_HORIZON_HOURS: int = 48
+    EPG_REFRESH_MIN_INTERVAL_HOURS: int = 6
+    EPG_REFRESH_MAX_INTERVAL_HOURS: int = 72
+
+    # Programmes written per round trip when storing a feed
+    EPG_STORE_CHUNK_SIZE: int = 2000
+    # Imports still loading after this long are treated as abandoned
+    EPG_IMPORT_STALE_HOURS: int = 6
+    # Staged rows deleted per transaction when cleaning up finished imports
+    EPG_IMPORT_GC_BATCH_SIZE: int = 5000
+    # Store rarely read programme fields (credits, ratings, images...) in one
+    # compressed column instead of a column each. The retention job converts
+    # the stored programmes after the setting changes
+    EPG_PACK_COLD_FIELDS: bool = False
+
+    # Retention job: purge programmes that ended more than EPG_RETENTION_HOURS ago
+    # and channels missing from their feed for EPG_CHANNEL_RETENTION_DAYS
+    EPG_RETENTION_CHECK_SECONDS: int = 6 * 60 * 60
+    EPG_RETENTION_HOURS: int = 24
+    EPG_CHANNEL_RETENTION_DAYS: int = 7
+    EPG_RETENTION_BATCH_SIZE: int = 5000
+    # Free pages returned to the OS per run, 0 returns all of them
+    EPG_RETENTION_VACUUM_PAGES: int = 0
+
+    # Refresh planner statistics at the end of a refresh cycle once this many
+    # programme rows changed, at most every DB_MAINTENANCE_MIN_INTERVAL_HOURS
+    DB_MAINTENANCE_MIN_ROWS_CHANGED: int = 50000
+    DB_MAINTENANCE_MIN_INTERVAL_HOURS: int = 6
+    # Rows SQLite's ANALYZE samples per index, 0 reads them all
+    DB_MAINTENANCE_ANALYSIS_LIMIT: int = 1000
+    # Also rebuild the EPG indexes, which blocks writes while it runs
+    DB_MAINTENANCE_REINDEX: bool = False
+
+    # SQLite tuning applied to every new connection. WAL lets the API keep
+    # reading while a refresh writes; busy_timeout makes writers wait for the
+    # lock instead of failing with "database is locked".
+    SQLITE_PROFILE_ENABLED: bool = True
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 30000
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_CACHE_SIZE_KB: int = 64 * 1024
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    SQLITE_TEMP_STORE: str = "MEMORY"
+    # Only takes effect on a new database, existing ones need a VACUUM to switch
+    SQLITE_AUTO_VACUUM: str = "INCREMENTAL"
+    # Queue every write to one writer thread with its own connection, so
+    # requests and background tasks never contend for the write lock
+    SQLITE_SINGLE_WRITER: bool = True
+    # Optional sharded EPG storage on SQLite, shard name -> database URL, e.g.
+    # {"a": "sqlite:////disk1/epg-a.db", "b": "sqlite:////disk2/epg-b.db"}.
+    # Each user's guides go to the shard their id hashes to, users, servers and
+    # refresh schedules stay in DATABASE_URL. Empty keeps everything in one file.
+    EPG_SHARDS: Dict[str, str] = {}
+
+    # Connection pool for server databases such as PostgreSQL, SQLite ignores these
+    DATABASE_POOL_SIZE: int = 5
+    DATABASE_MAX_OVERFLOW: int = 10
+    DATABASE_POOL_TIMEOUT_SECONDS: int = 30
+    # Recycle connections before server or proxy idle timeouts close them
+    DATABASE_POOL_RECYCLE_SECONDS: int = 30 * 60
+    DATABASE_POOL_PRE_PING: bool = True
+    # Bulk load rows with COPY FROM STDIN on PostgreSQL instead of INSERT
+    DATABASE_USE_COPY: bool = True
+
+    # Optional read replica, e.g. a PostgreSQL hot standby, for read-only
+    # endpoints. A user's reads stay on the primary for
+    # DATABASE_READ_AFTER_WRITE_SECONDS after they write, and everyone's do
+    # while the replica is more than DATABASE_REPLICA_MAX_LAG_SECONDS behind.
+    DATABASE_READ_URL: Optional[str] = None
+    DATABASE_READ_AFTER_WRITE_SECONDS: float = 10
+    DATABASE_REPLICA_MAX_LAG_SECONDS: float = 5
+    # How long a replica lag measurement is reused
+    DATABASE_REPLICA_LAG_CHECK_SECONDS: float = 5
+    # Redis shared by the API processes, e.g. redis://localhost:6379. Holds
+    # the users' recent writes, which are otherwise only known to the process
+    # that made them
+    REDIS_URL: Optional[str] = None
+
 
 settings = Settings()
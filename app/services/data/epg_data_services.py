@@ -1,20 +1,138 @@
 import datetime as dt
-from typing import List, Optional, Dict
-
+import hashlib
+import json
+import operator
+import re
+import urllib.parse
+from collections import defaultdict
+from typing import Callable, List, Optional, Dict, Iterable
+
+import sqlalchemy as sa
 import sqlalchemy.orm as orm
-from sqlalchemy import text
 
+from app.models.category import Category, programme_categories
 from app.models.channel import Channel
-from app.models.programme import Programme
+from app.models.epg_import import EPGImport, epg_import_channels, epg_import_programmes
+from app.models.epg_source import EPGSource, EPGSourceSubscription
+from app.models.person import Person, person_key, programme_people
+from app.models.programme import (
+    CATEGORY_SEPARATOR, COLD_FIELDS, LISTING_FIELDS, Programme, display_columns, pack_fields, series_columns,
+    unpack_fields
+)
+from app.models.programme_bucket import bucket_range, programme_buckets
+from app.models.programme_search import PG_SEARCH_VECTOR, SEARCH_TABLE
+from app.models.server import Server
+from app.services.config import settings
+from app.services.db_maintenance import record_changes
+from app.services.epg_shards import SHARD_INFO_KEY, central_session, source_key
 from app.services.logger import get_logger
-from app.utils.iptv_parser_ng import Channel as XMLTVChannel, Programme as XMLTVProgramme
+from app.services.write_queue import BULK, delete_in_batches, run_write, update_in_batches
+from app.utils.bulk_load import bulk_insert
+from app.utils.iptv_parser_ng import Batch as XMLTVBatch, Channel as XMLTVChannel, Programme as XMLTVProgramme
+from app.utils.json_codec import dumps, dumps_field
+from app.utils.time_utils import to_epoch, xmltv_to_epoch
 
 logger = get_logger(__name__)
 
+# Columns that make up a programme's content hash
+PROGRAMME_CONTENT_COLUMNS = (
+    'start_time', 'stop_time', 'pdc_start', 'vps_start', 'showview', 'videoplus', 'clumpidx', 'date', 'new',
+    'titles', 'sub_titles', 'descriptions', 'credits', 'categories', 'keywords', 'language', 'orig_language',
+    'length', 'icons', 'urls', 'countries', 'episode_nums', 'video', 'audio', 'previously_shown', 'premiere',
+    'last_chance', 'subtitles', 'ratings', 'star_ratings', 'reviews', 'images',
+)
+
+# Programme fields stored as JSON text
+PROGRAMME_JSON_FIELDS = (
+    'titles', 'sub_titles', 'descriptions', 'credits', 'categories', 'keywords', 'language', 'orig_language',
+    'length', 'icons', 'urls', 'countries', 'episode_nums', 'video', 'audio', 'previously_shown', 'premiere',
+    'last_chance', 'subtitles', 'ratings', 'star_ratings', 'reviews', 'images',
+)
+
+# Column order of the tuples written to the staging table
+STAGED_PROGRAMME_COLUMNS = tuple(column.name for column in epg_import_programmes.columns if column.name != 'id')
+KEPT_PROGRAMME_COLUMNS = ('import_id', 'action', 'programme_id')
+_staged_programme_row = operator.itemgetter(*STAGED_PROGRAMME_COLUMNS)
+
+LISTING_COLUMNS = tuple(getattr(Programme, name) for name in LISTING_FIELDS)
+
+# Query parameters of EPG URLs that identify an account rather than the feed
+CREDENTIAL_PARAMS = ('username', 'password')
 
-async def store_epg_channels(channels: List[XMLTVChannel], user_id: str, server_id: int, db: orm.Session):
+
+async def resolve_epg_source(user_id: str, server_id, db: orm.Session, url: Optional[str] = None) -> EPGSource:
     """
-    Store parsed XMLTV channels and programmes in the database using bulk operations for performance
+    Find or create the EPG source a user's server reads its guide from
+
+    Servers with the same EPG URL share one source, ignoring the account
+    credentials in it (see feed_key), so accounts on one provider share its
+    guide. Servers without one get a private source. With EPG_SHARDS set, only
+    servers whose users are on the same shard share a source.
+
+    Args:
+        user_id: User ID
+        server_id: Server ID
+        db: Database session
+        url: The server's EPG URL, looked up from the server when not given
+
+    Returns:
+        EPGSource the server is subscribed to
+    """
+    try:
+        return await run_write(central_session(db), _resolve_epg_source, user_id, str(server_id), url,
+                               db.info.get(SHARD_INFO_KEY))
+    except Exception as e:
+        logger.error(f"Failed to resolve EPG source for user {user_id}, server {server_id}: {e}")
+        db.rollback()
+        raise
+
+
+def _resolve_epg_source(db: orm.Session, user_id: str, server_id: str, url: Optional[str],
+                        shard: Optional[str]) -> EPGSource:
+    if url is None:
+        url = db.query(Server.epg_url).filter(Server.id == server_id).scalar()
+    key = source_key(shard, feed_key(url) if url and url.strip() else f"{user_id}/{server_id}")
+
+    subscription = db.query(EPGSourceSubscription).filter(
+        EPGSourceSubscription.user_id == user_id,
+        EPGSourceSubscription.server_id == server_id
+    ).first()
+    if subscription and subscription.source.url == key:
+        return subscription.source
+
+    source = db.query(EPGSource).filter(EPGSource.url == key).first()
+    if source is None:
+        source = EPGSource(url=key)
+        db.add(source)
+        db.flush()
+
+    if subscription is None:
+        db.add(EPGSourceSubscription(user_id=user_id, server_id=server_id, source_id=source.id))
+    else:
+        # The old source is removed by the retention job once nobody uses it
+        logger.info(f"Server {server_id} of user {user_id} moved to EPG source {source.id}")
+        subscription.source_id = source.id
+    db.commit()
+    return source
+
+
+def feed_key(url: str) -> str:
+    """
+    An EPG URL without the account credentials in it, e.g. the username and
+    password query parameters of an Xtream xmltv.php URL
+    """
+    parts = urllib.parse.urlsplit(url.strip())
+    query = [(name, value) for name, value in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+             if name.lower() not in CREDENTIAL_PARAMS]
+    netloc = parts.netloc.rpartition('@')[2]
+    return urllib.parse.urlunsplit((parts.scheme, netloc, parts.path, urllib.parse.urlencode(query), ''))
+
+
+async def store_epg_channels(channels: List[XMLTVChannel], user_id: str, server_id: str, db: orm.Session):
+    """
+    Store parsed XMLTV channels and programmes in the database
+
+    Kept for callers that already hold a fully parsed feed, see store_epg_stream.
 
     Args:
         channels: List of Channel objects from XMLTV parser
@@ -24,151 +142,625 @@ async def store_epg_channels(channels: List[XMLTVChannel], user_id: str, server_
     """
     logger.info(f"Storing EPG data for user {user_id}, server {server_id} - {len(channels)} channels")
 
+    def batches():
+        yield XMLTVBatch(channels=channels)
+        for channel in channels:
+            if channel.programmes:
+                yield XMLTVBatch(programmes=channel.programmes)
+
+    return await store_epg_stream(batches(), user_id, server_id, db)
+
+
+async def store_epg_stream(batches: Iterable[XMLTVBatch], user_id: str, server_id: str, db: orm.Session,
+                           chunk_size: Optional[int] = None, content_hash: Optional[str] = None):
+    """
+    Store a stream of XMLTV channel/programme batches, only writing what changed
+
+    The data is stored against the EPG source the server subscribes to (see
+    resolve_epg_source), so servers sharing a feed share one copy. Programmes
+    are diffed chunk_size at a time against the current guide and staged in
+    epg_import_programmes, committing after every chunk so no lock is held
+    while the feed is parsed. Incoming programmes are matched to existing rows
+    by channel, start time and clump index: rows whose content hash matches
+    are kept, changed rows are staged as updates and the rest as inserts.
+
+    Once the whole feed is staged, its new and changed programmes are added as
+    rows marked added_by the import, and the rows they replace, along with the
+    programmes of the feed's channels that were not matched, are marked
+    removed_by it, again chunk_size at a time. Readers skip rows added by an
+    unpublished import and rows removed by a published one (see
+    _visible_programmes), so publishing is a single update of the import's
+    status and readers see either the old or the new guide. The retired rows
+    are deleted afterwards and added_by is cleared again, staged rows are
+    deleted later by gc_epg_imports.
+
+    Args:
+        batches: Iterable of Batch objects, e.g. from iter_xmltv_file
+        user_id: User ID who owns the EPG data
+        server_id: Server ID where the EPG data comes from
+        db: Database session
+        chunk_size: Programmes written per round trip, defaults to EPG_STORE_CHUNK_SIZE
+        content_hash: Hash of the feed, recorded on the source once published
+
+    Returns:
+        Dict with counts of new channels, programmes in the feed and programmes
+        inserted, updated, deleted and left unchanged, and the feed's latest
+        programme end time as 'horizon_end'
+    """
+    chunk_size = chunk_size or settings.EPG_STORE_CHUNK_SIZE
+    stats = defaultdict(int)
+
+    source_id = (await resolve_epg_source(user_id, server_id, db)).id
+    import_id = await run_write(db, _begin_import, user_id, str(server_id), priority=BULK)
+
     try:
-        # Collect all XMLTV channel IDs for bulk lookup
-        xmltv_ids = [channel.id for channel in channels]
-
-        # Bulk query to get all existing channels
-        existing_channels = db.query(Channel).filter(
-            Channel.user_id == user_id,
-            Channel.server_id == server_id,
-            Channel.xmltv_id.in_(xmltv_ids)
-        ).all()
-
-        # Create lookup map for existing channels
-        existing_channels_map: Dict[str, Channel] = {
-            channel.xmltv_id: channel for channel in existing_channels
-        }
-
-        # Collect existing channel IDs for bulk programme deletion
-        existing_channel_ids = [channel.id for channel in existing_channels]
-
-        # Bulk delete existing programmes to avoid duplicates
-        if existing_channel_ids:
-            # Use SQLAlchemy's .in_() method instead of raw SQL for better handling of large lists
-            db.query(Programme).filter(Programme.channel_id.in_(existing_channel_ids)).delete(synchronize_session=False)
-            logger.debug(f"Deleted existing programmes for {len(existing_channel_ids)} channels")
-
-        # Prepare bulk data for channels and programmes
-        channels_to_insert = []
-        programmes_to_insert = []
-
-        new_channels_count = 0
-        updated_channels_count = 0
-
-        # Process all channels and prepare bulk operations
-        for xmltv_channel in channels:
-            if xmltv_channel.id in existing_channels_map:
-                # Update existing channel
-                existing_channel = existing_channels_map[xmltv_channel.id]
-                existing_channel.set_display_names(xmltv_channel.display_names)
-                existing_channel.set_icons(xmltv_channel.icons)
-                existing_channel.set_urls(xmltv_channel.urls)
-                existing_channel.date_last_updated = dt.datetime.now(dt.timezone.utc)
-                updated_channels_count += 1
-                channel_db_id = existing_channel.id
-            else:
-                # Prepare new channel data with JSON serialization
-                import json
-                channel_data = {
-                    'user_id': user_id,
-                    'server_id': server_id,
-                    'xmltv_id': xmltv_channel.id,
-                    'display_names': json.dumps(xmltv_channel.display_names) if xmltv_channel.display_names else None,
-                    'icons': json.dumps(xmltv_channel.icons) if xmltv_channel.icons else None,
-                    'urls': json.dumps(xmltv_channel.urls) if xmltv_channel.urls else None,
-                    'date_created': dt.datetime.now(dt.timezone.utc),
-                    'date_last_updated': dt.datetime.now(dt.timezone.utc)
-                }
-                channels_to_insert.append(channel_data)
-                new_channels_count += 1
-                channel_db_id = None
-
-            # For new channels, we need to handle programmes after channel insertion
-            if xmltv_channel.id not in existing_channels_map:
-                # Store programmes data temporarily with xmltv_id reference
-                for xmltv_programme in xmltv_channel.programmes:
-                    programme_data = _prepare_programme_data(xmltv_programme, None)
-                    programme_data['_xmltv_channel_id'] = xmltv_channel.id  # Temporary reference
-                    programmes_to_insert.append(programme_data)
-            else:
-                # For existing channels, add programmes directly
-                for xmltv_programme in xmltv_channel.programmes:
-                    programme_data = _prepare_programme_data(xmltv_programme, channel_db_id)
-                    programmes_to_insert.append(programme_data)
-
-        # Bulk insert new channels
-        if channels_to_insert:
-            logger.debug(f"Bulk inserting {len(channels_to_insert)} new channels")
-            db.bulk_insert_mappings(Channel, channels_to_insert)
-            db.flush()
-
-            # Get the newly inserted channels to map their IDs
-            new_channel_xmltv_ids = [ch['xmltv_id'] for ch in channels_to_insert]
-            newly_inserted_channels = db.query(Channel).filter(
-                Channel.user_id == user_id,
-                Channel.server_id == server_id,
-                Channel.xmltv_id.in_(new_channel_xmltv_ids)
-            ).all()
-
-            # Create mapping of xmltv_id to database ID for new channels
-            new_channel_id_map = {ch.xmltv_id: ch.id for ch in newly_inserted_channels}
-
-            # Update programme data with correct channel IDs for new channels
-            for programme_data in programmes_to_insert:
-                if '_xmltv_channel_id' in programme_data:
-                    xmltv_channel_id = programme_data.pop('_xmltv_channel_id')
-                    programme_data['channel_id'] = new_channel_id_map[xmltv_channel_id]
-
-        # Bulk insert programmes
-        if programmes_to_insert:
-            logger.debug(f"Bulk inserting {len(programmes_to_insert)} programmes")
-            db.bulk_insert_mappings(Programme, programmes_to_insert)
-
-        # Commit all changes
-        db.commit()
-
-        total_programmes = len(programmes_to_insert)
-
-        logger.info(f"EPG storage completed successfully:")
-        logger.info(f"  - New channels: {new_channels_count}")
-        logger.info(f"  - Updated channels: {updated_channels_count}")
-        logger.info(f"  - Total programmes stored: {total_programmes}")
-        logger.info(f"  - User: {user_id}, Server: {server_id}")
-
-        return {
-            "channels": new_channels_count,
-            "programmes": total_programmes,
-            "success": True
-        }
+        channel_ids: Dict[str, int] = {}
+        pending: List[XMLTVProgramme] = []
+        now = dt.datetime.now(dt.timezone.utc)
+
+        # Every chunk is its own write job, so other writes get in between
+        for batch in batches:
+            for i in range(0, len(batch.channels), chunk_size):
+                chunk = batch.channels[i:i + chunk_size]
+                await run_write(db, lambda db: _store_channel_chunk(chunk, source_id, channel_ids, import_id,
+                                                                    now, db, stats), priority=BULK)
+
+            for xmltv_programme in batch.programmes:
+                pending.append(xmltv_programme)
+                if len(pending) >= chunk_size:
+                    await run_write(db, lambda db: _stage_programme_chunk(pending, source_id, channel_ids, import_id,
+                                                                          now, db, stats), priority=BULK)
+                    pending = []
+
+        if pending:
+            await run_write(db, lambda db: _stage_programme_chunk(pending, source_id, channel_ids, import_id,
+                                                                  now, db, stats), priority=BULK)
+
+        # Add the staged rows and mark the ones they replace or that have left the feed,
+        # a chunk per write job. Readers don't see any of it until the import is published
+        await _run_in_chunks(db, lambda db, after: _retire_missing_programmes(import_id, after, chunk_size, db, stats))
+        await _run_in_chunks(db, lambda db, after: _add_staged_programmes(import_id, source_id, after, chunk_size,
+                                                                          db))
+        await _run_in_chunks(db, lambda db, after: _touch_import_channels(import_id, now, after, chunk_size, db))
+
+        def record_import(db: orm.Session) -> None:
+            db.query(EPGSource).filter(EPGSource.id == source_id).update(
+                {"content_hash": content_hash, "last_imported_at": now, "horizon_end": horizon_end},
+                synchronize_session=False)
+
+        def publish(db: orm.Session) -> None:
+            if not _finish_import(import_id, "published", db):
+                raise RuntimeError(f"EPG import {import_id} was abandoned before it was published")
+            record_changes(db, stats["inserted"] + stats["updated"] + stats["deleted"])
+            if not sharded:
+                record_import(db)
+
+        horizon_end = None
+        if stats["horizon_end"]:
+            horizon_end = dt.datetime.fromtimestamp(stats["horizon_end"], dt.timezone.utc)
+        # The source is recorded with the switch, or right after it when the guide is on a
+        # shard. Should that fail, the next refresh imports the unchanged feed again
+        sharded = central_session(db) is not db
+        await run_write(db, publish, priority=BULK)
+        if sharded:
+            await run_write(central_session(db), record_import, priority=BULK)
 
     except Exception as e:
         logger.error(f"Failed to store EPG data for user {user_id}, server {server_id}: {e}")
         db.rollback()
+        await run_write(db, lambda db: _finish_import(import_id, "failed", db), priority=BULK)
+        raise
+
+    # Readers stopped seeing the retired rows when the import was published. Its own
+    # rows are cleared, so only the rows of imports under way have added_by set
+    try:
+        await delete_in_batches(db, Programme.__table__, Programme.removed_by == import_id, chunk_size)
+        await update_in_batches(db, Programme.__table__, Programme.added_by == import_id, {"added_by": None},
+                                chunk_size)
+    except Exception as e:
+        logger.warning(f"Failed to clean up the programmes of EPG import {import_id}, "
+                       f"leaving them to gc_epg_imports: {e}")
+        db.rollback()
+
+    logger.info(f"EPG storage completed successfully:")
+    logger.info(f"  - New channels: {stats['new_channels']}")
+    logger.info(f"  - Updated channels: {stats['updated_channels']}")
+    logger.info(f"  - Programmes in feed: {stats['programmes']}")
+    logger.info(f"  - Programmes inserted: {stats['inserted']}, updated: {stats['updated']}, "
+                f"deleted: {stats['deleted']}, unchanged: {stats['unchanged']}")
+    logger.info(f"  - User: {user_id}, Server: {server_id}, Source: {source_id}")
+
+    return {
+        "channels": stats["new_channels"],
+        "programmes": stats["programmes"],
+        "inserted": stats["inserted"],
+        "updated": stats["updated"],
+        "deleted": stats["deleted"],
+        "unchanged": stats["unchanged"],
+        "horizon_end": horizon_end,
+        "success": True
+    }
+
+
+def _begin_import(db: orm.Session, user_id: str, server_id: str) -> str:
+    epg_import = EPGImport(user_id=user_id, server_id=server_id)
+    db.add(epg_import)
+    db.flush()
+    return epg_import.id
+
+
+def _finish_import(import_id: str, status: str, db: orm.Session) -> bool:
+    """Move a loading import to status, False if it isn't loading any more"""
+    return bool(db.query(EPGImport).filter(EPGImport.id == import_id, EPGImport.status == "loading").update(
+        {"status": status, "finished_at": dt.datetime.now(dt.timezone.utc)}, synchronize_session=False))
+
+
+def _visible_programmes() -> sa.ColumnElement:
+    """
+    Condition selecting the programmes readers see. Rows an import adds show
+    and rows it retires disappear in the one update publishing the import
+    """
+    published = sa.select(EPGImport.id).where(EPGImport.status == "published")
+    unpublished = sa.select(EPGImport.id).where(EPGImport.status != "published")
+    return sa.and_(
+        sa.or_(Programme.added_by.is_(None), Programme.added_by.not_in(unpublished)),
+        sa.or_(Programme.removed_by.is_(None), Programme.removed_by.not_in(published)),
+    )
+
+
+def _hidden_programmes() -> sa.Select:
+    """Ids of the programmes _visible_programmes leaves out, none unless an import is under way"""
+    published = sa.select(EPGImport.id).where(EPGImport.status == "published")
+    unpublished = sa.select(EPGImport.id).where(EPGImport.status != "published")
+    return sa.union_all(
+        sa.select(Programme.id).where(Programme.added_by.in_(unpublished)),
+        sa.select(Programme.id).where(Programme.removed_by.in_(published)),
+    )
+
+
+async def _run_in_chunks(db: orm.Session, job: Callable[[orm.Session, int], Optional[int]]) -> None:
+    """Run job(session, after) as bulk writes, passing on the cursor each returns until one returns None"""
+    after = 0
+    while after is not None:
+        after = await run_write(db, job, after, priority=BULK)
+
+
+def _retire_missing_programmes(import_id: str, after: int, limit: int, db: orm.Session,
+                               stats: Dict[str, int]) -> Optional[int]:
+    """Retire the programmes of the import's channels it didn't match, for the next limit ids past after"""
+    programmes = Programme.__table__
+    staged = epg_import_programmes
+    import_channels = sa.select(epg_import_channels.c.channel_id).where(epg_import_channels.c.import_id == import_id)
+    claimed = sa.select(staged.c.programme_id).where(
+        staged.c.import_id == import_id,
+        staged.c.programme_id.is_not(None)
+    )
+
+    in_chunk = sa.and_(programmes.c.channel_id.in_(import_channels), programmes.c.id > after)
+    end = db.execute(sa.select(programmes.c.id).where(in_chunk).order_by(programmes.c.id)
+                     .offset(limit - 1).limit(1)).scalar()
+    if end is not None:
+        in_chunk = sa.and_(in_chunk, programmes.c.id <= end)
+
+    stats["deleted"] += db.execute(sa.update(programmes).where(
+        in_chunk,
+        _visible_programmes(),
+        programmes.c.id.not_in(claimed)
+    ).values(removed_by=import_id)).rowcount
+    return end
+
+
+def _add_staged_programmes(import_id: str, source_id: str, after: int, limit: int,
+                           db: orm.Session) -> Optional[int]:
+    """Add the next limit staged inserts and updates past after as new rows, retiring the rows updates replace"""
+    programmes = Programme.__table__
+    staged = epg_import_programmes
+
+    in_chunk = sa.and_(staged.c.import_id == import_id, staged.c.action.in_(('insert', 'update')),
+                       staged.c.id > after)
+    end = db.execute(sa.select(staged.c.id).where(in_chunk).order_by(staged.c.id).offset(limit - 1).limit(1)).scalar()
+    if end is not None:
+        in_chunk = sa.and_(in_chunk, staged.c.id <= end)
+
+    db.execute(sa.update(programmes).where(programmes.c.id.in_(
+        sa.select(staged.c.programme_id).where(in_chunk, staged.c.action == 'update')
+    )).values(removed_by=import_id))
+
+    # Updated programmes keep when they were first seen
+    replaced = programmes.alias('replaced')
+    columns = [name for name in STAGED_PROGRAMME_COLUMNS if name in programmes.c]
+    values = {name: staged.c[name] for name in columns}
+    values['date_created'] = sa.func.coalesce(
+        sa.select(replaced.c.date_created).where(replaced.c.id == staged.c.programme_id).scalar_subquery(),
+        staged.c.date_created
+    )
+
+    # Ids only grow, so the rows inserted below are the import's rows past this one
+    last_id = db.execute(sa.select(sa.func.max(programmes.c.id))).scalar() or 0
+    db.execute(sa.insert(programmes).from_select(
+        [*columns, 'added_by'],
+        sa.select(*values.values(), sa.literal(import_id)).where(in_chunk).order_by(staged.c.id)
+    ))
+    _index_programmes(source_id, programmes.c.added_by == import_id, db, after_id=last_id)
+    return end
+
+
+def _touch_import_channels(import_id: str, now: dt.datetime, after: int, limit: int,
+                           db: orm.Session) -> Optional[int]:
+    """Record the import's channels past after, limit at a time, as last seen now"""
+    channel_ids = db.execute(sa.select(epg_import_channels.c.channel_id).where(
+        epg_import_channels.c.import_id == import_id,
+        epg_import_channels.c.channel_id > after
+    ).order_by(epg_import_channels.c.channel_id).limit(limit)).scalars().all()
+    db.execute(sa.update(Channel.__table__).where(Channel.__table__.c.id.in_(channel_ids)).values(last_seen_at=now))
+    return channel_ids[-1] if len(channel_ids) == limit else None
+
+
+def _dictionary_ids(model, source_id: str, names: Iterable[str], ids: Dict[str, int], db: orm.Session,
+                    **columns) -> None:
+    """
+    Add the ids of names to ids, inserting the names a source's dictionary table doesn't have yet
+
+    Args:
+        model: Dictionary model with source_id and name columns, Category or Person
+        source_id: EPG source
+        names: Names to look up
+        ids: Name -> id cache, updated in place
+        db: Database session
+        columns: Functions deriving further column values from a new name
+    """
+    missing = list(set(names).difference(ids))
+    step = _max_bind_params(db) - 1
+    for i in range(0, len(missing), step):
+        chunk = missing[i:i + step]
+        ids.update(db.execute(sa.select(model.name, model.id).where(
+            model.source_id == source_id,
+            model.name.in_(chunk)
+        )).all())
+        new_names = [name for name in chunk if name not in ids]
+        if new_names:
+            db.execute(sa.insert(model.__table__), [
+                {'source_id': source_id, 'name': name, **{column: derive(name) for column, derive in columns.items()}}
+                for name in new_names
+            ])
+            ids.update(db.execute(sa.select(model.name, model.id).where(
+                model.source_id == source_id,
+                model.name.in_(new_names)
+            )).all())
+
+
+def _programme_credits(row) -> List[tuple]:
+    """(name, role, character) of each credit of a programmes row, reading packed credits too"""
+    credits = row.credits if row.credits is not None else unpack_fields(row.packed_fields).get('credits')
+    try:
+        credits = json.loads(credits) if credits else None
+    except ValueError:
+        return []
+    if not isinstance(credits, dict):
+        return []
+
+    people = []
+    for role, entries in credits.items():
+        for entry in entries if isinstance(entries, list) else []:
+            name = entry.get('name') if isinstance(entry, dict) else entry
+            if isinstance(name, str) and name.strip():
+                character = entry.get('role') if isinstance(entry, dict) else None
+                people.append((name.strip(), role[:16], character or None))
+    return people
+
+
+def _index_programmes(source_id: str, condition, db: orm.Session, after_id: int = 0) -> None:
+    """
+    Link the programmes matching condition to their categories, people and
+    grid buckets, adding new names to the source's dictionaries
+
+    Args:
+        source_id: EPG source the programmes belong to
+        condition: Filter on the programmes table selecting the programmes to index
+        db: Database session
+        after_id: Only index programmes with a greater id
+    """
+    programmes = Programme.__table__
+    category_ids = dict(db.execute(
+        sa.select(Category.name, Category.id).where(Category.source_id == source_id)
+    ).all())
+    person_ids: Dict[str, int] = {}
+
+    last_id = after_id
+    while True:
+        rows = db.execute(sa.select(
+            programmes.c.id, programmes.c.channel_id, programmes.c.start_epoch, programmes.c.stop_epoch,
+            programmes.c.category_text, programmes.c.credits, programmes.c.packed_fields
+        ).where(
+            condition,
+            programmes.c.id > last_id,
+            programmes.c.start_epoch.is_not(None)
+        ).order_by(programmes.c.id).limit(settings.EPG_STORE_CHUNK_SIZE)).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+
+        categories = {row.id: row.category_text.split(CATEGORY_SEPARATOR) for row in rows if row.category_text}
+        credits = {row.id: _programme_credits(row) for row in rows}
+        _dictionary_ids(Category, source_id, {name for names in categories.values() for name in names},
+                        category_ids, db)
+        _dictionary_ids(Person, source_id, {name for people in credits.values() for name, _, _ in people},
+                        person_ids, db, name_key=person_key)
+
+        category_links = {}
+        people_links = {}
+        bucket_links = []
+        for row in rows:
+            times = (row.start_epoch, row.stop_epoch if row.stop_epoch is not None else row.start_epoch)
+            for name in categories.get(row.id, ()):
+                category_links[(row.id, category_ids[name])] = times
+            for name, role, character in credits[row.id]:
+                people_links.setdefault((row.id, person_ids[name], role), (character,) + times)
+            bucket_links.extend((row.channel_id, bucket, row.id) for bucket in bucket_range(*times))
+
+        bulk_insert(db, programme_categories, ('programme_id', 'category_id', 'start_epoch', 'stop_epoch'),
+                    [key + times for key, times in category_links.items()])
+        bulk_insert(db, programme_people,
+                    ('programme_id', 'person_id', 'role', 'character', 'start_epoch', 'stop_epoch'),
+                    [key + values for key, values in people_links.items()])
+        bulk_insert(db, programme_buckets, ('channel_id', 'bucket', 'programme_id'), bucket_links)
+
+
+async def gc_epg_imports(db: orm.Session, batch_size: Optional[int] = None) -> int:
+    """
+    Delete staged rows of finished or abandoned imports
+
+    Programmes retired by a published import that store_epg_stream didn't get
+    to delete go first, and the import's own rows are cleared of added_by. The
+    programmes added by an import that failed or was abandoned are deleted. Rows are deleted batch_size at a time, each batch a
+    separate write job, so cleaning up a large import never holds the write
+    lock for long.
+
+    Args:
+        db: Database session
+        batch_size: Staged programmes deleted per transaction, defaults to EPG_IMPORT_GC_BATCH_SIZE
+
+    Returns:
+        Number of imports cleaned up
+    """
+    batch_size = batch_size or settings.EPG_IMPORT_GC_BATCH_SIZE
+    stale_before = dt.datetime.now(dt.timezone.utc) - dt.timedelta(hours=settings.EPG_IMPORT_STALE_HOURS)
+    staged = epg_import_programmes
+
+    try:
+        imports = db.query(EPGImport.id, EPGImport.status).filter(sa.or_(
+            EPGImport.status != "loading",
+            EPGImport.started_at < stale_before
+        )).all()
+
+        def delete_batch(db: orm.Session, import_id: str) -> int:
+            batch = sa.select(staged.c.id).where(staged.c.import_id == import_id).limit(batch_size)
+            return db.execute(sa.delete(staged).where(staged.c.id.in_(batch))).rowcount
+
+        def delete_import(db: orm.Session, import_id: str) -> None:
+            db.execute(sa.delete(epg_import_channels).where(epg_import_channels.c.import_id == import_id))
+            db.query(EPGImport).filter(EPGImport.id == import_id).delete(synchronize_session=False)
+
+        for import_id, status in imports:
+            if status == "published":
+                await delete_in_batches(db, Programme.__table__, Programme.removed_by == import_id, batch_size)
+                await update_in_batches(db, Programme.__table__, Programme.added_by == import_id,
+                                        {"added_by": None}, batch_size)
+            else:
+                # Abandoned imports can't be published any more, their rows go with them
+                await run_write(db, lambda db: _finish_import(import_id, "failed", db), priority=BULK)
+                await delete_in_batches(db, Programme.__table__, Programme.added_by == import_id, batch_size)
+            while await run_write(db, delete_batch, import_id, priority=BULK) >= batch_size:
+                pass
+            await run_write(db, delete_import, import_id, priority=BULK)
+
+        if imports:
+            logger.info(f"Cleaned up {len(imports)} finished EPG imports")
+        return len(imports)
+    except Exception as e:
+        logger.error(f"Failed to clean up EPG imports: {e}")
+        db.rollback()
         raise
 
 
-def _prepare_programme_data(xmltv_programme: XMLTVProgramme, channel_id: int) -> dict:
+def _store_channel_chunk(xmltv_channels: List[XMLTVChannel], source_id: str, channel_ids: Dict[str, int],
+                         import_id: str, now: dt.datetime, db: orm.Session, stats: Dict[str, int],
+                         update: bool = True) -> None:
+    """Insert new channels and update changed ones, recording their database ids in channel_ids"""
+    # Last occurrence wins if a feed repeats a channel
+    rows = {
+        xmltv_channel.id: _prepare_channel_data(xmltv_channel, source_id, now)
+        for xmltv_channel in xmltv_channels
+    }
+    if not rows:
+        return
+
+    registered = []
+    for channel_id, xmltv_id, inserted, touched in _upsert_channels(list(rows.values()), now, db, update):
+        if inserted:
+            stats["new_channels"] += 1
+        elif touched:
+            stats["updated_channels"] += 1
+        if xmltv_id not in channel_ids:
+            channel_ids[xmltv_id] = channel_id
+            registered.append(channel_id)
+
+    if registered:
+        db.execute(epg_import_channels.insert(),
+                   [{'import_id': import_id, 'channel_id': channel_id} for channel_id in registered])
+
+
+def _prepare_channel_data(xmltv_channel: XMLTVChannel, source_id: str, now: dt.datetime) -> dict:
+    """Convert XMLTV Channel to a channels row"""
+    return {
+        'source_id': source_id,
+        'xmltv_id': xmltv_channel.id,
+        'display_names': dumps(xmltv_channel.display_names) if xmltv_channel.display_names else None,
+        'icons': dumps(xmltv_channel.icons) if xmltv_channel.icons else None,
+        'urls': dumps(xmltv_channel.urls) if xmltv_channel.urls else None,
+        'date_created': now,
+        'date_last_updated': now
+    }
+
+
+def _max_bind_params(db: orm.Session) -> int:
+    """Largest number of bound parameters a single statement may use"""
+    if db.get_bind().dialect.name == 'sqlite':
+        # Default SQLITE_MAX_VARIABLE_NUMBER of every version from database.MIN_SQLITE_VERSION on
+        return 32766
+    return 32767
+
+
+def _upsert_channels(rows: List[dict], now: dt.datetime, db: orm.Session, update: bool) -> List[tuple]:
+    """
+    Insert or update channels with INSERT ... ON CONFLICT ... RETURNING
+
+    Args:
+        rows: Channel rows from _prepare_channel_data, unique by xmltv_id
+        now: Timestamp of this import, used to tell inserted and touched rows apart
+        db: Database session
+        update: Overwrite existing channels' data, otherwise only look them up
+
+    Returns:
+        List of (id, xmltv_id, inserted, touched) tuples
+    """
+    if db.get_bind().dialect.name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+
+    table = Channel.__table__
+    # Leave headroom for the parameters of the DO UPDATE clause
+    rows_per_statement = max(1, (_max_bind_params(db) - 16) // len(rows[0]))
+
+    results = []
+    for i in range(0, len(rows), rows_per_statement):
+        stmt = insert(table).values(rows[i:i + rows_per_statement])
+        excluded = stmt.excluded
+        if update:
+            columns = ('display_names', 'icons', 'urls')
+            changed = sa.or_(*(table.c[column].is_distinct_from(excluded[column]) for column in columns))
+            set_ = {column: excluded[column] for column in columns}
+            set_['date_last_updated'] = sa.case((changed, excluded.date_last_updated),
+                                                else_=table.c.date_last_updated)
+        else:
+            # A no-op update so RETURNING still yields the existing row
+            set_ = {'xmltv_id': excluded.xmltv_id}
+
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['source_id', 'xmltv_id'],
+            set_=set_
+        ).returning(
+            table.c.id,
+            table.c.xmltv_id,
+            (table.c.date_created == now).label('inserted'),
+            (table.c.date_last_updated == now).label('touched'),
+        )
+        results.extend(tuple(row) for row in db.execute(stmt))
+    return results
+
+
+def _stage_programme_chunk(xmltv_programmes: List[XMLTVProgramme], source_id: str, channel_ids: Dict[str, int],
+                           import_id: str, now: dt.datetime, db: orm.Session, stats: Dict[str, int]) -> None:
+    """Diff one chunk of programmes against the current guide and stage the result"""
+    # Programmes can reference channels that had no <channel> element
+    unknown = {programme.channel for programme in xmltv_programmes if programme.channel not in channel_ids}
+    if unknown:
+        _store_channel_chunk([XMLTVChannel(id=xmltv_id) for xmltv_id in unknown], source_id,
+                             channel_ids, import_id, now, db, stats, update=False)
+
+    prepared = [
+        _prepare_programme_data(xmltv_programme, channel_ids[xmltv_programme.channel], now)
+        for xmltv_programme in xmltv_programmes
+    ]
+    stats["programmes"] += len(prepared)
+    # Latest end time in the feed, how far ahead the guide reaches
+    stats["horizon_end"] = max([stats["horizon_end"], *filter(None, (
+        data['stop_epoch'] or data['start_epoch'] for data in prepared))])
+
+    # Candidate rows for this chunk, skipping any already matched by an earlier chunk. Each
+    # lookup binds a channel and a start time per programme, plus the import id and the
+    # two statuses of _visible_programmes
+    candidates: Dict[int, tuple] = {}
+    step = (_max_bind_params(db) - 3) // 2
+    for i in range(0, len(prepared), step):
+        lookup = prepared[i:i + step]
+        candidates.update((row[0], row) for row in db.execute(sa.select(
+            Programme.id, Programme.channel_id, Programme.start_time,
+            Programme.clumpidx, Programme.content_hash
+        ).where(
+            Programme.channel_id.in_(list({data['channel_id'] for data in lookup})),
+            Programme.start_time.in_(list({data['start_time'] for data in lookup})),
+            _visible_programmes(),
+            Programme.id.not_in(sa.select(epg_import_programmes.c.programme_id).where(
+                epg_import_programmes.c.import_id == import_id,
+                epg_import_programmes.c.programme_id.is_not(None)
+            ))
+        )))
+    existing_programmes: Dict[tuple, List[tuple]] = defaultdict(list)
+    for programme_id, channel_id, start_time, clumpidx, content_hash in candidates.values():
+        existing_programmes[(channel_id, start_time, clumpidx)].append((programme_id, content_hash))
+
+    staged = []
+    kept = []
+    for programme_data in prepared:
+        programme_data['import_id'] = import_id
+        matches = existing_programmes.get(
+            (programme_data['channel_id'], programme_data['start_time'], programme_data['clumpidx']))
+        if not matches:
+            programme_data['action'] = 'insert'
+            programme_data['programme_id'] = None
+            staged.append(_staged_programme_row(programme_data))
+            stats["inserted"] += 1
+            continue
+
+        programme_id, content_hash = matches.pop()
+        if content_hash == programme_data['content_hash']:
+            kept.append((import_id, 'keep', programme_id))
+            stats["unchanged"] += 1
+        else:
+            programme_data['action'] = 'update'
+            programme_data['programme_id'] = programme_id
+            staged.append(_staged_programme_row(programme_data))
+            stats["updated"] += 1
+
+    bulk_insert(db, epg_import_programmes, KEPT_PROGRAMME_COLUMNS, kept)
+
+    if staged:
+        logger.debug(f"Staging {len(staged)} new or changed programmes")
+        bulk_insert(db, epg_import_programmes, STAGED_PROGRAMME_COLUMNS, staged)
+
+
+def _programme_hash(programme_data: dict) -> str:
+    """Hash of a programme's content, used to skip rewriting unchanged rows"""
+    # One update over the joined values, same digest as feeding them one at a time
+    content = '\x1f'.join(
+        '\x00' if value is None else str(value)
+        for value in map(programme_data.get, PROGRAMME_CONTENT_COLUMNS)
+    )
+    return hashlib.sha1((content + '\x1f').encode('utf-8')).hexdigest()
+
+
+def _prepare_programme_data(xmltv_programme: XMLTVProgramme, channel_id: int,
+                            now: Optional[dt.datetime] = None) -> dict:
     """
     Convert an XMLTV Programme object to a dictionary for bulk insert
 
     Args:
         xmltv_programme: Programme object from XMLTV parser
         channel_id: Database ID of the channel this programme belongs to
+        now: Timestamp of this import, defaults to now
 
     Returns:
         dict: Programme data ready for bulk insert
     """
-    import json
-
-    # Helper function to safely serialize JSON
-    def safe_json_dumps(data):
-        return json.dumps(data) if data is not None else None
-
-    return {
+    now = now or dt.datetime.now(dt.timezone.utc)
+    programme_data = {
         'channel_id': channel_id,
         'start_time': xmltv_programme.start,
         'stop_time': xmltv_programme.stop,
+        'start_epoch': xmltv_to_epoch(xmltv_programme.start),
+        'stop_epoch': xmltv_to_epoch(xmltv_programme.stop),
         'pdc_start': xmltv_programme.pdc_start,
         'vps_start': xmltv_programme.vps_start,
         'showview': xmltv_programme.showview,
@@ -176,32 +768,21 @@ def _prepare_programme_data(xmltv_programme: XMLTVProgramme, channel_id: int) ->
         'clumpidx': xmltv_programme.clumpidx,
         'date': xmltv_programme.date,
         'new': xmltv_programme.new,
-        'titles': safe_json_dumps(xmltv_programme.titles),
-        'sub_titles': safe_json_dumps(xmltv_programme.sub_titles),
-        'descriptions': safe_json_dumps(xmltv_programme.descriptions),
-        'credits': safe_json_dumps(xmltv_programme.credits),
-        'categories': safe_json_dumps(xmltv_programme.categories),
-        'keywords': safe_json_dumps(xmltv_programme.keywords),
-        'language': safe_json_dumps(xmltv_programme.language),
-        'orig_language': safe_json_dumps(xmltv_programme.orig_language),
-        'length': safe_json_dumps(xmltv_programme.length),
-        'icons': safe_json_dumps(xmltv_programme.icons),
-        'urls': safe_json_dumps(xmltv_programme.urls),
-        'countries': safe_json_dumps(xmltv_programme.countries),
-        'episode_nums': safe_json_dumps(xmltv_programme.episode_nums),
-        'video': safe_json_dumps(xmltv_programme.video),
-        'audio': safe_json_dumps(xmltv_programme.audio),
-        'previously_shown': safe_json_dumps(xmltv_programme.previously_shown),
-        'premiere': safe_json_dumps(xmltv_programme.premiere),
-        'last_chance': safe_json_dumps(xmltv_programme.last_chance),
-        'subtitles': safe_json_dumps(xmltv_programme.subtitles),
-        'ratings': safe_json_dumps(xmltv_programme.ratings),
-        'star_ratings': safe_json_dumps(xmltv_programme.star_ratings),
-        'reviews': safe_json_dumps(xmltv_programme.reviews),
-        'images': safe_json_dumps(xmltv_programme.images),
-        'date_created': dt.datetime.now(dt.timezone.utc),
-        'date_last_updated': dt.datetime.now(dt.timezone.utc)
+        'date_created': now,
+        'date_last_updated': now,
+        **display_columns(xmltv_programme.titles, xmltv_programme.descriptions, xmltv_programme.categories)
     }
+    programme_data.update(series_columns(xmltv_programme.channel, programme_data['title'],
+                                         xmltv_programme.episode_nums))
+    for field in PROGRAMME_JSON_FIELDS:
+        programme_data[field] = dumps_field(getattr(xmltv_programme, field))
+    programme_data['content_hash'] = _programme_hash(programme_data)
+    programme_data['packed_fields'] = None
+    if settings.EPG_PACK_COLD_FIELDS:
+        programme_data['packed_fields'] = pack_fields(programme_data)
+        for field in COLD_FIELDS:
+            programme_data[field] = None
+    return programme_data
 
 
 def _create_programme_from_xmltv(xmltv_programme: XMLTVProgramme, channel_id: int) -> Programme:
@@ -220,6 +801,8 @@ def _create_programme_from_xmltv(xmltv_programme: XMLTVProgramme, channel_id: in
         channel_id=channel_id,
         start_time=xmltv_programme.start,
         stop_time=xmltv_programme.stop,
+        start_epoch=xmltv_to_epoch(xmltv_programme.start),
+        stop_epoch=xmltv_to_epoch(xmltv_programme.stop),
         pdc_start=xmltv_programme.pdc_start,
         showview=xmltv_programme.showview,
         videoplus=xmltv_programme.videoplus,
@@ -256,7 +839,17 @@ def _create_programme_from_xmltv(xmltv_programme: XMLTVProgramme, channel_id: in
     return db_programme
 
 
-async def get_channel_by_xmltv_id(user_id: str, server_id: int, xmltv_id: str, db: orm.Session) -> Optional[Channel]:
+def _subscribed_channels(user_id: str, server_id, db: orm.Session) -> orm.Query:
+    """Channels of the EPG source a user's server is subscribed to"""
+    return db.query(Channel).join(
+        EPGSourceSubscription, EPGSourceSubscription.source_id == Channel.source_id
+    ).filter(
+        EPGSourceSubscription.user_id == user_id,
+        EPGSourceSubscription.server_id == str(server_id)
+    )
+
+
+async def get_channel_by_xmltv_id(user_id: str, server_id: str, xmltv_id: str, db: orm.Session) -> Optional[Channel]:
     """
     Get a channel by its XMLTV ID for a specific user and server
 
@@ -269,14 +862,10 @@ async def get_channel_by_xmltv_id(user_id: str, server_id: int, xmltv_id: str, d
     Returns:
         Channel object or None if not found
     """
-    return db.query(Channel).filter(
-        Channel.user_id == user_id,
-        Channel.server_id == server_id,
-        Channel.xmltv_id == xmltv_id
-    ).first()
+    return _subscribed_channels(user_id, server_id, db).filter(Channel.xmltv_id == xmltv_id).first()
 
 
-async def get_channels_for_user_server(user_id: str, server_id: int, db: orm.Session) -> List[Channel]:
+async def get_channels_for_user_server(user_id: str, server_id: str, db: orm.Session) -> List[Channel]:
     """
     Get all channels for a specific user and server
 
@@ -288,61 +877,85 @@ async def get_channels_for_user_server(user_id: str, server_id: int, db: orm.Ses
     Returns:
         List of Channel objects
     """
-    return db.query(Channel).filter(
-        Channel.user_id == user_id,
-        Channel.server_id == server_id
-    ).all()
+    return _subscribed_channels(user_id, server_id, db).all()
 
 
-async def get_programmes_for_channel(channel_id: int, db: orm.Session, start_time: Optional[str] = None,
-                                     end_time: Optional[str] = None) -> List[Programme]:
+async def get_programmes_for_channel(channel_id: int, db: orm.Session, start_time=None,
+                                     end_time=None) -> List[Programme]:
     """
     Get programmes for a specific channel, optionally filtered by time range
 
     Args:
         channel_id: Database channel ID
-        start_time: Optional start time filter (XMLTV format)
-        end_time: Optional end time filter (XMLTV format)
+        start_time: Optional start time filter (epoch seconds, datetime or XMLTV format)
+        end_time: Optional end time filter (epoch seconds, datetime or XMLTV format)
         db: Database session
 
     Returns:
         List of Programme objects
     """
-    query = db.query(Programme).filter(Programme.channel_id == channel_id)
+    return _programmes_in_range(db.query(Programme), channel_id, start_time, end_time).all()
+
+
+async def get_programme_listing(channel_id: int, db: orm.Session, start_time=None, end_time=None) -> List[sa.Row]:
+    """
+    Get the display columns of a channel's programmes, without loading the JSON fields
+
+    Args:
+        channel_id: Database channel ID
+        db: Database session
+        start_time: Optional start time filter (epoch seconds, datetime or XMLTV format)
+        end_time: Optional end time filter (epoch seconds, datetime or XMLTV format)
+
+    Returns:
+        List of rows with the LISTING_COLUMNS
+    """
+    query = db.query(*LISTING_COLUMNS)
+    return _programmes_in_range(query, channel_id, start_time, end_time).all()
+
 
-    if start_time:
-        query = query.filter(Programme.start_time >= start_time)
+def _programmes_in_range(query: orm.Query, channel_id: int, start_time, end_time) -> orm.Query:
+    query = query.filter(Programme.channel_id == channel_id, _visible_programmes())
 
-    if end_time:
-        query = query.filter(Programme.start_time <= end_time)
+    start_epoch = to_epoch(start_time)
+    if start_epoch is not None:
+        query = query.filter(Programme.start_epoch >= start_epoch)
 
-    return query.order_by(Programme.start_time).all()
+    end_epoch = to_epoch(end_time)
+    if end_epoch is not None:
+        query = query.filter(Programme.start_epoch <= end_epoch)
 
+    return query.order_by(Programme.start_epoch)
 
-async def get_current_and_next_programmes(channel_id: int, current_time: str, db: orm.Session) -> dict:
+
+async def get_current_and_next_programmes(channel_id: int, current_time, db: orm.Session) -> dict:
     """
     Get current and next programmes for a channel based on the given time
 
     Args:
         channel_id: Database channel ID
-        current_time: Current time in XMLTV format
+        current_time: Current time (epoch seconds, datetime or XMLTV format)
         db: Database session
 
     Returns:
         Dict with 'current' and 'next' programme objects
     """
+    now = to_epoch(current_time)
+
     # Get current programme (started before current_time, ends after current_time)
     current_programme = db.query(Programme).filter(
         Programme.channel_id == channel_id,
-        Programme.start_time <= current_time,
-        Programme.stop_time > current_time
-    ).first()
+        Programme.start_epoch <= now,
+        Programme.stop_epoch > now,
+        _visible_programmes()
+    ).order_by(Programme.start_epoch.desc()).first()
 
     # Get next programme (starts after current time)
     next_programme = db.query(Programme).filter(
         Programme.channel_id == channel_id,
-        Programme.start_time > current_time
-    ).order_by(Programme.start_time).first()
+        Programme.start_epoch > now,
+        _visible_programmes()
+    ).order_by(Programme.start_epoch).first()
 
     return {
         "current": current_programme,
@@ -350,44 +963,401 @@ async def get_current_and_next_programmes(channel_id: int, current_time: str, db
     }
 
 
-async def delete_epg_data_for_user_server(user_id: str, server_id: int, db: orm.Session):
+def _now_epoch(now) -> int:
+    return to_epoch(now) if now is not None else int(dt.datetime.now(dt.timezone.utc).timestamp())
+
+
+def _search_terms(text: str) -> List[str]:
+    return re.findall(r"\w+", text or "")
+
+
+def _search_match(terms: List[str], dialect: str):
+    """Ranked matches for the terms, every term must match and the last one may be a prefix"""
+    if dialect == 'sqlite':
+        query = " ".join(f'"{term}"' for term in terms) + "*"
+        search = sa.table(SEARCH_TABLE, sa.column('rowid'))
+        return sa.select(
+            search.c.rowid.label('programme_id'),
+            # bm25 is lower for better matches, titles weigh most
+            sa.literal_column(f"bm25({SEARCH_TABLE}, 10.0, 5.0, 1.0)").label('rank')
+        ).where(sa.text(f"{SEARCH_TABLE} MATCH :match").bindparams(match=query)).subquery()
+
+    if dialect == 'postgresql':
+        vector = sa.literal_column(f"({PG_SEARCH_VECTOR})")
+        query = sa.func.to_tsquery('simple', " & ".join(terms) + ":*")
+        return sa.select(
+            Programme.id.label('programme_id'),
+            (-sa.func.ts_rank(vector, query)).label('rank')
+        ).where(vector.op('@@')(query)).subquery()
+
+    return sa.select(Programme.id.label('programme_id'), sa.literal(0).label('rank')).where(
+        *[Programme.titles.ilike(f"%{term}%") for term in terms]
+    ).subquery()
+
+
+async def search_programmes(user_id: str, text: str, db: orm.Session, server_id: Optional[str] = None,
+                            now=None, limit: int = 20, offset: int = 0) -> Dict:
+    """
+    Full-text search of the upcoming programmes on a user's channels
+
+    Titles, sub-titles and descriptions are searched through the FTS5 index on
+    SQLite or the tsvector index on PostgreSQL. Every word has to match, the
+    last one as a prefix, and results are ranked by relevance then start time.
+
+    Args:
+        user_id: User ID
+        text: Words to search for
+        db: Database session
+        server_id: Only search this server's channels
+        now: Programmes that ended before this are skipped (epoch seconds, datetime or XMLTV format), defaults to now
+        limit: Page size
+        offset: Number of results to skip
+
+    Returns:
+        Dict with the total number of matches and a page of (Programme, Channel) results
+    """
+    terms = _search_terms(text)
+    if not terms:
+        return {"total": 0, "results": []}
+
+    now = _now_epoch(now)
+    sources = sa.select(EPGSourceSubscription.source_id).where(EPGSourceSubscription.user_id == user_id)
+    if server_id is not None:
+        sources = sources.where(EPGSourceSubscription.server_id == str(server_id))
+
+    matched = _search_match(terms, db.get_bind().dialect.name)
+    query = db.query(Programme, Channel).join(
+        matched, matched.c.programme_id == Programme.id
+    ).join(
+        Channel, Channel.id == Programme.channel_id
+    ).filter(
+        Channel.source_id.in_(sources),
+        sa.or_(Programme.stop_epoch > now, sa.and_(Programme.stop_epoch.is_(None), Programme.start_epoch >= now)),
+        _visible_programmes()
+    )
+
+    return {
+        "total": query.count(),
+        "results": query.order_by(matched.c.rank, Programme.start_epoch, Programme.id).offset(offset).limit(limit).all()
+    }
+
+
+def _server_source(user_id: str, server_id) -> sa.Select:
+    """The EPG source a user's server is subscribed to"""
+    return sa.select(EPGSourceSubscription.source_id).where(
+        EPGSourceSubscription.user_id == user_id,
+        EPGSourceSubscription.server_id == str(server_id)
+    )
+
+
+def _server_categories(user_id: str, server_id) -> sa.Select:
+    return sa.select(Category.id).where(Category.source_id.in_(_server_source(user_id, server_id)))
+
+
+async def get_categories_for_server(user_id: str, server_id: str, db: orm.Session, now=None) -> List[tuple]:
     """
-    Delete all EPG data (channels and programmes) for a specific user and server
+    Get the categories of a server's guide with the number of programmes yet to end in each
 
     Args:
         user_id: User ID
         server_id: Server ID
         db: Database session
+        now: Programmes that ended before this are not counted (epoch seconds, datetime or XMLTV format),
+            defaults to now
+
+    Returns:
+        List of (name, programme count) tuples ordered by name, categories without programmes are left out
     """
-    try:
-        # Get all channels for this user/server
-        channels = db.query(Channel).filter(
-            Channel.user_id == user_id,
-            Channel.server_id == server_id
-        ).all()
-
-        channel_ids = [channel.id for channel in channels]
-
-        if channel_ids:
-            # Delete programmes first (due to foreign key constraint)
-            programmes_deleted = db.query(Programme).filter(
-                Programme.channel_id.in_(channel_ids)
-            ).delete(synchronize_session=False)
-
-            # Delete channels
-            channels_deleted = db.query(Channel).filter(
-                Channel.user_id == user_id,
-                Channel.server_id == server_id
-            ).delete(synchronize_session=False)
-
-            db.commit()
-
-            logger.info(f"Deleted EPG data for user {user_id}, server {server_id}: "
-                        f"{channels_deleted} channels, {programmes_deleted} programmes")
-        else:
-            logger.info(f"No EPG data found to delete for user {user_id}, server {server_id}")
+    links = programme_categories
+    return [tuple(row) for row in db.query(Category.name, sa.func.count()).join(
+        links, links.c.category_id == Category.id
+    ).filter(
+        Category.id.in_(_server_categories(user_id, server_id)),
+        links.c.stop_epoch > _now_epoch(now),
+        links.c.programme_id.not_in(_hidden_programmes())
+    ).group_by(Category.id, Category.name).order_by(Category.name).all()]
+
+
+async def get_programmes_by_category(user_id: str, server_id: str, category: str, db: orm.Session, now=None,
+                                     hours: int = 3, limit: int = 50, offset: int = 0) -> Dict:
+    """
+    Get the programmes of a category that are on now or start within the next hours, across a server's channels
+
+    The category is matched case-insensitively and the programmes are found
+    through the programme_categories index, without reading the JSON fields.
+
+    Args:
+        user_id: User ID
+        server_id: Server ID
+        category: Category name
+        db: Database session
+        now: Start of the window (epoch seconds, datetime or XMLTV format), defaults to now
+        hours: Length of the window
+        limit: Page size
+        offset: Number of results to skip
+
+    Returns:
+        Dict with the total number of programmes and a page of (Programme, Channel) results ordered by start time
+    """
+    now = _now_epoch(now)
+    links = programme_categories
+    query = db.query(Programme, Channel).join(
+        links, links.c.programme_id == Programme.id
+    ).join(
+        Channel, Channel.id == Programme.channel_id
+    ).filter(
+        links.c.category_id.in_(_server_categories(user_id, server_id).where(
+            sa.func.lower(Category.name) == category.lower()
+        )),
+        links.c.stop_epoch > now,
+        links.c.start_epoch < now + hours * 3600,
+        _visible_programmes()
+    ).options(orm.load_only(*LISTING_COLUMNS))
+
+    return {
+        "total": query.count(),
+        "results": query.order_by(links.c.start_epoch, Programme.id).offset(offset).limit(limit).all()
+    }
+
+
+async def get_programmes_by_person(user_id: str, server_id: str, name: str, db: orm.Session, now=None,
+                                   limit: int = 50, offset: int = 0) -> Dict:
+    """
+    Get the programmes yet to end that credit a person whose name starts with name, across a server's channels
+
+    Names are compared case-insensitively, on the people index of the
+    server's EPG source and then the programme_people index.
+
+    Args:
+        user_id: User ID
+        server_id: Server ID
+        name: Start of the person's name
+        db: Database session
+        now: Programmes that ended before this are skipped (epoch seconds, datetime or XMLTV format), defaults to now
+        limit: Page size
+        offset: Number of results to skip
+
+    Returns:
+        Dict with the total number of credits and a page of (Programme, Channel, name, role, character) results
+        ordered by start time
+    """
+    key = person_key(name)
+    if not key:
+        return {"total": 0, "results": []}
+
+    links = programme_people
+    people = sa.select(Person.id).where(
+        Person.source_id.in_(_server_source(user_id, server_id)),
+        Person.name_key >= key,
+        Person.name_key < key + "\U0010ffff"
+    )
+    query = db.query(Programme, Channel, Person.name, links.c.role, links.c.character).join(
+        links, links.c.programme_id == Programme.id
+    ).join(
+        Person, Person.id == links.c.person_id
+    ).join(
+        Channel, Channel.id == Programme.channel_id
+    ).filter(
+        links.c.person_id.in_(people),
+        links.c.stop_epoch > _now_epoch(now),
+        _visible_programmes()
+    ).options(orm.load_only(*LISTING_COLUMNS))
+
+    return {
+        "total": query.count(),
+        "results": query.order_by(links.c.start_epoch, Programme.id, Person.name, links.c.role)
+        .offset(offset).limit(limit).all()
+    }
+
+
+async def get_series_airings(user_id: str, series_key: str, db: orm.Session, server_id: Optional[str] = None,
+                             now=None, limit: int = 10, new_only: bool = False) -> List[tuple]:
+    """
+    Get the next airings of a series on a user's channels, from the (series_key, start_epoch) index
+
+    Args:
+        user_id: User ID
+        series_key: Series key of one of the series' programmes, see series_columns
+        db: Database session
+        server_id: Only look at this server's channels
+        now: Airings that ended before this are skipped (epoch seconds, datetime or XMLTV format), defaults to now
+        limit: Number of airings
+        new_only: Only airings flagged as new episodes
+
+    Returns:
+        List of (Programme, Channel) tuples ordered by start time
+    """
+    now = _now_epoch(now)
+    sources = sa.select(EPGSourceSubscription.source_id).where(EPGSourceSubscription.user_id == user_id)
+    if server_id is not None:
+        sources = sources.where(EPGSourceSubscription.server_id == str(server_id))
+
+    query = db.query(Programme, Channel).join(
+        Channel, Channel.id == Programme.channel_id
+    ).filter(
+        Programme.series_key == series_key,
+        Channel.source_id.in_(sources),
+        sa.or_(Programme.stop_epoch > now, sa.and_(Programme.stop_epoch.is_(None), Programme.start_epoch >= now)),
+        _visible_programmes()
+    ).options(orm.load_only(*LISTING_COLUMNS, Programme.new))
+    if new_only:
+        query = query.filter(Programme.new.is_(True))
+
+    return query.order_by(Programme.start_epoch, Programme.id).limit(limit).all()
+
+
+async def get_programme_grid(user_id: str, server_id: str, db: orm.Session, start=None, hours: int = 4,
+                             channels: Optional[List[str]] = None, limit: int = 200, offset: int = 0) -> Dict:
+    """
+    Get the programmes overlapping a time window on a page of a server's channels, for a guide grid
+
+    Programmes are found through the programme_buckets index, by equality on
+    each channel and each hour the window covers, so the cost depends on the
+    window rather than on how far the guide reaches.
+
+    Args:
+        user_id: User ID
+        server_id: Server ID
+        db: Database session
+        start: Start of the window (epoch seconds, datetime or XMLTV format), defaults to now
+        hours: Length of the window
+        channels: XMLTV ids of the channels to include, defaults to all of them
+        limit: Channels per page
+        offset: Number of channels to skip
+
+    Returns:
+        Dict with the total number of channels and a page of (Channel, listing rows) tuples in channel order,
+        each channel's rows having the LISTING_COLUMNS and ordered by start time
+    """
+    start = _now_epoch(start)
+    end = start + hours * 3600
+
+    channel_query = _subscribed_channels(user_id, server_id, db)
+    if channels:
+        channel_query = channel_query.filter(Channel.xmltv_id.in_(channels))
+    page = channel_query.order_by(Channel.id).offset(offset).limit(limit).all()
+
+    programmes: Dict[int, List[sa.Row]] = defaultdict(list)
+    if page:
+        for row in _grid_programmes([channel.id for channel in page], start, end, db):
+            programmes[row.channel_id].append(row)
+
+    return {
+        "total": channel_query.count(),
+        "results": [(channel, programmes[channel.id]) for channel in page]
+    }
+
+
+def _grid_programmes(channel_ids: List[int], start: int, end: int, db: orm.Session) -> List[sa.Row]:
+    """Listing rows of the programmes on channel_ids overlapping [start, end), by channel and start time"""
+    in_window = sa.select(programme_buckets.c.programme_id).where(
+        programme_buckets.c.channel_id.in_(channel_ids),
+        programme_buckets.c.bucket.in_(list(bucket_range(start, end)))
+    )
+    return db.query(*LISTING_COLUMNS).filter(
+        Programme.id.in_(in_window),
+        Programme.start_epoch < end,
+        sa.or_(
+            Programme.stop_epoch > start,
+            sa.and_(Programme.stop_epoch.is_(None), Programme.start_epoch >= start)
+        ),
+        _visible_programmes()
+    ).order_by(Programme.channel_id, Programme.start_epoch).all()
+
+
+async def delete_epg_data_for_user_server(user_id: str, server_id: str, db: orm.Session,
+                                          batch_size: Optional[int] = None):
+    """
+    Unsubscribe a user's server from its EPG source, deleting the source's
+    channels and programmes if no other server uses it
+
+    The subscription is deleted in one small write, the source's guide in
+    batches after it, see delete_unused_source.
 
+    Args:
+        user_id: User ID
+        server_id: Server ID
+        db: Database session
+        batch_size: Rows deleted per transaction, defaults to EPG_RETENTION_BATCH_SIZE
+    """
+    try:
+        source_id = await run_write(central_session(db), unsubscribe_server, user_id, str(server_id))
+        if source_id is not None:
+            await delete_unused_source(db, source_id, batch_size)
     except Exception as e:
         logger.error(f"Failed to delete EPG data for user {user_id}, server {server_id}: {e}")
         db.rollback()
         raise
+
+
+def unsubscribe_server(db: orm.Session, user_id: str, server_id: str) -> Optional[str]:
+    """
+    Write job deleting a server's EPG subscription
+
+    Returns:
+        Id of the source the server subscribed to if no other server uses it now, None otherwise
+    """
+    subscription = db.query(EPGSourceSubscription).filter(
+        EPGSourceSubscription.user_id == user_id,
+        EPGSourceSubscription.server_id == server_id
+    ).first()
+
+    if not subscription:
+        logger.info(f"No EPG data found to delete for user {user_id}, server {server_id}")
+        return None
+
+    source_id = subscription.source_id
+    db.delete(subscription)
+    db.flush()
+
+    if db.query(EPGSourceSubscription).filter(EPGSourceSubscription.source_id == source_id).first():
+        logger.info(f"Unsubscribed user {user_id}, server {server_id} from shared EPG source {source_id}")
+        return None
+    return source_id
+
+
+async def delete_unused_source(db: orm.Session, source_id: str, batch_size: Optional[int] = None) -> bool:
+    """
+    Delete an EPG source no server subscribes to, with its programmes, channels, categories and people
+
+    Rows are deleted batch_size at a time, each batch a bulk write of its own,
+    so interactive writes get in between. Every batch checks the source is
+    still unused, so a server subscribing to it again part way through keeps
+    whatever is left. Its content hash is cleared first, making the next
+    refresh import the whole feed again.
+
+    Args:
+        db: Session on the database holding the source's guide
+        source_id: EPG source
+        batch_size: Rows deleted per transaction, defaults to EPG_RETENTION_BATCH_SIZE
+
+    Returns:
+        Whether the source was deleted, False if a server subscribed to it again
+    """
+    batch_size = batch_size or settings.EPG_RETENTION_BATCH_SIZE
+    unused = ~sa.exists().where(EPGSourceSubscription.source_id == source_id)
+
+    await run_write(central_session(db), _forget_source_import, source_id, unused, priority=BULK)
+    channel_ids = sa.select(Channel.id).where(Channel.source_id == source_id)
+    programmes = await delete_in_batches(db, Programme.__table__, sa.and_(
+        unused, Programme.__table__.c.channel_id.in_(channel_ids)), batch_size)
+    channels = await delete_in_batches(db, Channel.__table__, sa.and_(
+        unused, Channel.__table__.c.source_id == source_id), batch_size)
+    for model in (Category, Person):
+        await delete_in_batches(db, model.__table__, sa.and_(unused, model.__table__.c.source_id == source_id),
+                                batch_size)
+
+    if not await run_write(central_session(db), _delete_source, source_id, unused, priority=BULK):
+        logger.info(f"EPG source {source_id} is in use again, stopped deleting it")
+        return False
+    logger.info(f"Deleted EPG source {source_id}: {channels} channels, {programmes} programmes")
+    return True
+
+
+def _forget_source_import(db: orm.Session, source_id: str, unused) -> None:
+    db.execute(sa.update(EPGSource.__table__).where(EPGSource.__table__.c.id == source_id, unused)
+               .values(content_hash=None))
+
+
+def _delete_source(db: orm.Session, source_id: str, unused) -> int:
+    return db.execute(sa.delete(EPGSource.__table__).where(EPGSource.__table__.c.id == source_id, unused)).rowcount
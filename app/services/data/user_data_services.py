@@ -4,14 +4,20 @@ import jwt
 import passlib.hash as passlib_hash
 import sqlalchemy.orm as orm
 
+from app import database
+from app.models.refresh_schedule import RefreshSchedule
 from app.models.server import Server
 from app.models.user import User
 from app.schemas.server import ServerCreate as ServerCreate
 from app.schemas.user import User as UserSchema
 from app.schemas.user import UserCreate
 from app.services.config import settings
+from app.services.data.epg_data_services import delete_unused_source, unsubscribe_server
 from app.services.db_factory import get_db
+from app.services.epg_shards import epg_session
 from app.services.logger import get_logger
+from app.services.read_routing import USER_INFO_KEY, use_replica
+from app.services.write_queue import run_write
 
 logger = get_logger(__name__)
 oauth2schema = security.OAuth2PasswordBearer(tokenUrl="/api/v2/user/token")
@@ -43,6 +49,8 @@ async def get_current_user(
                 status_code=401, detail="User not found")
 
         logger.debug(f"Token validated successfully for user: {user.email}")
+        # Writes on the request's session send this user's next reads to the primary
+        db.info[USER_INFO_KEY] = user.id
         return UserSchema.model_validate(user)
 
     except jwt.ExpiredSignatureError:
@@ -57,14 +65,41 @@ async def get_current_user(
             status_code=401, detail="Invalid Email or Password")
 
 
+def get_read_db(
+    current_user: UserSchema = fastapi.Depends(get_current_user),
+    db: orm.Session = fastapi.Depends(get_db),
+):
+    """
+    Session for read-only endpoints
+
+    Reads from the replica set with DATABASE_READ_URL, unless the user wrote
+    within DATABASE_READ_AFTER_WRITE_SECONDS or the replica lags too far
+    behind, in which case db, on the primary, is used.
+    """
+    if not use_replica(current_user.id):
+        yield db
+        return
+    logger.debug(f"Reading from the replica for user {current_user.id}")
+    read_db = database.ReadSessionLocal()
+    try:
+        yield read_db
+    finally:
+        read_db.close()
+
+
+def _insert_user(db: orm.Session, email: str, hashed_password: str) -> User:
+    db_user = User(email=email, hashed_password=hashed_password)
+    db.add(db_user)
+    db.commit()
+    db.refresh(db_user)
+    return db_user
+
+
 async def create_user(user: UserCreate, db: orm.Session):
     logger.info(f"Creating new user in database: {user.email}")
     try:
         hashed_password = passlib_hash.bcrypt.hash(user.password)
-        db_user = User(email=user.email, hashed_password=hashed_password)
-        db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        db_user = await run_write(db, _insert_user, user.email, hashed_password)
         logger.info(f"User created successfully in database: {user.email}")
         return db_user
     except Exception as e:
@@ -116,13 +151,18 @@ async def get_user_servers(user_id: str, db: orm.Session):
         raise
 
 
+def _insert_server(db: orm.Session, values: dict, user_id: str) -> Server:
+    db_server = Server(**values, owner_id=user_id)
+    db.add(db_server)
+    db.commit()
+    db.refresh(db_server)
+    return db_server
+
+
 async def create_server(server: ServerCreate, user_id: str, db: orm.Session):
     logger.info(f"Creating server '{server.name}' for user ID: {user_id}")
     try:
-        db_server = Server(**server.dict(), owner_id=user_id)
-        db.add(db_server)
-        db.commit()
-        db.refresh(db_server)
+        db_server = await run_write(db, _insert_server, server.dict(), user_id)
         logger.info(
             f"Server '{server.name}' created successfully for user ID: {user_id}")
         return db_server
@@ -134,14 +174,30 @@ async def create_server(server: ServerCreate, user_id: str, db: orm.Session):
 
 
 async def delete_server(server_id: str, db: orm.Session):
+    """
+    Delete a server with its refresh schedule and EPG subscription in one write,
+    then the guide of its EPG source in batches if no other server uses it
+    """
     logger.info(f"Deleting server ID: {server_id}")
+
+    def delete(db: orm.Session):
+        owner_id = db.query(Server.owner_id).filter(Server.id == server_id).scalar()
+        if owner_id is None:
+            return None, None
+        source_id = unsubscribe_server(db, owner_id, server_id)
+        db.query(RefreshSchedule).filter(RefreshSchedule.server_id == server_id).delete(synchronize_session=False)
+        db.query(Server).filter(Server.id == server_id).delete(synchronize_session=False)
+        return owner_id, source_id
+
     try:
-        result = db.query(Server).filter(Server.id == server_id).delete()
-        db.commit()
-        if result:
-            logger.info(f"Server ID {server_id} deleted successfully")
-        else:
+        owner_id, source_id = await run_write(db, delete)
+        if owner_id is None:
             logger.warning(f"Server ID {server_id} not found for deletion")
+            return
+        logger.info(f"Server ID {server_id} deleted successfully")
+        if source_id is not None:
+            with epg_session(owner_id, db) as epg_db:
+                await delete_unused_source(epg_db, source_id)
     except Exception as e:
         logger.error(f"Failed to delete server ID {server_id}: {e}")
         db.rollback()
@@ -0,0 +1,181 @@
+import datetime as dt
+import time
+from typing import Dict, Optional
+
+import sqlalchemy as sa
+import sqlalchemy.orm as orm
+
+from app.models.db_maintenance import DBMaintenance
+from app.models.programme import COLD_FIELDS, Programme, pack_fields, unpack_fields
+from app.services.config import settings
+from app.services.logger import get_logger
+from app.services.write_queue import BULK, run_write
+
+logger = get_logger(__name__)
+
+# Tables whose contents, and so planner statistics, churn with every import
+EPG_TABLES = (
+    "programmes", "channels", "programme_categories", "programme_people", "programme_buckets", "categories", "people",
+)
+
+STATE_ID = 1
+
+
+def record_changes(db: orm.Session, rows: int) -> None:
+    """Add rows to the programme rows changed since the last maintenance run, in the caller's transaction"""
+    if not rows:
+        return
+    table = DBMaintenance.__table__
+    updated = db.execute(sa.update(table).where(table.c.id == STATE_ID).values(
+        rows_changed=table.c.rows_changed + rows)).rowcount
+    if not updated:
+        db.add(DBMaintenance(id=STATE_ID, rows_changed=rows))
+        db.flush()
+
+
+def _convert_cold_field_rows(db: orm.Session, pack: bool, after: int, limit: int) -> Optional[int]:
+    """Pack or unpack the cold fields of the next limit programmes past after, returns the last id looked at"""
+    programmes = Programme.__table__
+    rows = db.execute(sa.select(programmes.c.id, programmes.c.packed_fields,
+                                *[programmes.c[field] for field in COLD_FIELDS])
+                      .where(programmes.c.id > after).order_by(programmes.c.id).limit(limit)).mappings().all()
+
+    updates = []
+    for row in rows:
+        if pack and all(row[field] is None for field in COLD_FIELDS) or not pack and row['packed_fields'] is None:
+            continue
+        unpacked = unpack_fields(row['packed_fields'])
+        values = {field: row[field] if row[field] is not None else unpacked.get(field) for field in COLD_FIELDS}
+        if pack:
+            values = {'packed_fields': pack_fields(values), **{field: None for field in COLD_FIELDS}}
+        else:
+            values['packed_fields'] = None
+        updates.append({'row_id': row['id'], **values})
+
+    if updates:
+        db.execute(sa.update(programmes).where(programmes.c.id == sa.bindparam('row_id')), updates)
+    return rows[-1]['id'] if len(rows) == limit else None
+
+
+def _record_cold_fields_packed(db: orm.Session, pack: bool) -> None:
+    state = db.get(DBMaintenance, STATE_ID)
+    if state is None:
+        state = DBMaintenance(id=STATE_ID, rows_changed=0)
+        db.add(state)
+    state.cold_fields_packed = pack
+
+
+async def convert_cold_fields(db: orm.Session, batch_size: Optional[int] = None) -> bool:
+    """
+    Bring every programme's cold fields into the format EPG_PACK_COLD_FIELDS asks for
+
+    Imports write new rows in that format, but unchanged rows keep the one they
+    were stored in. The format the rows were last converted to is kept in
+    db_maintenance, so the programmes are only walked when the setting changed.
+
+    Args:
+        db: Database session
+        batch_size: Programmes looked at per transaction, defaults to EPG_RETENTION_BATCH_SIZE
+
+    Returns:
+        Whether the programmes were walked
+    """
+    batch_size = batch_size or settings.EPG_RETENTION_BATCH_SIZE
+    pack = settings.EPG_PACK_COLD_FIELDS
+    state = db.get(DBMaintenance, STATE_ID)
+    if state is not None and state.cold_fields_packed == pack:
+        return False
+
+    try:
+        after = 0
+        while after is not None:
+            after = await run_write(db, _convert_cold_field_rows, pack, after, batch_size, priority=BULK)
+        await run_write(db, _record_cold_fields_packed, pack, priority=BULK)
+        logger.info(f"{'Packed' if pack else 'Unpacked'} the cold fields of the stored programmes")
+        return True
+    except Exception as e:
+        logger.error(f"Failed to convert the cold fields of the stored programmes: {e}")
+        db.rollback()
+        raise
+
+
+def is_maintenance_due(state: Optional[DBMaintenance], now: dt.datetime) -> bool:
+    if state is None or state.rows_changed < settings.DB_MAINTENANCE_MIN_ROWS_CHANGED:
+        return False
+    if state.last_run_at is None:
+        return True
+    # SQLite hands DateTime columns back without tzinfo
+    last_run_at = state.last_run_at.replace(tzinfo=state.last_run_at.tzinfo or dt.timezone.utc)
+    return now - last_run_at >= dt.timedelta(hours=settings.DB_MAINTENANCE_MIN_INTERVAL_HOURS)
+
+
+def _refresh_statistics(db: orm.Session, reindex: bool) -> None:
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        db.execute(sa.text(f"PRAGMA analysis_limit = {int(settings.DB_MAINTENANCE_ANALYSIS_LIMIT)}"))
+        for table in EPG_TABLES:
+            if reindex:
+                db.execute(sa.text(f"REINDEX {table}"))
+            db.execute(sa.text(f"ANALYZE {table}"))
+        # Covers whatever else SQLite thinks is worth analysing
+        db.execute(sa.text("PRAGMA optimize"))
+    elif dialect == "postgresql":
+        for table in EPG_TABLES:
+            if reindex:
+                db.execute(sa.text(f"REINDEX TABLE {table}"))
+            db.execute(sa.text(f"ANALYZE {table}"))
+
+
+def _run_maintenance(db: orm.Session, now: dt.datetime, reindex: bool) -> Dict:
+    state = db.get(DBMaintenance, STATE_ID)
+    rows = state.rows_changed if state else 0
+
+    started = time.monotonic()
+    _refresh_statistics(db, reindex)
+    duration = time.monotonic() - started
+
+    if state is None:
+        state = DBMaintenance(id=STATE_ID, rows_changed=0)
+        db.add(state)
+    else:
+        # Subtracted rather than zeroed so changes recorded meanwhile on another connection carry over
+        state.rows_changed = DBMaintenance.rows_changed - rows
+    state.last_run_at = now
+    state.last_duration_seconds = duration
+    state.last_rows_changed = rows
+    state.last_reindexed = reindex
+    return {"rows_changed": rows, "duration_seconds": duration, "reindexed": reindex}
+
+
+async def run_db_maintenance(db: orm.Session, now: Optional[dt.datetime] = None,
+                             force: bool = False) -> Optional[Dict]:
+    """
+    Refresh the planner statistics of the EPG tables once enough programmes changed
+
+    Runs ANALYZE (and PRAGMA optimize on SQLite), plus REINDEX when
+    DB_MAINTENANCE_REINDEX is set, if at least DB_MAINTENANCE_MIN_ROWS_CHANGED
+    programme rows changed and the last run is DB_MAINTENANCE_MIN_INTERVAL_HOURS
+    ago.
+
+    Args:
+        db: Database session
+        now: Current time, defaults to now
+        force: Run even if it isn't due
+
+    Returns:
+        Dict with the rows changed since the last run, the duration and whether
+        indexes were rebuilt, or None if maintenance wasn't due
+    """
+    now = now or dt.datetime.now(dt.timezone.utc)
+    try:
+        if not force and not is_maintenance_due(db.get(DBMaintenance, STATE_ID), now):
+            return None
+
+        result = await run_write(db, _run_maintenance, now, settings.DB_MAINTENANCE_REINDEX, priority=BULK)
+        logger.info(f"Database maintenance after {result['rows_changed']} changed programmes took "
+                    f"{result['duration_seconds']:.2f}s{' with reindex' if result['reindexed'] else ''}")
+        return result
+    except Exception as e:
+        logger.error(f"Database maintenance failed: {e}")
+        db.rollback()
+        raise
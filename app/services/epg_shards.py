@@ -0,0 +1,225 @@
+import bisect
+import functools
+import hashlib
+import threading
+import zlib
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import sqlalchemy as sa
+import sqlalchemy.dialects.sqlite as sqlite
+import sqlalchemy.orm as orm
+import sqlalchemy.schema as schema
+
+from app import database
+from app.models.category import Category, programme_categories
+from app.models.channel import Channel
+from app.models.db_maintenance import DBMaintenance
+from app.models.epg_import import EPGImport, epg_import_channels, epg_import_programmes
+from app.models.epg_source import EPGSource, EPGSourceSubscription
+from app.models.person import Person, programme_people
+from app.models.programme import Programme
+from app.models.programme_bucket import programme_buckets
+from app.models.refresh_schedule import RefreshSchedule
+from app.services.config import settings
+from app.services.logger import get_logger
+from app.services.write_queue import run_write_blocking, start_writer, stop_writer
+
+logger = get_logger(__name__)
+
+# Tables kept in the shards, everything else (users, servers, EPG sources and
+# subscriptions, refresh schedules) stays in the main database. Shard
+# connections attach the main database, so queries joining the two resolve
+# unqualified table names to the shard first and the main database second.
+SHARD_TABLES = (
+    Channel.__table__, Programme.__table__, Category.__table__, programme_categories, Person.__table__,
+    programme_people, programme_buckets, EPGImport.__table__, epg_import_channels, epg_import_programmes,
+    DBMaintenance.__table__,
+)
+CENTRAL_SCHEMA = "central"
+# Session.info key holding the name of the shard a session is bound to
+SHARD_INFO_KEY = "epg_shard"
+# Session.info key of a shard session holding the main database session it was
+# opened from. Writes to the main database's tables go through that session,
+# and so through its writer, not through the attached schema
+CENTRAL_INFO_KEY = "central_session"
+# Points per shard on the hash ring, more spread users more evenly
+RING_REPLICAS = 128
+
+_engines: Dict[str, sa.engine.Engine] = {}
+_engines_lock = threading.Lock()
+
+
+def _ring_hash(key: str) -> int:
+    return int.from_bytes(hashlib.sha1(key.encode()).digest()[:8], "big")
+
+
+@functools.lru_cache(maxsize=8)
+def _ring(names: Tuple[str, ...]) -> Tuple[List[int], List[str]]:
+    points = sorted((_ring_hash(f"{name}#{i}"), name) for name in names for i in range(RING_REPLICAS))
+    return [point for point, _ in points], [name for _, name in points]
+
+
+def shard_for(user_id: str) -> Optional[str]:
+    """
+    Name of the EPG shard holding a user's guides, or None when EPG_SHARDS is empty
+
+    Shards are placed on a consistent hash ring, so adding a shard only moves
+    the users that now hash to it.
+    """
+    if not settings.EPG_SHARDS:
+        return None
+    points, names = _ring(tuple(sorted(settings.EPG_SHARDS)))
+    return names[bisect.bisect(points, _ring_hash(str(user_id))) % len(points)]
+
+
+def source_key(shard: Optional[str], key: str) -> str:
+    """Key of an EPG source stored in shard, servers only share sources within a shard"""
+    return f"shard:{shard}:{key}" if shard else key
+
+
+def _in_shard(name: str) -> sa.ColumnElement:
+    prefix = source_key(name, "")
+    return sa.func.substr(EPGSource.url, 1, len(prefix)) == prefix
+
+
+def owns_source(db: orm.Session) -> sa.ColumnElement:
+    """Condition selecting the EPG sources whose guides are stored in db's database"""
+    shard = db.info.get(SHARD_INFO_KEY)
+    if shard:
+        return _in_shard(shard)
+    # Sources from before sharding was turned on stay in the main database
+    return sa.and_(sa.true(), *[sa.not_(_in_shard(name)) for name in settings.EPG_SHARDS])
+
+
+@functools.lru_cache(maxsize=1)
+def schema_version() -> int:
+    """Fingerprint of the shard tables' DDL, kept in the shards' user_version"""
+    dialect = sqlite.dialect()
+    ddl = []
+    for table in SHARD_TABLES:
+        ddl.append(str(schema.CreateTable(table).compile(dialect=dialect)))
+        ddl.extend(str(schema.CreateIndex(index).compile(dialect=dialect))
+                   for index in sorted(table.indexes, key=lambda index: index.name))
+    return zlib.crc32("\n".join(ddl).encode()) & 0x7FFFFFFF
+
+
+def _create_schema(name: str, url: str) -> bool:
+    """Create the shard's tables, or rebuild them if they were created by another version"""
+    engine = sa.create_engine(url, **database.engine_options(url))
+    if settings.SQLITE_PROFILE_ENABLED:
+        sa.event.listen(engine, "connect", database.apply_sqlite_profile)
+    try:
+        with engine.begin() as connection:
+            version = connection.exec_driver_sql("PRAGMA user_version").scalar()
+            if version == schema_version():
+                return False
+            if version:
+                logger.warning(f"EPG shard {name} has an outdated schema, rebuilding it")
+            database.Base.metadata.drop_all(connection, tables=SHARD_TABLES)
+            database.Base.metadata.create_all(connection, tables=SHARD_TABLES)
+            connection.exec_driver_sql(f"PRAGMA user_version = {schema_version()}")
+            return bool(version)
+    finally:
+        engine.dispose()
+
+
+def _reimport_sources(db: orm.Session, name: str) -> None:
+    """Import the shard's feeds again on the next refresh, even if they didn't change"""
+    sources = sa.select(EPGSource.id).where(_in_shard(name))
+    servers = sa.select(EPGSourceSubscription.server_id).where(EPGSourceSubscription.source_id.in_(sources))
+    db.execute(sa.update(RefreshSchedule).where(RefreshSchedule.server_id.in_(servers)).values(next_refresh=None))
+    db.execute(sa.update(EPGSource).where(EPGSource.id.in_(sources)).values(content_hash=None))
+
+
+def _open_shard(name: str, url: str) -> sa.engine.Engine:
+    central = database.engine
+    if central.dialect.name != "sqlite" or sa.engine.make_url(url).get_backend_name() != "sqlite":
+        raise ValueError("EPG_SHARDS needs SQLite for both DATABASE_URL and the shards")
+
+    rebuilt = _create_schema(name, url)
+    central_path = central.url.database
+
+    def attach_central(dbapi_connection, connection_record) -> None:
+        if settings.SQLITE_PROFILE_ENABLED:
+            database.apply_sqlite_profile(dbapi_connection, connection_record)
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(f"ATTACH DATABASE ? AS {CENTRAL_SCHEMA}", (central_path,))
+        finally:
+            cursor.close()
+
+    engine = sa.create_engine(url, **database.engine_options(url))
+    sa.event.listen(engine, "connect", attach_central)
+    if rebuilt:
+        run_write_blocking(central, _reimport_sources, name)
+    start_writer(engine)
+    logger.info(f"Opened EPG shard {name}")
+    return engine
+
+
+def get_shard_engine(name: str) -> sa.engine.Engine:
+    """
+    Engine of an EPG shard with the main database attached, created the first time the shard is used
+
+    There is one engine, and one writer, per shard file. It attaches the
+    primary, also for sessions on the read replica, shards have no replicas.
+    """
+    url = settings.EPG_SHARDS[name]
+    with _engines_lock:
+        if url not in _engines:
+            _engines[url] = _open_shard(name, url)
+        return _engines[url]
+
+
+def dispose_shards() -> None:
+    """Stop the shards' writers and close their connections"""
+    with _engines_lock:
+        engines = list(_engines.values())
+        _engines.clear()
+    for engine in engines:
+        stop_writer(engine)
+        engine.dispose()
+
+
+def _shard_session(name: str, db: orm.Session) -> orm.Session:
+    session = orm.Session(bind=get_shard_engine(name), autoflush=False)
+    session.info[SHARD_INFO_KEY] = name
+    session.info[CENTRAL_INFO_KEY] = db
+    return session
+
+
+def central_session(db: orm.Session) -> orm.Session:
+    """Session on the main database for writing its tables, db itself unless it is on a shard"""
+    return db.info.get(CENTRAL_INFO_KEY, db)
+
+
+@contextmanager
+def epg_session(user_id: str, db: orm.Session) -> Iterator[orm.Session]:
+    """
+    Session on the database holding a user's guides
+
+    Args:
+        user_id: User ID
+        db: Session on the main database, used as is when EPG_SHARDS is empty
+    """
+    shard = shard_for(user_id)
+    if shard is None:
+        yield db
+        return
+    session = _shard_session(shard, db)
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def all_epg_sessions(db: orm.Session) -> Iterator[orm.Session]:
+    """db, followed by a session on every shard when EPG_SHARDS is set, for maintenance tasks"""
+    yield db
+    for name in settings.EPG_SHARDS:
+        session = _shard_session(name, db)
+        try:
+            yield session
+        finally:
+            session.close()
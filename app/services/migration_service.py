@@ -1,6 +1,9 @@
 import os
+
+import sqlalchemy as sa
 from alembic import command
 from alembic.config import Config
+
 from app.services.logger import get_logger
 
 logger = get_logger(__name__)
@@ -18,8 +21,11 @@ def run_migrations():
         # Create Alembic configuration
         alembic_cfg = Config(alembic_cfg_path)
 
-        # Run migrations to head
-        command.upgrade(alembic_cfg, "head")
+        if _bootstrap_empty_database(alembic_cfg):
+            logger.info("Created schema for new database")
+        else:
+            # Run migrations to head
+            command.upgrade(alembic_cfg, "head")
 
         logger.info("Database migrations completed successfully")
 
@@ -28,6 +34,28 @@ def run_migrations():
         raise
 
 
+def _bootstrap_empty_database(alembic_cfg: Config) -> bool:
+    """
+    Create the schema from the models if the database has no tables yet
+
+    The early migrations only alter tables that already exist, so a brand new
+    database (e.g. a fresh PostgreSQL instance) is created directly and
+    stamped at head.
+
+    Returns:
+        True if the schema was created
+    """
+    from app import models  # noqa: F401 - registers every table with Base
+    from app.database import Base, engine
+
+    if sa.inspect(engine).get_table_names():
+        return False
+
+    Base.metadata.create_all(engine)
+    command.stamp(alembic_cfg, "head")
+    return True
+
+
 def create_initial_migration():
     """Create an initial migration with all current models"""
     try:
@@ -0,0 +1,130 @@
+import math
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import sqlalchemy as sa
+import sqlalchemy.orm as orm
+
+from app import database
+from app.services.config import settings
+from app.services.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Session.info key holding the id of the user a request's session acts for
+USER_INFO_KEY = "user_id"
+
+# Seconds a standby's replay is behind its primary, 0 when it has replayed all
+# it received or isn't a standby at all
+REPLICA_LAG_SQL = {
+    "postgresql": (
+        "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+        "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+    ),
+}
+
+# Redis key prefix of the users' last write times
+LAST_WRITE_KEY = "xtreamium:last_write:"
+
+# Last write time of each user, when REDIS_URL isn't set
+_last_writes: Dict[str, float] = {}
+_lags: Dict[sa.engine.Engine, Tuple[float, float]] = {}
+_lock = threading.Lock()
+_redis = None
+
+
+def _redis_client():
+    """Client of the redis holding every API process's recent writes, None without REDIS_URL"""
+    global _redis
+    if not settings.REDIS_URL:
+        return None
+    if _redis is None:
+        import redis
+        _redis = redis.Redis.from_url(settings.REDIS_URL, socket_timeout=1, socket_connect_timeout=1)
+    return _redis
+
+
+def note_write(db: orm.Session) -> None:
+    """Remember that the user db acts for just wrote, so their next reads go to the primary"""
+    user_id = db.info.get(USER_INFO_KEY)
+    if user_id is None or database.read_engine is database.engine:
+        return
+    now = time.time()
+    client = _redis_client()
+    if client is not None:
+        try:
+            client.set(f"{LAST_WRITE_KEY}{user_id}", now,
+                       px=max(1, math.ceil(settings.DATABASE_READ_AFTER_WRITE_SECONDS * 1000)))
+        except Exception as e:
+            logger.warning(f"Failed to record a write in redis: {e}")
+        return
+    with _lock:
+        for other, written_at in list(_last_writes.items()):
+            if now - written_at > settings.DATABASE_READ_AFTER_WRITE_SECONDS:
+                del _last_writes[other]
+        _last_writes[user_id] = now
+
+
+def wrote_recently(user_id: str, now: Optional[float] = None) -> bool:
+    """
+    Whether a user wrote within the last DATABASE_READ_AFTER_WRITE_SECONDS
+
+    With REDIS_URL set this covers writes made through any API process. When
+    redis can't be reached the user is assumed to have written.
+    """
+    client = _redis_client()
+    if client is None:
+        written_at = _last_writes.get(user_id)
+    else:
+        try:
+            written_at = client.get(f"{LAST_WRITE_KEY}{user_id}")
+        except Exception as e:
+            logger.warning(f"Failed to look up recent writes in redis, reading from the primary: {e}")
+            return True
+        written_at = float(written_at) if written_at is not None else None
+    if written_at is None:
+        return False
+    now = time.time() if now is None else now
+    return now - written_at <= settings.DATABASE_READ_AFTER_WRITE_SECONDS
+
+
+def measure_lag(engine: sa.engine.Engine) -> float:
+    sql = REPLICA_LAG_SQL.get(engine.dialect.name)
+    if sql is None:
+        # Nothing to measure, e.g. a second SQLite file kept in sync by hand
+        return 0.0
+    with engine.connect() as connection:
+        return float(connection.exec_driver_sql(sql).scalar() or 0)
+
+
+def replica_lag(engine: sa.engine.Engine) -> float:
+    """
+    How far the replica is behind, measured at most every DATABASE_REPLICA_LAG_CHECK_SECONDS
+
+    Returns:
+        Lag in seconds, infinite when the replica can't be reached
+    """
+    now = time.monotonic()
+    measured = _lags.get(engine)
+    if measured and now - measured[0] < settings.DATABASE_REPLICA_LAG_CHECK_SECONDS:
+        return measured[1]
+
+    try:
+        lag = measure_lag(engine)
+    except Exception as e:
+        logger.warning(f"Failed to measure read replica lag, reading from the primary: {e}")
+        lag = math.inf
+    _lags[engine] = (now, lag)
+    return lag
+
+
+def use_replica(user_id: str) -> bool:
+    """Whether a user's read-only request can be served from the read replica"""
+    if database.read_engine is database.engine or wrote_recently(user_id):
+        return False
+    lag = replica_lag(database.read_engine)
+    if lag > settings.DATABASE_REPLICA_MAX_LAG_SECONDS:
+        logger.debug(f"Read replica is {lag:.1f}s behind, reading from the primary")
+        return False
+    return True
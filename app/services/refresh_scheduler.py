@@ -0,0 +1,108 @@
+import datetime as dt
+from typing import Optional, Tuple
+
+import sqlalchemy.orm as orm
+
+from app.models.refresh_schedule import RefreshSchedule
+from app.services.config import settings
+from app.services.logger import get_logger
+from app.services.write_queue import run_write
+
+logger = get_logger(__name__)
+
+# Weight of the latest observation in the smoothed change interval
+CHANGE_INTERVAL_ALPHA = 0.3
+
+
+def _as_utc(value: Optional[dt.datetime]) -> Optional[dt.datetime]:
+    # SQLite hands DateTime columns back without tzinfo
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=dt.timezone.utc)
+    return value
+
+
+def compute_next_refresh(schedule: RefreshSchedule, now: dt.datetime) -> dt.datetime:
+    """
+    Work out when a server's feed should next be downloaded
+
+    The next refresh is the earliest of: the guide running short of
+    EPG_REFRESH_MIN_HORIZON_HOURS of coverage, the provider's next expected
+    update (based on how often it has changed so far) and the maximum interval,
+    but never sooner than the minimum interval.
+    """
+    candidates = [now + dt.timedelta(hours=settings.EPG_REFRESH_MAX_INTERVAL_HOURS)]
+
+    horizon_end = _as_utc(schedule.horizon_end)
+    if horizon_end:
+        candidates.append(horizon_end - dt.timedelta(hours=settings.EPG_REFRESH_MIN_HORIZON_HOURS))
+
+    last_changed = _as_utc(schedule.last_changed)
+    if last_changed and schedule.change_interval:
+        candidates.append(last_changed + dt.timedelta(seconds=schedule.change_interval))
+
+    earliest = now + dt.timedelta(hours=settings.EPG_REFRESH_MIN_INTERVAL_HOURS)
+    return max(min(candidates), earliest)
+
+
+async def get_refresh_schedule(server_id: str, db: orm.Session) -> Optional[RefreshSchedule]:
+    return db.query(RefreshSchedule).filter(RefreshSchedule.server_id == server_id).first()
+
+
+def is_refresh_due(schedule: Optional[RefreshSchedule], now: dt.datetime) -> bool:
+    if schedule is None or schedule.next_refresh is None:
+        return True
+    return _as_utc(schedule.next_refresh) <= now
+
+
+def _record_refresh(db: orm.Session, user_id: str, server_id: str, result: dict,
+                    now: dt.datetime) -> Tuple[RefreshSchedule, bool]:
+    schedule = db.query(RefreshSchedule).filter(RefreshSchedule.server_id == server_id).first()
+    if schedule is None:
+        schedule = RefreshSchedule(server_id=server_id, user_id=user_id)
+        db.add(schedule)
+
+    changed = result.get("content_hash") != schedule.content_hash
+    if changed:
+        last_changed = _as_utc(schedule.last_changed)
+        if last_changed:
+            interval = (now - last_changed).total_seconds()
+            if schedule.change_interval:
+                interval = (CHANGE_INTERVAL_ALPHA * interval +
+                            (1 - CHANGE_INTERVAL_ALPHA) * schedule.change_interval)
+            schedule.change_interval = interval
+        schedule.last_changed = now
+        schedule.content_hash = result.get("content_hash")
+        if result.get("horizon_end"):
+            schedule.horizon_end = result["horizon_end"]
+
+    schedule.last_checked = now
+    schedule.next_refresh = compute_next_refresh(schedule, now)
+    db.commit()
+    return schedule, changed
+
+
+async def record_refresh(user_id: str, server_id: str, result: dict, db: orm.Session,
+                         now: Optional[dt.datetime] = None) -> RefreshSchedule:
+    """
+    Record the outcome of a feed download and schedule the next one
+
+    Args:
+        user_id: User ID owning the server
+        server_id: Server ID the feed belongs to
+        result: Result of EPGParser.cache_epg, with 'content_hash' and 'horizon_end'
+        db: Database session
+        now: Time of the refresh, defaults to the current time
+
+    Returns:
+        The updated RefreshSchedule
+    """
+    now = now or dt.datetime.now(dt.timezone.utc)
+    try:
+        schedule, changed = await run_write(db, _record_refresh, user_id, server_id, result, now)
+        logger.info(f"EPG for server {server_id} {'changed' if changed else 'unchanged'}, "
+                    f"next refresh at {schedule.next_refresh.isoformat()}")
+        return schedule
+    except Exception as e:
+        logger.error(f"Failed to record EPG refresh for server {server_id}: {e}")
+        db.rollback()
+        raise
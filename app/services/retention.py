@@ -0,0 +1,157 @@
+import datetime as dt
+from typing import Dict, Optional
+
+import sqlalchemy as sa
+import sqlalchemy.orm as orm
+
+from app.models.channel import Channel
+from app.models.epg_source import EPGSource, EPGSourceSubscription
+from app.models.programme import Programme
+from app.services.config import settings
+from app.services.data.epg_data_services import delete_unused_source
+from app.services.db_maintenance import convert_cold_fields, record_changes
+from app.services.epg_shards import owns_source
+from app.services.logger import get_logger
+from app.services.write_queue import BULK, delete_in_batches, run_write
+
+logger = get_logger(__name__)
+
+
+async def purge_expired_programmes(db: orm.Session, now: Optional[dt.datetime] = None,
+                                   batch_size: Optional[int] = None) -> int:
+    """
+    Delete programmes that ended more than EPG_RETENTION_HOURS ago
+
+    Args:
+        db: Database session
+        now: Current time, defaults to now
+        batch_size: Rows deleted per transaction, defaults to EPG_RETENTION_BATCH_SIZE
+
+    Returns:
+        Number of programmes deleted
+    """
+    now = now or dt.datetime.now(dt.timezone.utc)
+    cutoff = int((now - dt.timedelta(hours=settings.EPG_RETENTION_HOURS)).timestamp())
+    programmes = Programme.__table__
+
+    # start_epoch bounds the scan on the (start_epoch, stop_epoch) index
+    expired = sa.and_(
+        programmes.c.start_epoch < cutoff,
+        sa.or_(programmes.c.stop_epoch < cutoff, programmes.c.stop_epoch.is_(None))
+    )
+    return await delete_in_batches(db, programmes, expired, batch_size or settings.EPG_RETENTION_BATCH_SIZE)
+
+
+async def purge_missing_channels(db: orm.Session, now: Optional[dt.datetime] = None,
+                                 batch_size: Optional[int] = None) -> int:
+    """
+    Delete channels, and their programmes, that have been missing from their feed for EPG_CHANNEL_RETENTION_DAYS
+
+    A channel only counts as missing when a later import of the same source
+    didn't include it, so a feed that stopped refreshing keeps its channels.
+
+    Args:
+        db: Database session
+        now: Current time, defaults to now
+        batch_size: Rows deleted per transaction, defaults to EPG_RETENTION_BATCH_SIZE
+
+    Returns:
+        Number of channels deleted
+    """
+    now = now or dt.datetime.now(dt.timezone.utc)
+    batch_size = batch_size or settings.EPG_RETENTION_BATCH_SIZE
+    cutoff = now - dt.timedelta(days=settings.EPG_CHANNEL_RETENTION_DAYS)
+
+    channels = Channel.__table__
+    other = channels.alias()
+    seen = sa.func.coalesce(channels.c.last_seen_at, channels.c.date_created)
+    latest = sa.select(sa.func.max(sa.func.coalesce(other.c.last_seen_at, other.c.date_created))).where(
+        other.c.source_id == channels.c.source_id
+    ).scalar_subquery()
+
+    total = 0
+    while True:
+        channel_ids = db.execute(
+            sa.select(channels.c.id).where(seen < cutoff, seen < latest).limit(batch_size)
+        ).scalars().all()
+        if not channel_ids:
+            return total
+
+        await delete_in_batches(db, Programme.__table__, Programme.__table__.c.channel_id.in_(channel_ids),
+                                batch_size)
+        total += await run_write(db, _delete_channels, channel_ids, priority=BULK)
+
+
+def _delete_channels(db: orm.Session, channel_ids) -> int:
+    channels = Channel.__table__
+    return db.execute(sa.delete(channels).where(channels.c.id.in_(channel_ids))).rowcount
+
+
+async def purge_unused_sources(db: orm.Session, batch_size: Optional[int] = None) -> int:
+    """
+    Delete EPG sources no server subscribes to any more, with their channels, programmes, categories and people
+
+    Only sources stored in db's database are looked at, see EPG_SHARDS.
+
+    Args:
+        db: Database session
+        batch_size: Rows deleted per transaction, defaults to EPG_RETENTION_BATCH_SIZE
+
+    Returns:
+        Number of sources deleted
+    """
+    batch_size = batch_size or settings.EPG_RETENTION_BATCH_SIZE
+    source_ids = db.execute(sa.select(EPGSource.id).where(
+        EPGSource.id.not_in(sa.select(EPGSourceSubscription.source_id)),
+        owns_source(db)
+    )).scalars().all()
+
+    deleted = 0
+    for source_id in source_ids:
+        deleted += await delete_unused_source(db, source_id, batch_size)
+    return deleted
+
+
+def incremental_vacuum(db: orm.Session) -> int:
+    """
+    Return free SQLite pages to the OS so the database file shrinks
+
+    Returns:
+        Number of pages freed
+    """
+    if db.get_bind().dialect.name != "sqlite":
+        return 0
+
+    if db.execute(sa.text("PRAGMA auto_vacuum")).scalar() != 2:
+        logger.info("SQLite auto_vacuum is not INCREMENTAL, run VACUUM once to let the retention job shrink the file")
+        return 0
+
+    before = db.execute(sa.text("PRAGMA freelist_count")).scalar()
+    db.commit()
+    # pysqlite only steps a PRAGMA once, which frees a single page, executescript runs it to completion
+    db.connection().connection.driver_connection.executescript(
+        f"PRAGMA incremental_vacuum({int(settings.EPG_RETENTION_VACUUM_PAGES)});")
+    db.commit()
+    return before - db.execute(sa.text("PRAGMA freelist_count")).scalar()
+
+
+async def run_retention(db: orm.Session, now: Optional[dt.datetime] = None) -> Dict:
+    """
+    Purge expired programmes, missing channels and unused sources, bring the
+    programmes' cold fields into the configured format, then reclaim the space
+    """
+    try:
+        programmes = await purge_expired_programmes(db, now)
+        channels = await purge_missing_channels(db, now)
+        sources = await purge_unused_sources(db)
+        await convert_cold_fields(db)
+        await run_write(db, record_changes, programmes, priority=BULK)
+        pages = await run_write(db, incremental_vacuum, priority=BULK)
+        logger.info(f"EPG retention: deleted {programmes} expired programmes, {channels} missing channels and "
+                    f"{sources} unused sources, freed {pages} pages")
+        return {"programmes_deleted": programmes, "channels_deleted": channels, "sources_deleted": sources,
+                "pages_freed": pages}
+    except Exception as e:
+        logger.error(f"EPG retention failed: {e}")
+        db.rollback()
+        raise
@@ -1,10 +1,17 @@
 from fastapi_utils.tasks import repeat_every
 
+from app.services.config import settings
+from app.services.tasks.retention import retention_task_wrapper
 from app.services.tasks.update_epg import update_epg_task_wrapper
 
 
 def register_tasks(app):
     @app.on_event("startup")
-    @repeat_every(seconds=60 * 60 * 24)
+    @repeat_every(seconds=settings.EPG_REFRESH_CHECK_SECONDS)
     async def _update_epg_task():
         await update_epg_task_wrapper()
+
+    @app.on_event("startup")
+    @repeat_every(seconds=settings.EPG_RETENTION_CHECK_SECONDS)
+    async def _retention_task():
+        await retention_task_wrapper()
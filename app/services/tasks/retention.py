@@ -0,0 +1,13 @@
+from app.services.db_factory import get_db
+from app.services.epg_shards import all_epg_sessions
+from app.services.retention import run_retention
+
+
+async def retention_task_wrapper() -> None:
+    """Wrapper function to handle database session for background tasks"""
+    db = next(get_db())
+    try:
+        for epg_db in all_epg_sessions(db):
+            await run_retention(epg_db)
+    finally:
+        db.close()
@@ -1,26 +1,51 @@
+import datetime as dt
+
 import sqlalchemy.orm as orm
 
+from app.services.cache_manager import run_cache_maintenance
+from app.services.data.epg_data_services import gc_epg_imports, resolve_epg_source
 from app.services.data.user_data_services import get_all_users, get_user_servers
 from app.services.db_factory import get_db
+from app.services.db_maintenance import run_db_maintenance
+from app.services.epg_shards import all_epg_sessions, epg_session
 from app.services.logger import get_logger
+from app.services.refresh_scheduler import get_refresh_schedule, is_refresh_due, record_refresh
 from app.utils.epg_parser import EPGParser
 
 logger = get_logger(__name__)
 
 
-async def update_epg_task(db: orm.Session) -> None:
+async def update_epg_task(db: orm.Session, force: bool = False) -> None:
     logger.debug("Caching EPG task started")
 
     try:
+        now = dt.datetime.now(dt.timezone.utc)
         users = await get_all_users(db)
 
         for user in users:
             logger.debug(f"Updating EPG task for user {user.email}")
             servers = await get_user_servers(user.id, db)
-            for server in servers:
-                logger.debug(f"Processing EPG for server {server.name} (ID: {server.id})")
-                epg_parser = EPGParser(server.epg_url, server.id, user.id)
-                await epg_parser.cache_epg(db)
+            with epg_session(user.id, db) as epg_db:
+                for server in servers:
+                    schedule = await get_refresh_schedule(server.id, db)
+                    if not force and not is_refresh_due(schedule, now):
+                        logger.debug(f"EPG for server {server.name} not due until {schedule.next_refresh}")
+                        continue
+
+                    logger.debug(f"Processing EPG for server {server.name} (ID: {server.id})")
+                    # Servers sharing a feed share its source, whoever refreshes it first imports it for all
+                    source = await resolve_epg_source(user.id, server.id, epg_db, url=server.epg_url)
+                    epg_parser = EPGParser(server.epg_url, server.id, user.id)
+                    result = await epg_parser.cache_epg(epg_db, previous_hash=source.content_hash,
+                                                        previous_horizon_end=source.horizon_end)
+                    if result:
+                        await record_refresh(user.id, server.id, result, db)
+
+        for epg_db in all_epg_sessions(db):
+            await gc_epg_imports(epg_db)
+        await run_cache_maintenance(db)
+        for epg_db in all_epg_sessions(db):
+            await run_db_maintenance(epg_db)
     except Exception as e:
         logger.error(f"Error in EPG update task: {e}")
         raise
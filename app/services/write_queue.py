@@ -0,0 +1,217 @@
+import asyncio
+import concurrent.futures
+import itertools
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import sqlalchemy as sa
+import sqlalchemy.orm as orm
+
+from app.services.config import settings
+from app.services.logger import get_logger
+from app.services.read_routing import note_write
+
+logger = get_logger(__name__)
+
+# Job priorities, lower runs first. Bulk jobs are single chunks of an import or
+# maintenance run, so an interactive write waits for at most one of them.
+INTERACTIVE = 0
+BULK = 1
+
+# Pause before the writer opens a new connection after its last one failed
+RECONNECT_SECONDS = 1.0
+
+_writers: Dict[sa.engine.Engine, "SQLiteWriter"] = {}
+_writers_lock = threading.Lock()
+
+
+class SQLiteWriter:
+    """
+    Runs every write against a SQLite database on one thread and one connection
+
+    Jobs are callables taking a Session as their first argument. Each runs in
+    its own session on the writer's connection and is committed when it
+    returns, or rolled back if it raises. Sessions don't expire objects on
+    commit, so objects a job returns stay readable after it is closed.
+    """
+
+    def __init__(self, engine: sa.engine.Engine):
+        self.engine = engine
+        self._queue: queue.PriorityQueue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Finish the queued jobs, then stop the thread"""
+        if self._thread is None:
+            return
+        # Queued after everything already submitted at either priority
+        self._queue.put((BULK + 1, next(self._sequence), None, (), None))
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, job: Callable, *args, priority: int = INTERACTIVE) -> concurrent.futures.Future:
+        if self._thread is None or not self._thread.is_alive():
+            raise RuntimeError("The SQLite writer is not running")
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        self._queue.put((priority, next(self._sequence), job, args, future))
+        return future
+
+    async def run(self, job: Callable, *args, priority: int = INTERACTIVE) -> Any:
+        return await asyncio.wrap_future(self.submit(job, *args, priority=priority))
+
+    def _run(self) -> None:
+        # A connection that fails is replaced, failing the jobs queued meanwhile
+        # rather than leaving their callers waiting
+        while True:
+            try:
+                with self.engine.connect() as connection:
+                    if self._serve(connection):
+                        return
+            except Exception as e:
+                logger.error(f"SQLite writer connection failed, reconnecting: {e}")
+                if self._fail_queued(e):
+                    return
+                time.sleep(RECONNECT_SECONDS)
+
+    def _serve(self, connection: sa.engine.Connection) -> bool:
+        """Run queued jobs on connection, True once stopped. Raises when the connection fails"""
+        while True:
+            _, _, job, args, future = self._queue.get()
+            if job is None:
+                return True
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            session = orm.Session(bind=connection, autoflush=False, expire_on_commit=False)
+            try:
+                result = job(session, *args)
+                session.commit()
+            except BaseException as e:
+                future.set_exception(e)
+                session.rollback()
+            else:
+                future.set_result(result)
+            finally:
+                session.close()
+
+    def _fail_queued(self, error: Exception) -> bool:
+        """Fail every queued job with error, True if stop was called meanwhile"""
+        stopped = False
+        while True:
+            try:
+                _, _, job, _, future = self._queue.get_nowait()
+            except queue.Empty:
+                return stopped
+            if job is None:
+                stopped = True
+            elif future.set_running_or_notify_cancel():
+                future.set_exception(error)
+
+
+def start_writer(engine: sa.engine.Engine) -> Optional[SQLiteWriter]:
+    """Start the single writer of a SQLite engine, if SQLITE_SINGLE_WRITER is on"""
+    if engine.dialect.name != "sqlite" or not settings.SQLITE_SINGLE_WRITER:
+        return None
+    with _writers_lock:
+        if engine not in _writers:
+            writer = SQLiteWriter(engine)
+            writer.start()
+            _writers[engine] = writer
+            logger.info("Started the SQLite writer thread")
+        return _writers[engine]
+
+
+def stop_writer(engine: sa.engine.Engine) -> None:
+    with _writers_lock:
+        writer = _writers.pop(engine, None)
+    if writer is not None:
+        writer.stop()
+        logger.info("Stopped the SQLite writer thread")
+
+
+def get_writer(db: orm.Session) -> Optional[SQLiteWriter]:
+    return _writers.get(db.get_bind())
+
+
+async def run_write(db: orm.Session, job: Callable, *args, priority: int = INTERACTIVE) -> Any:
+    """
+    Run job(session, *args) on the single writer of db's engine, or inline on db when it has none
+
+    Jobs must not use objects loaded by db, pass ids or values instead. db's
+    transaction is ended first either way, so its next reads see the job's
+    writes rather than an older snapshot. The user db acts for, if any, reads
+    from the primary for a while afterwards, see read_routing.
+
+    Args:
+        db: Session of the caller
+        job: Function doing the writes, committed when it returns
+        args: Further arguments for job
+        priority: INTERACTIVE or BULK
+
+    Returns:
+        Whatever job returns
+    """
+    writer = get_writer(db)
+    if writer is None:
+        result = job(db, *args)
+        db.commit()
+    else:
+        db.commit()
+        result = await writer.run(job, *args, priority=priority)
+    note_write(db)
+    return result
+
+
+def run_write_blocking(engine: sa.engine.Engine, job: Callable, *args, priority: int = INTERACTIVE) -> Any:
+    """
+    Run job(session, *args) on the single writer of engine and wait for it, or
+    in a session of its own when the engine has none, for callers that can't
+    await. Must not be called from a writer job.
+    """
+    writer = _writers.get(engine)
+    if writer is not None:
+        return writer.submit(job, *args, priority=priority).result()
+    with orm.Session(bind=engine, autoflush=False) as session:
+        result = job(session, *args)
+        session.commit()
+        return result
+
+
+def _delete_batch(db: orm.Session, table: sa.Table, condition, batch_size: int) -> int:
+    batch = sa.select(table.c.id).where(condition).limit(batch_size)
+    return db.execute(sa.delete(table).where(table.c.id.in_(batch))).rowcount
+
+
+def _update_batch(db: orm.Session, table: sa.Table, condition, values: dict, batch_size: int) -> int:
+    batch = sa.select(table.c.id).where(condition).limit(batch_size)
+    return db.execute(sa.update(table).where(table.c.id.in_(batch)).values(values)).rowcount
+
+
+async def delete_in_batches(db: orm.Session, table: sa.Table, condition, batch_size: int) -> int:
+    """Delete the rows of table matching condition batch_size at a time, each batch a bulk write of its own"""
+    total = 0
+    while True:
+        deleted = await run_write(db, _delete_batch, table, condition, batch_size, priority=BULK)
+        total += deleted
+        if deleted < batch_size:
+            return total
+
+
+async def update_in_batches(db: orm.Session, table: sa.Table, condition, values: dict, batch_size: int) -> int:
+    """
+    Update the rows of table matching condition batch_size at a time, like
+    delete_in_batches. values must make the rows stop matching condition
+    """
+    total = 0
+    while True:
+        updated = await run_write(db, _update_batch, table, condition, values, batch_size, priority=BULK)
+        total += updated
+        if updated < batch_size:
+            return total
@@ -0,0 +1,115 @@
+import datetime as dt
+import io
+from typing import Any, List, Sequence
+
+import sqlalchemy as sa
+import sqlalchemy.orm as orm
+
+from app.services.config import settings
+
+# Drivers whose raw connections can stream COPY FROM STDIN
+COPY_DRIVERS = ("psycopg", "psycopg2")
+
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def supports_copy(db: orm.Session) -> bool:
+    dialect = db.get_bind().dialect
+    return settings.DATABASE_USE_COPY and dialect.name == "postgresql" and dialect.driver in COPY_DRIVERS
+
+
+def _copy_value(value: Any) -> str:
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, bytes):
+        # bytea hex input, with the backslash escaped for the text format
+        return "\\\\x" + value.hex()
+    if isinstance(value, (dt.datetime, dt.date)):
+        return value.isoformat()
+    return str(value).translate(_COPY_ESCAPES)
+
+
+def copy_text(rows: List[tuple]) -> str:
+    """Encode rows in PostgreSQL's COPY text format"""
+    return "".join("\t".join(map(_copy_value, row)) + "\n" for row in rows)
+
+
+def copy_rows(db: orm.Session, table: sa.Table, columns: Sequence[str], rows: List[tuple]) -> None:
+    """
+    Load rows into a table with COPY FROM STDIN, inside the session's transaction
+
+    Args:
+        db: Database session bound to PostgreSQL through psycopg or psycopg2
+        table: Table to load into
+        columns: Column names, in the order of the values in each row
+        rows: Rows to load
+    """
+    preparer = db.get_bind().dialect.identifier_preparer
+    sql = (f"COPY {preparer.format_table(table)} ({', '.join(preparer.quote(column) for column in columns)}) "
+           f"FROM STDIN")
+
+    cursor = db.connection().connection.driver_connection.cursor()
+    try:
+        if hasattr(cursor, "copy"):
+            # psycopg 3 adapts the values itself
+            with cursor.copy(sql) as copy:
+                for row in rows:
+                    copy.write_row(row)
+        else:
+            cursor.copy_expert(sql, io.StringIO(copy_text(rows)))
+    finally:
+        cursor.close()
+
+
+def insert_rows(db: orm.Session, table: sa.Table, columns: Sequence[str], rows: List[tuple]) -> None:
+    """
+    executemany INSERT of pre-built tuples
+
+    The statement is compiled once and the tuples go straight to the driver,
+    only columns whose type needs a bind processor (e.g. DateTime on SQLite)
+    are converted, instead of SQLAlchemy building a parameter dict per row.
+
+    Args:
+        db: Database session
+        table: Table to insert into
+        columns: Column names, in the order of the values in each row
+        rows: Rows to insert
+    """
+    connection = db.connection()
+    dialect = connection.dialect
+    if not dialect.positional:
+        # Named paramstyles, let SQLAlchemy map the parameters by name
+        connection.execute(table.insert(), [dict(zip(columns, row)) for row in rows])
+        return
+
+    compiled = table.insert().compile(dialect=dialect, column_keys=list(columns))
+    order = [list(columns).index(name) for name in compiled.positiontup]
+    if order != list(range(len(columns))):
+        rows = [tuple(map(row.__getitem__, order)) for row in rows]
+
+    processors = [(position, table.c[columns[index]].type.dialect_impl(dialect).bind_processor(dialect))
+                  for position, index in enumerate(order)]
+    processors = [(position, process) for position, process in processors if process is not None]
+    if processors:
+        converted = []
+        for row in rows:
+            row = list(row)
+            for position, process in processors:
+                if row[position] is not None:
+                    row[position] = process(row[position])
+            converted.append(tuple(row))
+        rows = converted
+
+    connection.exec_driver_sql(compiled.string, rows)
+
+
+def bulk_insert(db: orm.Session, table: sa.Table, columns: Sequence[str], rows: List[tuple]) -> None:
+    """Insert rows with COPY where the backend supports it, otherwise one executemany INSERT"""
+    if not rows:
+        return
+    if supports_copy(db):
+        copy_rows(db, table, columns, rows)
+    else:
+        insert_rows(db, table, columns, rows)
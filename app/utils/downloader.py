@@ -0,0 +1,145 @@
+import json
+import os
+
+import requests
+
+from app.services.logger import get_logger
+
+logger = get_logger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class IncompleteDownloadError(IOError):
+    pass
+
+
+def _read_meta(meta_file: str) -> dict:
+    try:
+        with open(meta_file, 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_meta(meta_file: str, meta: dict) -> None:
+    with open(meta_file, 'w') as file:
+        json.dump(meta, file)
+
+
+def _discard_partial(partial_file: str, meta_file: str) -> None:
+    for path in (partial_file, meta_file):
+        if os.path.isfile(path):
+            os.remove(path)
+
+
+def _resume_validator(meta: dict):
+    """If-Range only accepts strong ETags, fall back to Last-Modified otherwise"""
+    etag = meta.get('etag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return meta.get('last_modified')
+
+
+def _expected_size(response: requests.Response, offset: int):
+    if response.status_code == 206:
+        # Content-Range: bytes <start>-<end>/<total>
+        total = response.headers.get('Content-Range', '').rpartition('/')[2]
+        return int(total) if total.isdigit() else None
+
+    length = response.headers.get('Content-Length')
+    return offset + int(length) if length and length.isdigit() else None
+
+
+def _range_start(response: requests.Response):
+    # Content-Range: bytes <start>-<end>/<total>
+    start = response.headers.get('Content-Range', '').partition(' ')[2].partition('-')[0]
+    return int(start) if start.isdigit() else None
+
+
+def download_file(url: str, dest: str, timeout: int = 30) -> None:
+    """
+    Download a URL to dest, resuming a previously interrupted download if possible
+
+    The body is streamed into ``<dest>.partial`` with the response validators
+    (ETag/Last-Modified) kept in ``<dest>.partial.json``. If a download dies half
+    way, the next call asks the server for the remaining bytes only, using
+    ``If-Range`` so a changed file is sent in full instead. A partial file the
+    server can't resume, answering 416 or with another range, is discarded and
+    the file downloaded in full. The partial file is only moved over dest once
+    it is complete.
+
+    Args:
+        url: URL to download
+        dest: Final path of the downloaded file
+        timeout: Connect/read timeout in seconds
+
+    Raises:
+        requests.RequestException: On HTTP or network errors, the partial file is kept
+        IncompleteDownloadError: If the server closed the connection early
+    """
+    partial_file = f"{dest}.partial"
+    meta_file = f"{partial_file}.json"
+
+    meta = _read_meta(meta_file)
+    offset = os.path.getsize(partial_file) if os.path.isfile(partial_file) else 0
+    validator = _resume_validator(meta)
+
+    # Byte offsets must refer to the file itself, not a compressed transfer of it
+    headers = {'Accept-Encoding': 'identity'}
+    resuming = offset > 0 and meta.get('url') == url and meta.get('accept_ranges') and validator
+    if resuming:
+        logger.debug(f"Resuming download of {url} from byte {offset}")
+        headers['Range'] = f"bytes={offset}-"
+        headers['If-Range'] = validator
+
+    restart = False
+    with requests.get(url, headers=headers, stream=True, timeout=timeout) as response:
+        etag = response.headers.get('ETag')
+        if resuming and response.status_code == 416:
+            # The partial file is complete already, or longer than the file is now
+            logger.debug(f"Server refused the range of {url}, restarting download")
+            restart = True
+        else:
+            response.raise_for_status()
+            if resuming and response.status_code == 206:
+                if etag and etag != meta.get('etag'):
+                    # The file changed under us and the server ignored If-Range
+                    logger.debug(f"Validator mismatch for {url}, restarting download")
+                    restart = True
+                elif _range_start(response) != offset:
+                    logger.debug(f"Server sent a different range of {url}, restarting download")
+                    restart = True
+                mode = 'ab'
+            else:
+                if resuming:
+                    logger.debug(f"Server sent a full response for {url}, restarting download")
+                mode = 'wb'
+                offset = 0
+
+        if not restart:
+            _write_meta(meta_file, {
+                'url': url,
+                'etag': etag,
+                'last_modified': response.headers.get('Last-Modified'),
+                'accept_ranges': (response.status_code == 206 or
+                                  response.headers.get('Accept-Ranges', '').lower() == 'bytes'),
+            })
+
+            expected_size = _expected_size(response, offset)
+            with open(partial_file, mode) as file:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    file.write(chunk)
+
+    if restart:
+        # Without the partial file the next attempt asks for the whole file
+        _discard_partial(partial_file, meta_file)
+        return download_file(url, dest, timeout)
+
+    size = os.path.getsize(partial_file)
+    if expected_size is not None and size < expected_size:
+        raise IncompleteDownloadError(
+            f"Download of {url} stopped at {size} of {expected_size} bytes")
+
+    os.replace(partial_file, dest)
+    _discard_partial(partial_file, meta_file)
@@ -1,66 +1,102 @@
+import datetime as dt
+import hashlib
 import os
+from typing import Optional
 
-import requests
 import sqlalchemy.orm as orm
-from xdg_base_dirs import xdg_cache_home
 
-from app.services.data.epg_data_services import store_epg_channels
+from app.services.cache_manager import get_server_cache_dir, mark_used
+from app.services.config import settings
+from app.services.data.epg_data_services import store_epg_stream
 from app.services.logger import get_logger
-from app.utils.iptv_parser_ng import parse_xmltv_file
+from app.utils.downloader import download_file
+from app.utils.iptv_parser_ng import iter_xmltv_file
 from app.utils.time_utils import is_file_older_cache_time
 
 logger = get_logger(__name__)
 
 
+def _file_hash(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
 class EPGParser:
     def __init__(self, url, server_id, user_id):
         self._epg_url = url
         self._server_id = server_id
         self._user_id = user_id
         self._programs = {}
-        cache_dir = (os.getenv("CACHE_PATH") or
-                     os.path.join(xdg_cache_home(), "xtreamium"))
-
         self._cache_file = os.path.join(
-            cache_dir, f"{user_id}", str(server_id), "epg.xml")
+            get_server_cache_dir(user_id, server_id), "epg.xml")
 
         # Create the full directory path for the cache file if it doesn't exist
         cache_file_dir = os.path.dirname(self._cache_file)
         if not os.path.exists(cache_file_dir):
             os.makedirs(cache_file_dir)
 
-    async def cache_epg(self, db: orm.Session):
+    async def cache_epg(self, db: orm.Session, previous_hash: Optional[str] = None,
+                        previous_horizon_end: Optional[dt.datetime] = None) -> Optional[dict]:
+        """
+        Download the EPG feed and store it in the database
+
+        Args:
+            db: Database session
+            previous_hash: Content hash of the last imported feed, the import is
+                skipped if the download is identical
+            previous_horizon_end: Horizon of the last imported feed, returned
+                when the import is skipped
+
+        Returns:
+            Dict with the feed's 'content_hash', whether it 'changed', its
+            'horizon_end' and, for changed feeds, the stored counts. None if
+            nothing was downloaded or the import failed.
+        """
         if os.path.isfile(self._cache_file) and not is_file_older_cache_time(self._cache_file):
             logger.debug(f"Cache file {self._cache_file} exists, and is recent.")
-            return
+            return None
 
         logger.debug(
             f"Downloading EPG from {self._epg_url} to {self._cache_file}")
         try:
-            data = requests.get(self._epg_url, timeout=30)
-            with open(self._cache_file, 'wb') as file:
-                file.write(data.content)
+            download_file(self._epg_url, self._cache_file, timeout=30)
         except Exception as e:
+            # Whatever was received is kept in the .partial file and resumed next time
             logger.error(
                 f"Failed to download EPG from {self._epg_url}: {e}")
-            return
+            return None
+
+        content_hash = _file_hash(self._cache_file)
+        if previous_hash and content_hash == previous_hash:
+            logger.info(f"EPG for user {self._user_id}, server {self._server_id} unchanged, skipping import")
+            return {"content_hash": content_hash, "changed": False, "horizon_end": previous_horizon_end}
 
         logger.debug("Parsing EPG")
         try:
             logger.debug(f"Parsing EPG from {self._cache_file}")
-            channels = parse_xmltv_file(self._cache_file)
-
-            logger.debug(f"Parsed {len(channels)} channels")
-
-            # Store in database using the new EPG data service
-            result = await store_epg_channels(channels, self._user_id, self._server_id, db)
+            # Parsing and storing are interleaved so the feed is never held in memory
+            batches = iter_xmltv_file(self._cache_file, settings.EPG_STORE_CHUNK_SIZE)
+            result = await store_epg_stream(batches, self._user_id, self._server_id, db,
+                                            content_hash=content_hash)
+            # Only imports count as a use of the cached feed for LRU eviction, not every refresh
+            mark_used(os.path.dirname(self._cache_file))
 
             logger.info(
                 f"EPG data stored in database for user {self._user_id}, server {self._server_id}: "
                 f"{result['channels']} channels, {result['programmes']} programmes")
 
+            return {
+                **result,
+                "content_hash": content_hash,
+                "changed": True,
+            }
+
         except Exception as e:
             logger.error(f"Failed to parse EPG: {e}")
+            return None
 
     async def get_listings(self, channel_id: str, db: orm.Session):
         """Get current and future listings for a channel from the database"""
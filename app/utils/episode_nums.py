@@ -0,0 +1,57 @@
+import re
+from typing import List, Optional, Tuple
+
+SeasonEpisode = Tuple[Optional[int], Optional[int]]
+
+_ONSCREEN_PATTERNS = (
+    # S02E05, S2 E5, Season 2 Episode 5, Series 2, Ep. 5
+    re.compile(r"\bS(?:eason|eries)?\.?\s*(\d+)\W{0,3}E(?:p(?:isode)?)?\.?\s*(\d+)", re.IGNORECASE),
+    # 2x05
+    re.compile(r"\b(\d+)x(\d+)\b", re.IGNORECASE),
+    # E05, Ep. 5, Episode 5
+    re.compile(r"(?:^|\W)()E(?:p(?:isode)?)?\.?\s*(\d+)\b", re.IGNORECASE),
+)
+
+
+def _xmltv_ns_part(part: str) -> Optional[int]:
+    number = part.split("/", 1)[0].strip()
+    return int(number) + 1 if number.isdigit() else None
+
+
+def parse_xmltv_ns(text: Optional[str]) -> SeasonEpisode:
+    """
+    Season and episode of an xmltv_ns episode number
+
+    xmltv_ns numbers are zero-based "season.episode.part" with optional
+    "/total" suffixes and empty parts, e.g. "1.4.0/1" is season 2 episode 5
+    and ".4." is episode 5 of an unknown season.
+    """
+    parts = (text or "").split(".")
+    if len(parts) < 2:
+        return None, None
+    return _xmltv_ns_part(parts[0]), _xmltv_ns_part(parts[1])
+
+
+def parse_onscreen(text: Optional[str]) -> SeasonEpisode:
+    """Season and episode of a free-form onscreen episode number such as "S02E05" or "2x05" """
+    for pattern in _ONSCREEN_PATTERNS:
+        match = pattern.search(text or "")
+        if match:
+            season, episode = match.groups()
+            return int(season) if season else None, int(episode)
+    return None, None
+
+
+def season_episode(episode_nums: Optional[List[dict]]) -> SeasonEpisode:
+    """Season and episode from a programme's episode numbers, preferring xmltv_ns over onscreen"""
+    found = {}
+    for episode_num in episode_nums or []:
+        if isinstance(episode_num, dict) and episode_num.get("system") in ("xmltv_ns", "onscreen"):
+            found.setdefault(episode_num["system"], episode_num.get("text"))
+
+    season = episode = None
+    if "xmltv_ns" in found:
+        season, episode = parse_xmltv_ns(found["xmltv_ns"])
+    if episode is None and "onscreen" in found:
+        season, episode = parse_onscreen(found["onscreen"])
+    return season, episode
@@ -1,5 +1,5 @@
 from dataclasses import dataclass, field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterator
 
 import lxml.etree as ET
 
@@ -54,6 +54,13 @@ class Programme:
     images: List[Dict[str, str]] = field(default_factory=list)
 
 
+@dataclass
+class Batch:
+    """A slice of an XMLTV feed, as produced by the streaming parser."""
+    channels: List[Channel] = field(default_factory=list)
+    programmes: List[Programme] = field(default_factory=list)
+
+
 class XMLTVParser:
     """High-performance XMLTV parser using lxml."""
 
@@ -92,6 +99,41 @@ class XMLTVParser:
         except Exception as e:
             raise RuntimeError(f"Error parsing XMLTV file: {e}")
 
+    def iter_file(self, file_path: str, batch_size: int = 1000) -> Iterator[Batch]:
+        """
+        Parse XMLTV file incrementally, yielding batches of at most batch_size elements.
+
+        Unlike parse_file nothing is accumulated, programmes are not attached to
+        their channels and channels referenced only by programmes are not created.
+        """
+        try:
+            context = ET.iterparse(file_path, events=('end',), tag=('channel', 'programme'))
+            batch = Batch()
+
+            for event, elem in context:
+                if elem.tag == 'channel':
+                    channel = self._build_channel(elem)
+                    if channel:
+                        batch.channels.append(channel)
+                else:
+                    programme = self._build_programme(elem)
+                    if programme:
+                        batch.programmes.append(programme)
+
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
+
+                if len(batch.channels) + len(batch.programmes) >= batch_size:
+                    yield batch
+                    batch = Batch()
+
+            if batch.channels or batch.programmes:
+                yield batch
+
+        except ET.XMLSyntaxError as e:
+            raise ValueError(f"Invalid XML format: {e}")
+
     def parse_string(self, xml_content: str) -> List[Channel]:
         """Parse XMLTV from string content."""
         try:
@@ -114,9 +156,14 @@ class XMLTVParser:
 
     def _parse_channel(self, elem: ET.Element) -> None:
         """Parse a channel element."""
+        channel = self._build_channel(elem)
+        if channel:
+            self.channels[channel.id] = channel
+
+    def _build_channel(self, elem: ET.Element) -> Optional[Channel]:
         channel_id = elem.get('id')
         if not channel_id:
-            return
+            return None
 
         channel = Channel(id=channel_id)
 
@@ -142,19 +189,26 @@ class XMLTVParser:
                 'system': url.get('system', '')
             })
 
-        self.channels[channel_id] = channel
+        return channel
 
     def _parse_programme(self, elem: ET.Element) -> None:
         """Parse a programme element."""
+        programme = self._build_programme(elem)
+        if not programme:
+            return
+
+        # Ensure channel exists
+        if programme.channel not in self.channels:
+            self.channels[programme.channel] = Channel(id=programme.channel)
+
+        self.channels[programme.channel].programmes.append(programme)
+
+    def _build_programme(self, elem: ET.Element) -> Optional[Programme]:
         channel_id = elem.get('channel')
         start = elem.get('start')
 
         if not channel_id or not start:
-            return
-
-        # Ensure channel exists
-        if channel_id not in self.channels:
-            self.channels[channel_id] = Channel(id=channel_id)
+            return None
 
         programme = Programme(
             start=start,
@@ -371,7 +425,7 @@ class XMLTVParser:
                 'system': image.get('system', '')
             })
 
-        self.channels[channel_id].programmes.append(programme)
+        return programme
 
     def _parse_credits(self, credits_elem: ET.Element) -> Dict[str, List[Dict[str, Any]]]:
         """Parse credits element."""
@@ -430,6 +484,12 @@ def parse_xmltv_file(file_path: str) -> List[Channel]:
     return parser.parse_file(file_path)
 
 
+def iter_xmltv_file(file_path: str, batch_size: int = 1000) -> Iterator[Batch]:
+    """Parse XMLTV file as a stream of channel/programme batches."""
+    parser = XMLTVParser()
+    return parser.iter_file(file_path, batch_size)
+
+
 def parse_xmltv_string(xml_content: str) -> List[Channel]:
     """Parse XMLTV from string content."""
     parser = XMLTVParser()
@@ -0,0 +1,28 @@
+import json
+from typing import Any, Optional
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+
+def dumps(value: Any) -> str:
+    """
+    Serialize to compact JSON, with orjson when it is installed
+
+    The json fallback produces the same text, so content hashes built from it
+    don't depend on which encoder a node has.
+    """
+    if orjson is not None:
+        return orjson.dumps(value).decode("utf-8")
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+def dumps_field(value: Any) -> Optional[str]:
+    """JSON for a nullable column, empty lists and dicts skip the encoder"""
+    if value is None:
+        return None
+    if not value and isinstance(value, (list, dict)):
+        return "[]" if isinstance(value, list) else "{}"
+    return dumps(value)
@@ -1,5 +1,7 @@
+import datetime as dt
 import time
 from os import path
+from typing import Optional
 
 
 def is_file_older_cache_time(file, hours=1):
@@ -10,3 +12,48 @@ def is_file_older_cache_time(file, hours=1):
     current_time = time.time()
     age_seconds = current_time - file_mod_time
     return age_seconds > hours * 3600
+
+
+def parse_xmltv_time(value: Optional[str]) -> Optional[dt.datetime]:
+    """Parse an XMLTV timestamp such as '20231001120000 +0100' into an aware UTC datetime"""
+    if not value:
+        return None
+
+    parts = value.strip().split()
+    digits = parts[0][:14]
+    if not digits.isdigit() or len(digits) < 8:
+        return None
+    # Truncated forms (YYYYMMDD, YYYYMMDDHHMM) are allowed by the DTD
+    digits = digits.ljust(14, '0')
+
+    offset = dt.timedelta(0)
+    if len(parts) > 1 and len(parts[1]) == 5 and parts[1][0] in '+-' and parts[1][1:].isdigit():
+        sign = -1 if parts[1][0] == '-' else 1
+        offset = sign * dt.timedelta(hours=int(parts[1][1:3]), minutes=int(parts[1][3:5]))
+
+    try:
+        # Much cheaper than strptime, this runs twice for every programme in a feed
+        naive = dt.datetime(int(digits[0:4]), int(digits[4:6]), int(digits[6:8]),
+                            int(digits[8:10]), int(digits[10:12]), int(digits[12:14]))
+    except ValueError:
+        return None
+    return (naive - offset).replace(tzinfo=dt.timezone.utc)
+
+
+def xmltv_to_epoch(value: Optional[str]) -> Optional[int]:
+    """Convert an XMLTV timestamp to integer seconds since the Unix epoch"""
+    parsed = parse_xmltv_time(value)
+    return int(parsed.timestamp()) if parsed else None
+
+
+def to_epoch(value) -> Optional[int]:
+    """Accept epoch seconds, a datetime (naive means UTC) or an XMLTV timestamp"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, dt.datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=dt.timezone.utc)
+        return int(value.timestamp())
+    return xmltv_to_epoch(str(value))
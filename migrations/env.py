@@ -12,6 +12,7 @@ sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from app.database import Base, DATABASE_URL
 from app.models import *  # Import all models to ensure they're registered with Base
+from app.models.programme_search import SEARCH_TABLE
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -29,6 +30,22 @@ config.set_main_option("sqlalchemy.url", DATABASE_URL)
 # for 'autogenerate' support
 target_metadata = Base.metadata
 
+
+def include_name(name, type_, parent_names) -> bool:
+    """Leave the full-text search tables, which aren't in the metadata, out of autogenerate"""
+    if type_ == "table":
+        return not (name or "").startswith(SEARCH_TABLE)
+    return True
+
+
+def include_object(object, name, type_, reflected, compare_to) -> bool:
+    """Leave indexes only created on another backend (Index.ddl_if) out of autogenerate"""
+    ddl_if = getattr(object, "_ddl_if", None)
+    if type_ == "index" and not reflected and ddl_if is not None and ddl_if.dialect:
+        return ddl_if.dialect == context.get_context().dialect.name
+    return True
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -74,7 +91,8 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata, include_name=include_name,
+            include_object=include_object
         )
 
         with context.begin_transaction():
@@ -0,0 +1,34 @@
+"""Add channel last seen
+
+Revision ID: 0074e29e4095
+Revises: 28b84482a1bd
+Create Date: 2026-10-19 04:00:10.305209
+
+"""
+import datetime as dt
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0074e29e4095'
+down_revision: Union[str, Sequence[str], None] = '28b84482a1bd'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('channels', sa.Column('last_seen_at', sa.DateTime(), nullable=True))
+    # Start the retention clock for existing channels now
+    op.execute(sa.text("UPDATE channels SET last_seen_at = :now").bindparams(
+        sa.bindparam('now', dt.datetime.now(dt.timezone.utc), type_=sa.DateTime())))
+    op.create_index(op.f('ix_channels_last_seen_at'), 'channels', ['last_seen_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_channels_last_seen_at'), table_name='channels')
+    op.drop_column('channels', 'last_seen_at')
@@ -0,0 +1,65 @@
+"""Add programme search index
+
+Revision ID: 0161e205367f
+Revises: f91706e0621e
+Create Date: 2026-10-19 04:20:38.973273
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0161e205367f'
+down_revision: Union[str, Sequence[str], None] = 'f91706e0621e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _sqlite_text(row: str, column: str) -> str:
+    return f"CASE WHEN json_valid({row}.{column}) THEN json_extract({row}.{column}, '$[0].text') END"
+
+
+def _sqlite_insert(row: str) -> str:
+    return (f"INSERT INTO programme_search(rowid, title, sub_title, description) VALUES ({row}.id, "
+            f"{_sqlite_text(row, 'titles')}, {_sqlite_text(row, 'sub_titles')}, {_sqlite_text(row, 'descriptions')});")
+
+
+def _pg_text(column: str) -> str:
+    return f"coalesce(({column}::jsonb -> 0 ->> 'text'), '')"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    connection = op.get_bind()
+    if connection.dialect.name == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE programme_search USING fts5("
+                   "title, sub_title, description, tokenize = 'unicode61 remove_diacritics 2')")
+        op.execute(f"CREATE TRIGGER programme_search_insert AFTER INSERT ON programmes BEGIN "
+                   f"{_sqlite_insert('new')} END")
+        op.execute("CREATE TRIGGER programme_search_delete AFTER DELETE ON programmes BEGIN "
+                   "DELETE FROM programme_search WHERE rowid = old.id; END")
+        op.execute(f"CREATE TRIGGER programme_search_update AFTER UPDATE OF titles, sub_titles, descriptions "
+                   f"ON programmes BEGIN DELETE FROM programme_search WHERE rowid = old.id; {_sqlite_insert('new')} END")
+        op.execute("INSERT INTO programme_search(rowid, title, sub_title, description) SELECT p.id, "
+                   f"{_sqlite_text('p', 'titles')}, {_sqlite_text('p', 'sub_titles')}, "
+                   f"{_sqlite_text('p', 'descriptions')} FROM programmes p")
+    elif connection.dialect.name == 'postgresql':
+        op.execute("CREATE INDEX idx_programme_search ON programmes USING gin (("
+                   f"setweight(to_tsvector('simple', {_pg_text('titles')}), 'A') || "
+                   f"setweight(to_tsvector('simple', {_pg_text('sub_titles')}), 'B') || "
+                   f"setweight(to_tsvector('simple', {_pg_text('descriptions')}), 'C')))")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    connection = op.get_bind()
+    if connection.dialect.name == 'sqlite':
+        op.execute("DROP TRIGGER programme_search_update")
+        op.execute("DROP TRIGGER programme_search_delete")
+        op.execute("DROP TRIGGER programme_search_insert")
+        op.execute("DROP TABLE programme_search")
+    elif connection.dialect.name == 'postgresql':
+        op.execute("DROP INDEX idx_programme_search")
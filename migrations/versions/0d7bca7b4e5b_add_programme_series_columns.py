@@ -0,0 +1,81 @@
+"""Add programme series columns
+
+Revision ID: 0d7bca7b4e5b
+Revises: 520eb2fea36d
+Create Date: 2026-10-19 04:34:55.591840
+
+"""
+from typing import Sequence, Union
+
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.programme import series_columns
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0d7bca7b4e5b'
+down_revision: Union[str, Sequence[str], None] = '520eb2fea36d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BATCH_SIZE = 1000
+
+SERIES_COLUMNS = (
+    ('series_key', sa.String(length=20)),
+    ('season', sa.Integer()),
+    ('episode', sa.Integer()),
+)
+
+
+def _loads(value):
+    try:
+        return json.loads(value) if value else None
+    except ValueError:
+        return None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # add_column rather than a batch rebuild, which would drop the programmes triggers on SQLite
+    for table in ('programmes', 'epg_import_programmes'):
+        for name, type_ in SERIES_COLUMNS:
+            op.add_column(table, sa.Column(name, type_, nullable=True))
+
+    connection = op.get_bind()
+    update = sa.text("UPDATE programmes SET series_key = :series_key, season = :season, episode = :episode "
+                     "WHERE id = :id")
+    last_id = 0
+    while True:
+        rows = connection.execute(sa.text(
+            "SELECT p.id, c.xmltv_id, p.title, p.episode_nums FROM programmes p "
+            "JOIN channels c ON c.id = p.channel_id "
+            f"WHERE p.id > :last_id ORDER BY p.id LIMIT {BATCH_SIZE}"
+        ), {"last_id": last_id}).all()
+        if not rows:
+            break
+        connection.execute(update, [
+            {"id": row.id, **series_columns(row.xmltv_id, row.title, _loads(row.episode_nums))} for row in rows
+        ])
+        last_id = rows[-1].id
+
+    op.create_index('idx_programme_series_start', 'programmes', ['series_key', 'start_epoch'], unique=False)
+    op.create_index('idx_programme_series_episode', 'programmes', ['series_key', 'season', 'episode'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_programme_series_episode', table_name='programmes')
+    op.drop_index('idx_programme_series_start', table_name='programmes')
+    connection = op.get_bind()
+    for table in ('epg_import_programmes', 'programmes'):
+        if connection.dialect.name == 'sqlite':
+            # Plain DROP COLUMN keeps the programmes triggers, SQLite 3.35+
+            for name, _ in reversed(SERIES_COLUMNS):
+                op.execute(f"ALTER TABLE {table} DROP COLUMN {name}")
+        else:
+            for name, _ in reversed(SERIES_COLUMNS):
+                op.drop_column(table, name)
@@ -0,0 +1,29 @@
+"""Add programme content hash
+
+Revision ID: 16a741fc3da4
+Revises: 7ae75d54e88f
+Create Date: 2026-10-19 03:45:28.816331
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '16a741fc3da4'
+down_revision: Union[str, Sequence[str], None] = '7ae75d54e88f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing rows get their hash on the next refresh of their channel
+    op.add_column('programmes', sa.Column('content_hash', sa.String(length=40), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('programmes', 'content_hash')
@@ -0,0 +1,100 @@
+"""Add EPG import staging tables
+
+Revision ID: 28b84482a1bd
+Revises: c79ec8778ebe
+Create Date: 2026-10-19 03:58:22.260408
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '28b84482a1bd'
+down_revision: Union[str, Sequence[str], None] = 'c79ec8778ebe'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('epg_imports',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('user_id', sa.String(length=36), nullable=False),
+        sa.Column('server_id', sa.String(length=36), nullable=False),
+        sa.Column('status', sa.String(length=16), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_epg_imports_id'), 'epg_imports', ['id'], unique=False)
+    op.create_index(op.f('ix_epg_imports_status'), 'epg_imports', ['status'], unique=False)
+
+    op.create_table('epg_import_channels',
+        sa.Column('import_id', sa.String(length=36), nullable=False),
+        sa.Column('channel_id', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('import_id', 'channel_id')
+    )
+
+    op.create_table('epg_import_programmes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('import_id', sa.String(length=36), nullable=False),
+        sa.Column('action', sa.String(length=8), nullable=False),
+        sa.Column('programme_id', sa.Integer(), nullable=True),
+        sa.Column('channel_id', sa.Integer(), nullable=True),
+        sa.Column('start_time', sa.String(), nullable=True),
+        sa.Column('stop_time', sa.String(), nullable=True),
+        sa.Column('start_epoch', sa.BigInteger(), nullable=True),
+        sa.Column('stop_epoch', sa.BigInteger(), nullable=True),
+        sa.Column('pdc_start', sa.String(), nullable=True),
+        sa.Column('vps_start', sa.String(), nullable=True),
+        sa.Column('showview', sa.String(), nullable=True),
+        sa.Column('videoplus', sa.String(), nullable=True),
+        sa.Column('clumpidx', sa.String(), nullable=True),
+        sa.Column('titles', sa.Text(), nullable=True),
+        sa.Column('sub_titles', sa.Text(), nullable=True),
+        sa.Column('descriptions', sa.Text(), nullable=True),
+        sa.Column('credits', sa.Text(), nullable=True),
+        sa.Column('date', sa.String(), nullable=True),
+        sa.Column('categories', sa.Text(), nullable=True),
+        sa.Column('keywords', sa.Text(), nullable=True),
+        sa.Column('language', sa.Text(), nullable=True),
+        sa.Column('orig_language', sa.Text(), nullable=True),
+        sa.Column('length', sa.Text(), nullable=True),
+        sa.Column('icons', sa.Text(), nullable=True),
+        sa.Column('urls', sa.Text(), nullable=True),
+        sa.Column('countries', sa.Text(), nullable=True),
+        sa.Column('episode_nums', sa.Text(), nullable=True),
+        sa.Column('video', sa.Text(), nullable=True),
+        sa.Column('audio', sa.Text(), nullable=True),
+        sa.Column('previously_shown', sa.Text(), nullable=True),
+        sa.Column('premiere', sa.Text(), nullable=True),
+        sa.Column('last_chance', sa.Text(), nullable=True),
+        sa.Column('new', sa.Boolean(), nullable=True),
+        sa.Column('subtitles', sa.Text(), nullable=True),
+        sa.Column('ratings', sa.Text(), nullable=True),
+        sa.Column('star_ratings', sa.Text(), nullable=True),
+        sa.Column('reviews', sa.Text(), nullable=True),
+        sa.Column('images', sa.Text(), nullable=True),
+        sa.Column('packed_fields', sa.LargeBinary(), nullable=True),
+        sa.Column('content_hash', sa.String(length=40), nullable=True),
+        sa.Column('date_created', sa.DateTime(), nullable=True),
+        sa.Column('date_last_updated', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_epg_import_programmes_action', 'epg_import_programmes', ['import_id', 'action'], unique=False)
+    op.create_index('idx_epg_import_programmes_programme', 'epg_import_programmes', ['import_id', 'programme_id'],
+                    unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_epg_import_programmes_programme', table_name='epg_import_programmes')
+    op.drop_index('idx_epg_import_programmes_action', table_name='epg_import_programmes')
+    op.drop_table('epg_import_programmes')
+    op.drop_table('epg_import_channels')
+    op.drop_index(op.f('ix_epg_imports_status'), table_name='epg_imports')
+    op.drop_index(op.f('ix_epg_imports_id'), table_name='epg_imports')
+    op.drop_table('epg_imports')
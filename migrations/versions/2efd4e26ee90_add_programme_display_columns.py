@@ -0,0 +1,108 @@
+"""Add programme display columns
+
+Revision ID: 2efd4e26ee90
+Revises: 0161e205367f
+Create Date: 2026-10-19 04:23:07.087353
+
+"""
+from typing import Sequence, Union
+
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.programme import display_columns
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2efd4e26ee90'
+down_revision: Union[str, Sequence[str], None] = '0161e205367f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BATCH_SIZE = 1000
+
+DISPLAY_COLUMNS = (
+    ('title', sa.String()),
+    ('description', sa.Text()),
+    ('category_text', sa.String()),
+)
+
+
+def _loads(value):
+    try:
+        return json.loads(value) if value else None
+    except ValueError:
+        return None
+
+
+def _sqlite_text(row: str, column: str) -> str:
+    return f"CASE WHEN json_valid({row}.{column}) THEN json_extract({row}.{column}, '$[0].text') END"
+
+
+def _sqlite_triggers(title: str, description: str, watched: str):
+    insert = (f"INSERT INTO programme_search(rowid, title, sub_title, description) VALUES (new.id, "
+              f"{title}, {_sqlite_text('new', 'sub_titles')}, {description});")
+    op.execute("DROP TRIGGER IF EXISTS programme_search_insert")
+    op.execute("DROP TRIGGER IF EXISTS programme_search_update")
+    op.execute(f"CREATE TRIGGER programme_search_insert AFTER INSERT ON programmes BEGIN {insert} END")
+    op.execute(f"CREATE TRIGGER programme_search_update AFTER UPDATE OF {watched} ON programmes BEGIN "
+               f"DELETE FROM programme_search WHERE rowid = old.id; {insert} END")
+
+
+def _pg_index(title: str, description: str):
+    op.execute("DROP INDEX idx_programme_search")
+    op.execute("CREATE INDEX idx_programme_search ON programmes USING gin (("
+               f"setweight(to_tsvector('simple', coalesce({title}, '')), 'A') || "
+               "setweight(to_tsvector('simple', coalesce((sub_titles::jsonb -> 0 ->> 'text'), '')), 'B') || "
+               f"setweight(to_tsvector('simple', coalesce({description}, '')), 'C')))")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in ('programmes', 'epg_import_programmes'):
+        for name, type_ in DISPLAY_COLUMNS:
+            op.add_column(table, sa.Column(name, type_, nullable=True))
+
+    connection = op.get_bind()
+    update = sa.text("UPDATE programmes SET title = :title, description = :description, "
+                     "category_text = :category_text WHERE id = :id")
+    last_id = 0
+    while True:
+        rows = connection.execute(sa.text(
+            "SELECT id, titles, descriptions, categories FROM programmes "
+            f"WHERE id > :last_id ORDER BY id LIMIT {BATCH_SIZE}"
+        ), {"last_id": last_id}).all()
+        if not rows:
+            break
+        connection.execute(update, [
+            {"id": row.id, **display_columns(_loads(row.titles), _loads(row.descriptions), _loads(row.categories))}
+            for row in rows
+        ])
+        last_id = rows[-1].id
+
+    # Index the new columns, the indexed text is unchanged so nothing is rebuilt
+    if connection.dialect.name == 'sqlite':
+        _sqlite_triggers('new.title', 'new.description', 'title, sub_titles, description')
+    elif connection.dialect.name == 'postgresql':
+        _pg_index('title', 'description')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    connection = op.get_bind()
+    for table in ('epg_import_programmes', 'programmes'):
+        with op.batch_alter_table(table) as batch_op:
+            for name, _ in reversed(DISPLAY_COLUMNS):
+                batch_op.drop_column(name)
+
+    # The batch rebuild of programmes drops its triggers, so they are restored afterwards
+    if connection.dialect.name == 'sqlite':
+        _sqlite_triggers(_sqlite_text('new', 'titles'), _sqlite_text('new', 'descriptions'),
+                         'titles, sub_titles, descriptions')
+        op.execute("CREATE TRIGGER IF NOT EXISTS programme_search_delete AFTER DELETE ON programmes BEGIN "
+                   "DELETE FROM programme_search WHERE rowid = old.id; END")
+    elif connection.dialect.name == 'postgresql':
+        _pg_index("(titles::jsonb -> 0 ->> 'text')", "(descriptions::jsonb -> 0 ->> 'text')")
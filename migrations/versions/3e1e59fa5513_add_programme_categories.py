@@ -0,0 +1,94 @@
+"""Add programme categories
+
+Revision ID: 3e1e59fa5513
+Revises: 2efd4e26ee90
+Create Date: 2026-10-19 04:29:41.337640
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.programme import CATEGORY_SEPARATOR, programme_delete_trigger
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3e1e59fa5513'
+down_revision: Union[str, Sequence[str], None] = '2efd4e26ee90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+
+def _backfill(connection) -> None:
+    category_ids = {}
+    last_id = 0
+    while True:
+        rows = connection.execute(sa.text(
+            "SELECT p.id, c.source_id, p.start_epoch, p.stop_epoch, p.category_text FROM programmes p "
+            "JOIN channels c ON c.id = p.channel_id "
+            "WHERE p.id > :last_id AND p.category_text IS NOT NULL AND p.start_epoch IS NOT NULL "
+            f"AND c.source_id IS NOT NULL ORDER BY p.id LIMIT {BATCH_SIZE}"
+        ), {"last_id": last_id}).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+
+        links = {}
+        for row in rows:
+            for name in row.category_text.split(CATEGORY_SEPARATOR):
+                key = (row.source_id, name)
+                if key not in category_ids:
+                    connection.execute(sa.text("INSERT INTO categories (source_id, name) VALUES (:source_id, :name)"),
+                                       {"source_id": row.source_id, "name": name})
+                    category_ids[key] = connection.execute(sa.text(
+                        "SELECT id FROM categories WHERE source_id = :source_id AND name = :name"
+                    ), {"source_id": row.source_id, "name": name}).scalar()
+                links[(row.id, category_ids[key])] = {
+                    "programme_id": row.id, "category_id": category_ids[key], "start_epoch": row.start_epoch,
+                    "stop_epoch": row.stop_epoch if row.stop_epoch is not None else row.start_epoch,
+                }
+        connection.execute(sa.text(
+            "INSERT INTO programme_categories (programme_id, category_id, start_epoch, stop_epoch) "
+            "VALUES (:programme_id, :category_id, :start_epoch, :stop_epoch)"
+        ), list(links.values()))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('categories',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('source_id', sa.String(length=36), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.ForeignKeyConstraint(['source_id'], ['epg_sources.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('source_id', 'name', name='uq_category_source_name')
+    )
+    op.create_table('programme_categories',
+        sa.Column('programme_id', sa.Integer(), nullable=False),
+        sa.Column('category_id', sa.Integer(), nullable=False),
+        sa.Column('start_epoch', sa.BigInteger(), nullable=False),
+        sa.Column('stop_epoch', sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(['category_id'], ['categories.id'], ),
+        sa.ForeignKeyConstraint(['programme_id'], ['programmes.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('programme_id', 'category_id')
+    )
+
+    connection = op.get_bind()
+    if connection.dialect.name == 'sqlite':
+        op.execute(programme_delete_trigger('programme_categories')[0])
+
+    _backfill(connection)
+    op.create_index('idx_programme_categories_time', 'programme_categories',
+                    ['category_id', 'stop_epoch', 'start_epoch', 'programme_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute(programme_delete_trigger('programme_categories')[1])
+    op.drop_index('idx_programme_categories_time', table_name='programme_categories')
+    op.drop_table('programme_categories')
+    op.drop_table('categories')
@@ -0,0 +1,123 @@
+"""Add programme people
+
+Revision ID: 520eb2fea36d
+Revises: 3e1e59fa5513
+Create Date: 2026-10-19 04:32:05.243749
+
+"""
+from typing import Sequence, Union
+
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.person import person_key
+from app.models.programme import programme_delete_trigger, unpack_fields
+
+
+# revision identifiers, used by Alembic.
+revision: str = '520eb2fea36d'
+down_revision: Union[str, Sequence[str], None] = '3e1e59fa5513'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+
+def _credits(row) -> list:
+    credits = row.credits if row.credits is not None else unpack_fields(row.packed_fields).get('credits')
+    try:
+        credits = json.loads(credits) if credits else None
+    except ValueError:
+        return []
+    if not isinstance(credits, dict):
+        return []
+    people = []
+    for role, entries in credits.items():
+        for entry in entries if isinstance(entries, list) else []:
+            name = entry.get('name') if isinstance(entry, dict) else entry
+            if isinstance(name, str) and name.strip():
+                character = entry.get('role') if isinstance(entry, dict) else None
+                people.append((name.strip(), role[:16], character or None))
+    return people
+
+
+def _backfill(connection) -> None:
+    person_ids = {}
+    last_id = 0
+    while True:
+        rows = connection.execute(sa.text(
+            "SELECT p.id, c.source_id, p.start_epoch, p.stop_epoch, p.credits, p.packed_fields FROM programmes p "
+            "JOIN channels c ON c.id = p.channel_id "
+            "WHERE p.id > :last_id AND p.start_epoch IS NOT NULL AND c.source_id IS NOT NULL "
+            f"ORDER BY p.id LIMIT {BATCH_SIZE}"
+        ), {"last_id": last_id}).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+
+        links = {}
+        for row in rows:
+            for name, role, character in _credits(row):
+                key = (row.source_id, name)
+                if key not in person_ids:
+                    connection.execute(sa.text(
+                        "INSERT INTO people (source_id, name, name_key) VALUES (:source_id, :name, :name_key)"
+                    ), {"source_id": row.source_id, "name": name, "name_key": person_key(name)})
+                    person_ids[key] = connection.execute(sa.text(
+                        "SELECT id FROM people WHERE source_id = :source_id AND name = :name"
+                    ), {"source_id": row.source_id, "name": name}).scalar()
+                links.setdefault((row.id, person_ids[key], role), {
+                    "programme_id": row.id, "person_id": person_ids[key], "role": role, "character": character,
+                    "start_epoch": row.start_epoch,
+                    "stop_epoch": row.stop_epoch if row.stop_epoch is not None else row.start_epoch,
+                })
+        if links:
+            connection.execute(sa.text(
+                "INSERT INTO programme_people (programme_id, person_id, role, character, start_epoch, stop_epoch) "
+                "VALUES (:programme_id, :person_id, :role, :character, :start_epoch, :stop_epoch)"
+            ), list(links.values()))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('people',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('source_id', sa.String(length=36), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('name_key', sa.String(), nullable=False),
+        sa.ForeignKeyConstraint(['source_id'], ['epg_sources.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('source_id', 'name', name='uq_person_source_name')
+    )
+    op.create_table('programme_people',
+        sa.Column('programme_id', sa.Integer(), nullable=False),
+        sa.Column('person_id', sa.Integer(), nullable=False),
+        sa.Column('role', sa.String(length=16), nullable=False),
+        sa.Column('character', sa.String(), nullable=True),
+        sa.Column('start_epoch', sa.BigInteger(), nullable=False),
+        sa.Column('stop_epoch', sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(['person_id'], ['people.id'], ),
+        sa.ForeignKeyConstraint(['programme_id'], ['programmes.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('programme_id', 'person_id', 'role')
+    )
+
+    connection = op.get_bind()
+    if connection.dialect.name == 'sqlite':
+        op.execute(programme_delete_trigger('programme_people')[0])
+
+    _backfill(connection)
+    op.create_index('idx_people_source_key', 'people', ['source_id', 'name_key'], unique=False)
+    op.create_index('idx_programme_people_time', 'programme_people',
+                    ['person_id', 'stop_epoch', 'start_epoch', 'programme_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute(programme_delete_trigger('programme_people')[1])
+    op.drop_index('idx_programme_people_time', table_name='programme_people')
+    op.drop_table('programme_people')
+    op.drop_index('idx_people_source_key', table_name='people')
+    op.drop_table('people')
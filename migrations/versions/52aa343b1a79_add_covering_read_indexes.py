@@ -0,0 +1,50 @@
+"""Add covering read indexes
+
+Revision ID: 52aa343b1a79
+Revises: c08c56f5a56a
+Create Date: 2026-10-19 04:44:56.008542
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '52aa343b1a79'
+down_revision: Union[str, Sequence[str], None] = 'c08c56f5a56a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+LISTING_COLUMNS = ['channel_id', 'start_epoch', 'stop_epoch', 'start_time', 'stop_time', 'title', 'description',
+                   'category_text', 'series_key', 'season', 'episode']
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    connection = op.get_bind()
+    if connection.dialect.name == 'sqlite':
+        op.create_index('idx_programme_listing', 'programmes', LISTING_COLUMNS, unique=False)
+    else:
+        op.create_index('idx_programme_channel_start_stop_epoch', 'programmes',
+                        ['channel_id', 'start_epoch', 'stop_epoch'], unique=False)
+    op.drop_index('idx_programme_channel_start_epoch', table_name='programmes')
+    # Nothing filters on the XMLTV time strings any more, only idx_programme_channel_start is still used
+    op.drop_index('idx_programme_start_stop', table_name='programmes')
+    op.drop_index('ix_programmes_start_time', table_name='programmes')
+    op.drop_index('ix_programmes_stop_time', table_name='programmes')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('ix_programmes_stop_time', 'programmes', ['stop_time'], unique=False)
+    op.create_index('ix_programmes_start_time', 'programmes', ['start_time'], unique=False)
+    op.create_index('idx_programme_start_stop', 'programmes', ['start_time', 'stop_time'], unique=False)
+    op.create_index('idx_programme_channel_start_epoch', 'programmes', ['channel_id', 'start_epoch'], unique=False)
+    connection = op.get_bind()
+    if connection.dialect.name == 'sqlite':
+        op.drop_index('idx_programme_listing', table_name='programmes')
+    else:
+        op.drop_index('idx_programme_channel_start_stop_epoch', table_name='programmes')
@@ -0,0 +1,40 @@
+"""List programme category objects
+
+Revision ID: 5905fc5b8806
+Revises: b5e9f1426666
+Create Date: 2026-10-19 05:21:02.177574
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5905fc5b8806'
+down_revision: Union[str, Sequence[str], None] = 'b5e9f1426666'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+LISTING_COLUMNS = ['channel_id', 'start_epoch', 'stop_epoch', 'start_time', 'stop_time', 'title', 'description',
+                   'categories', 'series_key', 'season', 'episode']
+
+
+def _replace_listing_index(columns) -> None:
+    # Only SQLite keeps the listing columns in the index
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.drop_index('idx_programme_listing', table_name='programmes')
+    op.create_index('idx_programme_listing', 'programmes', columns, unique=False)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _replace_listing_index(LISTING_COLUMNS)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _replace_listing_index([name if name != 'categories' else 'category_text' for name in LISTING_COLUMNS])
@@ -0,0 +1,35 @@
+"""Add EPG source horizon
+
+Revision ID: 68edc055eb6b
+Revises: 5905fc5b8806
+Create Date: 2026-10-19 05:22:55.552558
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '68edc055eb6b'
+down_revision: Union[str, Sequence[str], None] = '5905fc5b8806'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('epg_sources', sa.Column('horizon_end', sa.DateTime(), nullable=True))
+    # Until the next import, take the horizon its subscribers last recorded
+    op.execute(
+        "UPDATE epg_sources SET horizon_end = ("
+        "SELECT max(schedules.horizon_end) FROM epg_refresh_schedules AS schedules "
+        "JOIN epg_source_subscriptions AS subscriptions ON subscriptions.server_id = schedules.server_id "
+        "WHERE subscriptions.source_id = epg_sources.id)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('epg_sources', 'horizon_end')
@@ -0,0 +1,44 @@
+"""Add EPG refresh schedules
+
+Revision ID: 7ae75d54e88f
+Revises: 1cec460a3478
+Create Date: 2026-10-19 03:43:54.975260
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7ae75d54e88f'
+down_revision: Union[str, Sequence[str], None] = '1cec460a3478'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'epg_refresh_schedules',
+        sa.Column('server_id', sa.String(length=36), nullable=False),
+        sa.Column('user_id', sa.String(length=36), nullable=False),
+        sa.Column('content_hash', sa.String(length=64), nullable=True),
+        sa.Column('horizon_end', sa.DateTime(), nullable=True),
+        sa.Column('last_checked', sa.DateTime(), nullable=True),
+        sa.Column('last_changed', sa.DateTime(), nullable=True),
+        sa.Column('change_interval', sa.Float(), nullable=True),
+        sa.Column('next_refresh', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['server_id'], ['servers.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('server_id')
+    )
+    op.create_index(op.f('ix_epg_refresh_schedules_next_refresh'), 'epg_refresh_schedules', ['next_refresh'],
+                    unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_epg_refresh_schedules_next_refresh'), table_name='epg_refresh_schedules')
+    op.drop_table('epg_refresh_schedules')
@@ -0,0 +1,48 @@
+"""Add programme import state
+
+Revision ID: a3c91f27d4e6
+Revises: 68edc055eb6b
+Create Date: 2026-10-19 09:14:37.402816
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c91f27d4e6'
+down_revision: Union[str, Sequence[str], None] = '68edc055eb6b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+LISTING_COLUMNS = ['channel_id', 'start_epoch', 'stop_epoch', 'start_time', 'stop_time', 'title', 'description',
+                   'categories', 'series_key', 'season', 'episode']
+IMPORT_STATE_COLUMNS = ['added_by', 'removed_by']
+
+
+def _replace_listing_index(columns) -> None:
+    # Only SQLite keeps the listing columns in the index
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.drop_index('idx_programme_listing', table_name='programmes')
+    op.create_index('idx_programme_listing', 'programmes', columns, unique=False)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for name in IMPORT_STATE_COLUMNS:
+        op.add_column('programmes', sa.Column(name, sa.String(length=36), nullable=True))
+        op.create_index(f'idx_programme_{name}', 'programmes', [name], unique=False,
+                        sqlite_where=sa.text(f'{name} IS NOT NULL'), postgresql_where=sa.text(f'{name} IS NOT NULL'))
+    _replace_listing_index(LISTING_COLUMNS + IMPORT_STATE_COLUMNS)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _replace_listing_index(LISTING_COLUMNS)
+    for name in IMPORT_STATE_COLUMNS:
+        op.drop_index(f'idx_programme_{name}', table_name='programmes')
+        op.drop_column('programmes', name)
@@ -0,0 +1,73 @@
+"""Add programme buckets
+
+Revision ID: b5e9f1426666
+Revises: 52aa343b1a79
+Create Date: 2026-10-19 04:47:59.513205
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.programme import programme_delete_trigger
+from app.models.programme_bucket import bucket_range
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5e9f1426666'
+down_revision: Union[str, Sequence[str], None] = '52aa343b1a79'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BATCH_SIZE = 1000
+
+
+def _backfill(connection) -> None:
+    last_id = 0
+    while True:
+        rows = connection.execute(sa.text(
+            "SELECT id, channel_id, start_epoch, stop_epoch FROM programmes "
+            f"WHERE id > :last_id AND start_epoch IS NOT NULL ORDER BY id LIMIT {BATCH_SIZE}"
+        ), {"last_id": last_id}).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+
+        links = []
+        for row in rows:
+            stop_epoch = row.stop_epoch if row.stop_epoch is not None else row.start_epoch
+            links.extend({"channel_id": row.channel_id, "bucket": bucket, "programme_id": row.id}
+                         for bucket in bucket_range(row.start_epoch, stop_epoch))
+        connection.execute(sa.text(
+            "INSERT INTO programme_buckets (channel_id, bucket, programme_id) "
+            "VALUES (:channel_id, :bucket, :programme_id)"
+        ), links)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('programme_buckets',
+        sa.Column('channel_id', sa.Integer(), nullable=False),
+        sa.Column('bucket', sa.Integer(), nullable=False),
+        sa.Column('programme_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['programme_id'], ['programmes.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('channel_id', 'bucket', 'programme_id'),
+        sqlite_with_rowid=False
+    )
+
+    connection = op.get_bind()
+    if connection.dialect.name == 'sqlite':
+        op.execute(programme_delete_trigger('programme_buckets')[0])
+
+    _backfill(connection)
+    op.create_index('idx_programme_buckets_programme', 'programme_buckets', ['programme_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute(programme_delete_trigger('programme_buckets')[1])
+    op.drop_index('idx_programme_buckets_programme', table_name='programme_buckets')
+    op.drop_table('programme_buckets')
@@ -0,0 +1,32 @@
+"""Clear published import state
+
+Revision ID: b7d2e5c1f3a8
+Revises: a3c91f27d4e6
+Create Date: 2026-10-19 14:02:51.118034
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d2e5c1f3a8'
+down_revision: Union[str, Sequence[str], None] = 'a3c91f27d4e6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Rows of published imports kept added_by, and readers show rows whose import is
+    # gone. Only the rows of imports that are loading or failed still need it
+    op.execute(
+        "UPDATE programmes SET added_by = NULL WHERE added_by IS NOT NULL "
+        "AND added_by NOT IN (SELECT id FROM epg_imports WHERE status != 'published')"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    pass
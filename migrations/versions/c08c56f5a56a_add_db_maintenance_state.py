@@ -0,0 +1,39 @@
+"""Add db maintenance state
+
+Revision ID: c08c56f5a56a
+Revises: 0d7bca7b4e5b
+Create Date: 2026-10-19 04:42:23.725527
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c08c56f5a56a'
+down_revision: Union[str, Sequence[str], None] = '0d7bca7b4e5b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'db_maintenance',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('rows_changed', sa.BigInteger(), nullable=False),
+        sa.Column('last_run_at', sa.DateTime(), nullable=True),
+        sa.Column('last_duration_seconds', sa.Float(), nullable=True),
+        sa.Column('last_rows_changed', sa.BigInteger(), nullable=True),
+        sa.Column('last_reindexed', sa.Boolean(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    # Statistics were never collected, so count every existing programme as changed
+    op.execute("INSERT INTO db_maintenance (id, rows_changed) SELECT 1, count(*) FROM programmes")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('db_maintenance')
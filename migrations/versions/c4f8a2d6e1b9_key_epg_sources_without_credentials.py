@@ -0,0 +1,72 @@
+"""Key EPG sources without credentials
+
+Revision ID: c4f8a2d6e1b9
+Revises: b7d2e5c1f3a8
+Create Date: 2026-10-19 14:31:07.540219
+
+"""
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.services.data.epg_data_services import feed_key
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4f8a2d6e1b9'
+down_revision: Union[str, Sequence[str], None] = 'b7d2e5c1f3a8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Keys of sources on a shard, see source_key
+SHARD_KEY = re.compile(r'(shard:[^:]+:)(.*)', re.DOTALL)
+
+
+def _split(url: str):
+    match = SHARD_KEY.fullmatch(url)
+    return match.groups() if match else ('', url)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Sources were keyed by the raw EPG URL, credentials included. Rekey them with
+    # feed_key, merging the subscriptions of sources that now share a key into the
+    # most recently imported one. The others are left unsubscribed for the
+    # retention job to delete, under a key without the credentials
+    connection = op.get_bind()
+    sources = connection.execute(sa.text(
+        "SELECT id, url FROM epg_sources "
+        "ORDER BY CASE WHEN last_imported_at IS NULL THEN 1 ELSE 0 END, last_imported_at DESC, date_created DESC"
+    )).all()
+
+    kept = {}
+    keys = {}
+    urls = dict(sources)
+    for source_id, url in sources:
+        prefix, key = _split(url)
+        # Servers without an EPG URL have private sources keyed user/server
+        key = prefix + feed_key(key) if '://' in key else url
+        if key not in kept:
+            kept[key] = source_id
+            keys[source_id] = key
+            continue
+        connection.execute(sa.text(
+            "UPDATE epg_source_subscriptions SET source_id = :kept WHERE source_id = :source_id"
+        ), {"kept": kept[key], "source_id": source_id})
+        keys[source_id] = f"{prefix}merged:{source_id}"
+
+    # Free the old keys before setting the new ones, a new key may be another source's old one
+    keys = {source_id: key for source_id, key in keys.items() if key != urls[source_id]}
+    for source_id in keys:
+        connection.execute(sa.text("UPDATE epg_sources SET url = :url WHERE id = :id"),
+                           {"url": f"rekey:{source_id}", "id": source_id})
+    for source_id, key in keys.items():
+        connection.execute(sa.text("UPDATE epg_sources SET url = :url WHERE id = :id"), {"url": key, "id": source_id})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # The credentials aren't kept, sources stay keyed without them
+    pass
@@ -0,0 +1,56 @@
+"""Add programme epoch columns
+
+Revision ID: c79ec8778ebe
+Revises: d00f4d1d01cb
+Create Date: 2026-10-19 03:55:15.608817
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.utils.time_utils import xmltv_to_epoch
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c79ec8778ebe'
+down_revision: Union[str, Sequence[str], None] = 'd00f4d1d01cb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BATCH_SIZE = 1000
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('programmes', sa.Column('start_epoch', sa.BigInteger(), nullable=True))
+    op.add_column('programmes', sa.Column('stop_epoch', sa.BigInteger(), nullable=True))
+
+    # Backfill before indexing so the index is built once
+    connection = op.get_bind()
+    update = sa.text("UPDATE programmes SET start_epoch = :start_epoch, stop_epoch = :stop_epoch WHERE id = :id")
+    last_id = 0
+    while True:
+        rows = connection.execute(sa.text(
+            f"SELECT id, start_time, stop_time FROM programmes WHERE id > :last_id ORDER BY id LIMIT {BATCH_SIZE}"
+        ), {"last_id": last_id}).all()
+        if not rows:
+            break
+        connection.execute(update, [
+            {"id": row.id, "start_epoch": xmltv_to_epoch(row.start_time), "stop_epoch": xmltv_to_epoch(row.stop_time)}
+            for row in rows
+        ])
+        last_id = rows[-1].id
+
+    op.create_index('idx_programme_channel_start_epoch', 'programmes', ['channel_id', 'start_epoch'], unique=False)
+    op.create_index('idx_programme_start_stop_epoch', 'programmes', ['start_epoch', 'stop_epoch'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_programme_start_stop_epoch', table_name='programmes')
+    op.drop_index('idx_programme_channel_start_epoch', table_name='programmes')
+    op.drop_column('programmes', 'stop_epoch')
+    op.drop_column('programmes', 'start_epoch')
@@ -0,0 +1,63 @@
+"""Add programme packed fields
+
+Revision ID: d00f4d1d01cb
+Revises: 16a741fc3da4
+Create Date: 2026-10-19 03:53:58.296304
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.programme import COLD_FIELDS, unpack_fields
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd00f4d1d01cb'
+down_revision: Union[str, Sequence[str], None] = '16a741fc3da4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BATCH_SIZE = 1000
+
+
+def _rewrite(select_sql: str, convert) -> None:
+    """Rewrite programme rows in id order, BATCH_SIZE at a time"""
+    connection = op.get_bind()
+    columns = ', '.join(COLD_FIELDS)
+    update = sa.text(
+        f"UPDATE programmes SET packed_fields = :packed_fields, "
+        f"{', '.join(f'{field} = :{field}' for field in COLD_FIELDS)} WHERE id = :id"
+    )
+    last_id = 0
+    while True:
+        rows = connection.execute(sa.text(
+            f"SELECT id, packed_fields, {columns} FROM programmes "
+            f"WHERE id > :last_id AND {select_sql} ORDER BY id LIMIT {BATCH_SIZE}"
+        ), {"last_id": last_id}).mappings().all()
+        if not rows:
+            break
+        connection.execute(update, [convert(row) for row in rows])
+        last_id = rows[-1]["id"]
+
+
+def _unpack(row) -> dict:
+    values = {"id": row["id"], "packed_fields": None}
+    unpacked = unpack_fields(row["packed_fields"])
+    values.update({field: row[field] if row[field] is not None else unpacked.get(field) for field in COLD_FIELDS})
+    return values
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing rows are packed by the retention job once EPG_PACK_COLD_FIELDS is
+    # set, see convert_cold_fields, so the upgrade doesn't depend on the config
+    op.add_column('programmes', sa.Column('packed_fields', sa.LargeBinary(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _rewrite("packed_fields IS NOT NULL", _unpack)
+    op.drop_column('programmes', 'packed_fields')
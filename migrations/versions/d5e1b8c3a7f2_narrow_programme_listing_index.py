@@ -0,0 +1,40 @@
+"""Narrow programme listing index
+
+Revision ID: d5e1b8c3a7f2
+Revises: c4f8a2d6e1b9
+Create Date: 2026-10-19 15:06:42.871390
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5e1b8c3a7f2'
+down_revision: Union[str, Sequence[str], None] = 'c4f8a2d6e1b9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+LISTING_INDEX_COLUMNS = ['channel_id', 'start_epoch', 'stop_epoch', 'title']
+COVERING_COLUMNS = ['channel_id', 'start_epoch', 'stop_epoch', 'start_time', 'stop_time', 'title', 'description',
+                    'categories', 'series_key', 'season', 'episode', 'added_by', 'removed_by']
+
+
+def _replace_listing_index(columns) -> None:
+    # Only SQLite has idx_programme_listing
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.drop_index('idx_programme_listing', table_name='programmes')
+    op.create_index('idx_programme_listing', 'programmes', columns, unique=False)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _replace_listing_index(LISTING_INDEX_COLUMNS)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _replace_listing_index(COVERING_COLUMNS)
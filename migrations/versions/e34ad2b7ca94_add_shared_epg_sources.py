@@ -0,0 +1,123 @@
+"""Add shared EPG sources
+
+Revision ID: e34ad2b7ca94
+Revises: 0074e29e4095
+Create Date: 2026-10-19 04:04:02.251335
+
+"""
+import datetime as dt
+import uuid
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e34ad2b7ca94'
+down_revision: Union[str, Sequence[str], None] = '0074e29e4095'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _delete_channels(connection, where: str, params: dict) -> None:
+    connection.execute(sa.text(
+        f"DELETE FROM programmes WHERE channel_id IN (SELECT id FROM channels WHERE {where})"), params)
+    connection.execute(sa.text(f"DELETE FROM channels WHERE {where}"), params)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('epg_sources',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('url', sa.String(), nullable=False),
+        sa.Column('content_hash', sa.String(length=64), nullable=True),
+        sa.Column('last_imported_at', sa.DateTime(), nullable=True),
+        sa.Column('date_created', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('url')
+    )
+    op.create_index(op.f('ix_epg_sources_id'), 'epg_sources', ['id'], unique=False)
+
+    op.create_table('epg_source_subscriptions',
+        sa.Column('user_id', sa.String(length=36), nullable=False),
+        sa.Column('server_id', sa.String(length=36), nullable=False),
+        sa.Column('source_id', sa.String(length=36), nullable=False),
+        sa.Column('date_created', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['server_id'], ['servers.id'], ),
+        sa.ForeignKeyConstraint(['source_id'], ['epg_sources.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('user_id', 'server_id')
+    )
+    op.create_index(op.f('ix_epg_source_subscriptions_source_id'), 'epg_source_subscriptions', ['source_id'],
+                    unique=False)
+
+    with op.batch_alter_table('channels') as batch_op:
+        batch_op.add_column(sa.Column('source_id', sa.String(length=36), nullable=True))
+        batch_op.alter_column('user_id', existing_type=sa.String(length=36), nullable=True)
+        batch_op.alter_column('server_id', existing_type=sa.Integer(), nullable=True)
+        batch_op.create_index(batch_op.f('ix_channels_source_id'), ['source_id'], unique=False)
+        batch_op.create_unique_constraint('uq_channel_source_xmltv', ['source_id', 'xmltv_id'])
+        batch_op.create_foreign_key('fk_channels_source_id', 'epg_sources', ['source_id'], ['id'])
+
+    # Move each user/server's guide onto a source keyed by its EPG URL. When
+    # several servers share a URL the most recently refreshed copy is kept and
+    # the others, which hold the same feed, are dropped.
+    connection = op.get_bind()
+    now = dt.datetime.now(dt.timezone.utc)
+    groups = connection.execute(sa.text(
+        "SELECT c.user_id, c.server_id, MAX(s.epg_url) AS epg_url, MAX(s.id) AS server_key "
+        "FROM channels c LEFT JOIN servers s ON s.id = CAST(c.server_id AS VARCHAR(36)) "
+        "GROUP BY c.user_id, c.server_id "
+        "ORDER BY MAX(COALESCE(c.last_seen_at, c.date_last_updated)) DESC"
+    )).all()
+
+    sources = {}
+    for user_id, server_id, epg_url, server_key in groups:
+        params = {"user_id": user_id, "server_id": server_id}
+        key = epg_url.strip() if epg_url and epg_url.strip() else f"{user_id}/{server_id}"
+        if key in sources:
+            _delete_channels(connection, "user_id = :user_id AND server_id = :server_id", params)
+        else:
+            sources[key] = str(uuid.uuid4())
+            connection.execute(sa.text(
+                "INSERT INTO epg_sources (id, url, date_created) VALUES (:id, :url, :now)"
+            ).bindparams(sa.bindparam('now', type_=sa.DateTime())), {"id": sources[key], "url": key, "now": now})
+            connection.execute(sa.text(
+                "UPDATE channels SET source_id = :source_id WHERE user_id = :user_id AND server_id = :server_id"
+            ), {**params, "source_id": sources[key]})
+
+        # Channels whose server is gone stay unsubscribed and are cleaned up by the retention job
+        if server_key is not None:
+            connection.execute(sa.text(
+                "INSERT INTO epg_source_subscriptions (user_id, server_id, source_id, date_created) "
+                "VALUES (:user_id, :server_id, :source_id, :now)"
+            ).bindparams(sa.bindparam('now', type_=sa.DateTime())),
+                {"user_id": user_id, "server_id": server_key, "source_id": sources[key], "now": now})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Hand each source's channels back to one of its subscribers, shared copies are lost
+    connection = op.get_bind()
+    connection.execute(sa.text(
+        "UPDATE channels SET "
+        "user_id = (SELECT MIN(user_id) FROM epg_source_subscriptions s WHERE s.source_id = channels.source_id), "
+        "server_id = (SELECT MIN(server_id) FROM epg_source_subscriptions s "
+        "WHERE s.source_id = channels.source_id) "
+        "WHERE source_id IS NOT NULL"
+    ))
+    _delete_channels(connection, "user_id IS NULL OR server_id IS NULL", {})
+
+    with op.batch_alter_table('channels') as batch_op:
+        batch_op.drop_constraint('fk_channels_source_id', type_='foreignkey')
+        batch_op.drop_constraint('uq_channel_source_xmltv', type_='unique')
+        batch_op.drop_index(batch_op.f('ix_channels_source_id'))
+        batch_op.alter_column('server_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.alter_column('user_id', existing_type=sa.String(length=36), nullable=False)
+        batch_op.drop_column('source_id')
+
+    op.drop_index(op.f('ix_epg_source_subscriptions_source_id'), table_name='epg_source_subscriptions')
+    op.drop_table('epg_source_subscriptions')
+    op.drop_index(op.f('ix_epg_sources_id'), table_name='epg_sources')
+    op.drop_table('epg_sources')
@@ -0,0 +1,29 @@
+"""Add db maintenance cold fields state
+
+Revision ID: e8b4c1d7f5a3
+Revises: d5e1b8c3a7f2
+Create Date: 2026-10-19 15:48:19.302657
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8b4c1d7f5a3'
+down_revision: Union[str, Sequence[str], None] = 'd5e1b8c3a7f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Left NULL, the rows may have been packed or not, convert_cold_fields checks them all once
+    op.add_column('db_maintenance', sa.Column('cold_fields_packed', sa.Boolean(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('db_maintenance', 'cold_fields_packed')
@@ -0,0 +1,35 @@
+"""Make server_id columns strings
+
+Revision ID: f91706e0621e
+Revises: e34ad2b7ca94
+Create Date: 2026-10-19 04:07:28.885355
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f91706e0621e'
+down_revision: Union[str, Sequence[str], None] = 'e34ad2b7ca94'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # servers.id is a UUID string, PostgreSQL refuses a foreign key from an integer column
+    for table in ('channels', 'epg'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column('server_id', existing_type=sa.Integer(), type_=sa.String(length=36),
+                                  postgresql_using='server_id::varchar')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in ('channels', 'epg'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column('server_id', existing_type=sa.String(length=36), type_=sa.Integer(),
+                                  postgresql_using='server_id::integer')
@@ -0,0 +1,163 @@
+"""
+Guide grid latency, hour buckets vs overlap range scan.
+
+Fills a throwaway database with a synthetic guide (half-hour programmes on
+every channel for --days days, 10k channels x 14 days by default, about 6.7M
+programmes) and its programme_buckets rows, analyses it, then renders
+--queries grids of --page channels x --hours hours at random offsets and
+times. "buckets" is the programme lookup of get_programme_grid; "overlap"
+selects the same window with start_epoch < end AND stop_epoch > start, which
+has to range-scan every programme of a channel that started before the
+window's end; "grid" is the whole of get_programme_grid, channel page
+included. Reports the median and 95th percentile per grid.
+
+    python scripts/benchmarks/epg_grid.py --channels 10000 --days 14
+"""
+import argparse
+import asyncio
+import datetime as dt
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import sqlalchemy as sa
+import sqlalchemy.orm as orm
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.database import Base, apply_sqlite_profile, engine_options  # noqa: E402
+from app.models import Channel, EPGSource, EPGSourceSubscription, Programme, Server, User  # noqa: E402
+from app.models.programme_bucket import bucket_range, programme_buckets  # noqa: E402
+from app.services.data.epg_data_services import (  # noqa: E402
+    LISTING_COLUMNS,
+    _grid_programmes,
+    get_programme_grid,
+)
+from app.services.db_maintenance import run_db_maintenance  # noqa: E402
+from app.utils.bulk_load import bulk_insert  # noqa: E402
+
+START = dt.datetime(2024, 1, 1, tzinfo=dt.timezone.utc)
+SLOT = 30 * 60
+PROGRAMME_COLUMNS = ('channel_id', 'start_time', 'stop_time', 'start_epoch', 'stop_epoch', 'title', 'description',
+                     'clumpidx', 'new', 'date_created', 'date_last_updated')
+
+
+def _xmltv(epoch):
+    return dt.datetime.fromtimestamp(epoch, dt.timezone.utc).strftime("%Y%m%d%H%M%S +0000")
+
+
+def _fill(db, source_id, channels, days):
+    for first in range(0, channels, 1000):
+        db.add_all([Channel(source_id=source_id, xmltv_id=f"channel.{i}")
+                    for i in range(first, min(first + 1000, channels))])
+        db.flush()
+    channel_ids = db.execute(sa.select(Channel.id).order_by(Channel.id)).scalars().all()
+
+    now = dt.datetime.now(dt.timezone.utc)
+    start = int(START.timestamp())
+    slots = days * 24 * 3600 // SLOT
+    # The database is new, so programme ids count up from 1
+    programme_id = 0
+    for channel_id in channel_ids:
+        rows = []
+        buckets = []
+        for slot in range(slots):
+            begin = start + slot * SLOT
+            programme_id += 1
+            rows.append((channel_id, _xmltv(begin), _xmltv(begin + SLOT), begin, begin + SLOT,
+                         f"Programme {slot}", "x" * 200, "0/1", False, now, now))
+            buckets.extend((channel_id, bucket, programme_id) for bucket in bucket_range(begin, begin + SLOT))
+        bulk_insert(db, Programme.__table__, PROGRAMME_COLUMNS, rows)
+        bulk_insert(db, programme_buckets, ('channel_id', 'bucket', 'programme_id'), buckets)
+        if channel_id % 500 == 0:
+            db.commit()
+    db.commit()
+    return len(channel_ids) * slots
+
+
+def _overlap(db, channel_ids, start, end):
+    return db.query(*LISTING_COLUMNS).filter(
+        Programme.channel_id.in_(channel_ids),
+        Programme.start_epoch < end,
+        Programme.stop_epoch > start
+    ).order_by(Programme.channel_id, Programme.start_epoch).all()
+
+
+def _report(label, timings):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1] if len(timings) >= 20 else timings[-1]
+    print(f"{label:<8} median {statistics.median(timings) * 1000:8.2f}ms  p95 {p95 * 1000:8.2f}ms")
+
+
+def run(url, channels, days, page, hours, queries):
+    engine = sa.create_engine(url, **engine_options(url))
+    if engine.dialect.name == "sqlite":
+        sa.event.listen(engine, "connect", apply_sqlite_profile)
+    Base.metadata.create_all(engine)
+    db = orm.sessionmaker(bind=engine)()
+    try:
+        user = User(email="bench@example.com", hashed_password="x")
+        source = EPGSource(url="http://example.com/bench.xml")
+        db.add_all([user, source])
+        db.flush()
+        server = Server(owner_id=user.id, name="bench", url="http://example.com")
+        db.add(server)
+        db.flush()
+        db.add(EPGSourceSubscription(user_id=user.id, server_id=server.id, source_id=source.id))
+        db.commit()
+
+        started = time.perf_counter()
+        total = _fill(db, source.id, channels, days)
+        print(f"{engine.dialect.name}: {total} programmes on {channels} channels loaded in "
+              f"{time.perf_counter() - started:.0f}s")
+        asyncio.run(run_db_maintenance(db, force=True))
+
+        channel_ids = db.execute(sa.select(Channel.id).order_by(Channel.id)).scalars().all()
+        random.seed(0)
+        timings = {"buckets": [], "overlap": [], "grid": []}
+        for _ in range(queries):
+            offset = random.randrange(max(1, channels - page))
+            start = int(START.timestamp()) + random.randrange((days * 24 - hours) * 3600)
+            end = start + hours * 3600
+            page_ids = channel_ids[offset:offset + page]
+
+            for label, lookup in (
+                ("buckets", lambda: _grid_programmes(page_ids, start, end, db)),
+                ("overlap", lambda: _overlap(db, page_ids, start, end)),
+                ("grid", lambda: asyncio.run(get_programme_grid(user.id, server.id, db, start=start, hours=hours,
+                                                                limit=page, offset=offset))),
+            ):
+                began = time.perf_counter()
+                lookup()
+                timings[label].append(time.perf_counter() - began)
+
+        print(f"{queries} grids of {page} channels x {hours}h:")
+        for label, values in timings.items():
+            _report(label, values)
+    finally:
+        db.close()
+        if engine.dialect.name != "sqlite":
+            Base.metadata.drop_all(engine)
+        engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", action="append", dest="urls", help="may be given more than once")
+    parser.add_argument("--channels", type=int, default=10000)
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--page", type=int, default=200, help="channels per grid")
+    parser.add_argument("--hours", type=int, default=4, help="length of a grid window")
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for url in args.urls or [f"sqlite:///{os.path.join(tmp, 'bench.db')}"]:
+            run(url, args.channels, args.days, args.page, args.hours, args.queries)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+EPG load throughput per database backend.
+
+Stores a synthetic feed with store_epg_stream, then stores it again with
+every title changed, and reports programmes per second for both loads. Each
+--database-url is benchmarked in turn; the default is a throwaway SQLite file.
+Server databases must be empty, the schema is created and dropped again.
+
+    python scripts/benchmarks/epg_load.py --programmes 200000 \\
+        --database-url sqlite:///bench.db \\
+        --database-url postgresql+psycopg://xtreamium@localhost/xtreamium_bench
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import sqlalchemy as sa
+import sqlalchemy.orm as orm
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.database import Base, apply_sqlite_profile, engine_options  # noqa: E402
+from app.models import Server, User  # noqa: E402
+from app.services.data.epg_data_services import store_epg_stream  # noqa: E402
+from app.utils.bulk_load import supports_copy  # noqa: E402
+from app.utils.iptv_parser_ng import Batch, Channel, Programme  # noqa: E402
+
+
+def _feed(channels, per_channel, title):
+    yield Batch(channels=[Channel(id=f"channel.{i}", display_names=[{"text": f"Channel {i}"}])
+                          for i in range(channels)])
+    for i in range(channels):
+        yield Batch(programmes=[
+            Programme(
+                channel=f"channel.{i}",
+                start=f"202401{1 + n // 48:02d}{(n % 48) // 2:02d}{30 * (n % 2):02d}00 +0000",
+                stop=f"202401{1 + n // 48:02d}{(n % 48) // 2:02d}{30 * (n % 2) + 29:02d}00 +0000",
+                titles=[{"text": f"{title} {n}", "lang": "en"}],
+                descriptions=[{"text": "x" * 200, "lang": "en"}],
+            )
+            for n in range(per_channel)
+        ])
+
+
+def run(url, channels, per_channel):
+    engine = sa.create_engine(url, **engine_options(url))
+    if engine.dialect.name == "sqlite":
+        sa.event.listen(engine, "connect", apply_sqlite_profile)
+    Base.metadata.create_all(engine)
+    db = orm.sessionmaker(bind=engine)()
+    try:
+        user = User(email="bench@example.com", hashed_password="x")
+        db.add(user)
+        db.flush()
+        server = Server(owner_id=user.id, name="bench", url="http://example.com")
+        db.add(server)
+        db.commit()
+
+        label = f"{engine.dialect.name}{' (COPY)' if supports_copy(db) else ''}"
+        total = channels * per_channel
+        for load, title in (("initial", "Programme"), ("reload", "Renamed")):
+            started = time.perf_counter()
+            asyncio.run(store_epg_stream(_feed(channels, per_channel, title), user.id, server.id, db))
+            seconds = time.perf_counter() - started
+            print(f"{label:<18} {load:<8} {total:8d} programmes  {seconds:7.2f}s  {total / seconds:10.0f}/s")
+    finally:
+        db.close()
+        if engine.dialect.name != "sqlite":
+            Base.metadata.drop_all(engine)
+        engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", action="append", dest="urls", help="may be given more than once")
+    parser.add_argument("--channels", type=int, default=200)
+    parser.add_argument("--programmes", type=int, default=200000, help="total programmes in the feed")
+    args = parser.parse_args()
+
+    per_channel = max(1, args.programmes // args.channels)
+    with tempfile.TemporaryDirectory() as tmp:
+        for url in args.urls or [f"sqlite:///{os.path.join(tmp, 'bench.db')}"]:
+            run(url, args.channels, per_channel)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Programme staging throughput, dict/json.dumps path vs tuple/orjson path.
+
+Prepares every programme of a synthetic feed and writes it to the staging
+table on a throwaway SQLite database, chunk by chunk like store_epg_stream.
+"before" is the previous code path: json.dumps for every field, a per-column
+hash update and an INSERT with one parameter dict per row. "after" is the
+current one: orjson (when installed), pre-built tuples and a single
+compiled executemany. Reports rows/sec for preparing, inserting and overall.
+
+    python scripts/benchmarks/programme_store.py --programmes 1000000
+"""
+import argparse
+import datetime as dt
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+import sqlalchemy as sa
+import sqlalchemy.orm as orm
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.database import Base, apply_sqlite_profile  # noqa: E402
+from app.models.epg_import import epg_import_programmes  # noqa: E402
+from app.services.config import settings  # noqa: E402
+from app.services.data.epg_data_services import (  # noqa: E402
+    PROGRAMME_CONTENT_COLUMNS,
+    PROGRAMME_JSON_FIELDS,
+    STAGED_PROGRAMME_COLUMNS,
+    _prepare_programme_data,
+    _staged_programme_row,
+)
+from app.utils import json_codec  # noqa: E402
+from app.utils.bulk_load import bulk_insert  # noqa: E402
+from app.utils.iptv_parser_ng import Programme  # noqa: E402
+
+
+def _programmes(count):
+    for n in range(count):
+        day, slot = divmod(n % (28 * 48), 48)
+        start = f"202402{1 + day:02d}{slot // 2:02d}{30 * (slot % 2):02d}00 +0100"
+        yield Programme(
+            channel=f"channel.{n // (28 * 48)}",
+            start=start,
+            stop=start,
+            titles=[{"text": f"Programme {n}", "lang": "en"}],
+            sub_titles=[{"text": "Episode title", "lang": "en"}],
+            descriptions=[{"text": "A fairly typical programme synopsis. " * 5, "lang": "en"}],
+            categories=[{"text": "Drama", "lang": "en"}, {"text": "Series", "lang": "en"}],
+            credits={"actor": [{"name": "Some Actor", "role": "Lead"}], "director": [{"name": "Some Director"}]},
+            episode_nums=[{"system": "xmltv_ns", "text": f"1.{n % 20}.0/1"}],
+            video={"aspect": "16:9", "quality": "HDTV"},
+        )
+
+
+def _before_prepare(xmltv_programme, channel_id):
+    def safe_json_dumps(data):
+        return json.dumps(data) if data is not None else None
+
+    def epoch(value):
+        digits, offset = value.split()
+        naive = dt.datetime.strptime(digits, "%Y%m%d%H%M%S")
+        sign = -1 if offset[0] == '-' else 1
+        shift = sign * dt.timedelta(hours=int(offset[1:3]), minutes=int(offset[3:5]))
+        return int((naive - shift).replace(tzinfo=dt.timezone.utc).timestamp())
+
+    data = {
+        'channel_id': channel_id,
+        'start_time': xmltv_programme.start,
+        'stop_time': xmltv_programme.stop,
+        'start_epoch': epoch(xmltv_programme.start),
+        'stop_epoch': epoch(xmltv_programme.stop),
+        'pdc_start': xmltv_programme.pdc_start,
+        'vps_start': xmltv_programme.vps_start,
+        'showview': xmltv_programme.showview,
+        'videoplus': xmltv_programme.videoplus,
+        'clumpidx': xmltv_programme.clumpidx,
+        'date': xmltv_programme.date,
+        'new': xmltv_programme.new,
+        'date_created': dt.datetime.now(dt.timezone.utc),
+        'date_last_updated': dt.datetime.now(dt.timezone.utc),
+    }
+    for field in PROGRAMME_JSON_FIELDS:
+        data[field] = safe_json_dumps(getattr(xmltv_programme, field))
+    digest = hashlib.sha1()
+    for column in PROGRAMME_CONTENT_COLUMNS:
+        value = data.get(column)
+        digest.update(b'\x00' if value is None else str(value).encode('utf-8'))
+        digest.update(b'\x1f')
+    data['content_hash'] = digest.hexdigest()
+    data['packed_fields'] = None
+    return data
+
+
+def _before(db, chunk):
+    started = time.perf_counter()
+    rows = []
+    for programme in chunk:
+        data = _before_prepare(programme, 1)
+        data.update(import_id="bench", action="insert", programme_id=None)
+        rows.append(data)
+    prepared = time.perf_counter()
+    db.execute(epg_import_programmes.insert(), rows)
+    return prepared - started, time.perf_counter() - prepared
+
+
+def _after(db, chunk):
+    started = time.perf_counter()
+    now = dt.datetime.now(dt.timezone.utc)
+    rows = []
+    for programme in chunk:
+        data = _prepare_programme_data(programme, 1, now)
+        data.update(import_id="bench", action="insert", programme_id=None)
+        rows.append(_staged_programme_row(data))
+    prepared = time.perf_counter()
+    bulk_insert(db, epg_import_programmes, STAGED_PROGRAMME_COLUMNS, rows)
+    return prepared - started, time.perf_counter() - prepared
+
+
+def run(label, store, count, chunk_size):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = sa.create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        sa.event.listen(engine, "connect", apply_sqlite_profile)
+        Base.metadata.create_all(engine, tables=[epg_import_programmes])
+        db = orm.sessionmaker(bind=engine)()
+
+        prepare_seconds = insert_seconds = 0.0
+        chunk = []
+        for programme in _programmes(count):
+            chunk.append(programme)
+            if len(chunk) == chunk_size:
+                prepare, insert = store(db, chunk)
+                prepare_seconds, insert_seconds = prepare_seconds + prepare, insert_seconds + insert
+                db.commit()
+                chunk = []
+        if chunk:
+            prepare, insert = store(db, chunk)
+            prepare_seconds, insert_seconds = prepare_seconds + prepare, insert_seconds + insert
+            db.commit()
+        db.close()
+        engine.dispose()
+
+    total = prepare_seconds + insert_seconds
+    print(f"{label:<7} prepare {count / prepare_seconds:9.0f} rows/s  insert {count / insert_seconds:9.0f} rows/s  "
+          f"overall {count / total:9.0f} rows/s  ({total:6.2f}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--programmes", type=int, default=1000000)
+    parser.add_argument("--chunk-size", type=int, default=settings.EPG_STORE_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    print(f"JSON encoder: {'orjson' if json_codec.orjson is not None else 'json'}")
+    run("before", _before, args.programmes, args.chunk_size)
+    run("after", _after, args.programmes, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
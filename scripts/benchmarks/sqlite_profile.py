@@ -0,0 +1,117 @@
+"""
+Read latency while a refresh is writing, with and without the SQLite profile.
+
+Seeds a throwaway database, then runs a long refresh-style write transaction
+(delete and re-insert every programme) in one thread while another thread
+keeps issuing channel listing queries. Reports reader latency percentiles and
+"database is locked" errors for SQLite defaults vs the configured profile.
+
+    python scripts/benchmarks/sqlite_profile.py --programmes 200000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import sqlalchemy as sa
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.database import Base, apply_sqlite_profile  # noqa: E402
+from app.models import Channel, Programme  # noqa: E402
+
+
+def _programme_rows(channel_ids, per_channel):
+    for channel_id in channel_ids:
+        for i in range(per_channel):
+            start = f"202401{1 + i // 48:02d}{(i % 48) // 2:02d}{30 * (i % 2):02d}00 +0000"
+            yield {
+                "channel_id": channel_id,
+                "start_time": start,
+                "stop_time": start,
+                "titles": '[{"text": "Programme %d", "lang": "en"}]' % i,
+                "descriptions": '[{"text": "%s", "lang": "en"}]' % ("x" * 200),
+            }
+
+
+def _seed(engine, channels, per_channel):
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(sa.insert(Channel.__table__), [
+            {"user_id": "bench", "server_id": 1, "xmltv_id": f"channel.{i}"} for i in range(channels)
+        ])
+        channel_ids = [row[0] for row in connection.execute(sa.select(Channel.id))]
+        connection.execute(sa.insert(Programme.__table__), list(_programme_rows(channel_ids, per_channel)))
+    return channel_ids
+
+
+def _refresh(engine, channel_ids, per_channel, done):
+    started = time.perf_counter()
+    try:
+        with engine.begin() as connection:
+            connection.execute(sa.delete(Programme.__table__))
+            rows = list(_programme_rows(channel_ids, per_channel))
+            for i in range(0, len(rows), 5000):
+                connection.execute(sa.insert(Programme.__table__), rows[i:i + 5000])
+    finally:
+        done.set()
+    return time.perf_counter() - started
+
+
+def _read_loop(engine, channel_ids, done, latencies, errors):
+    query = sa.select(Programme.start_time, Programme.titles).where(
+        Programme.channel_id == sa.bindparam("channel_id")).order_by(Programme.start_time)
+    while not done.is_set():
+        started = time.perf_counter()
+        try:
+            with engine.connect() as connection:
+                connection.execute(query, {"channel_id": random.choice(channel_ids)}).fetchall()
+            latencies.append(time.perf_counter() - started)
+        except sa.exc.OperationalError:
+            errors.append(time.perf_counter() - started)
+
+
+def run(label, profile, channels, per_channel):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = sa.create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                                  connect_args={"check_same_thread": False, "timeout": 5})
+        if profile:
+            sa.event.listen(engine, "connect", apply_sqlite_profile)
+        channel_ids = _seed(engine, channels, per_channel)
+
+        done = threading.Event()
+        latencies, errors = [], []
+        reader = threading.Thread(target=_read_loop, args=(engine, channel_ids, done, latencies, errors))
+        reader.start()
+        time.sleep(0.2)
+        refresh_seconds = _refresh(engine, channel_ids, per_channel, done)
+        reader.join()
+        engine.dispose()
+
+    if latencies:
+        quantiles = statistics.quantiles(latencies, n=100)
+        p50, p95, p99 = quantiles[49] * 1000, quantiles[94] * 1000, quantiles[98] * 1000
+    else:
+        p50 = p95 = p99 = float("nan")
+    print(f"{label:<10} refresh {refresh_seconds:6.2f}s  reads {len(latencies):6d}  "
+          f"p50 {p50:8.2f}ms  p95 {p95:8.2f}ms  p99 {p99:8.2f}ms  "
+          f"max {max(latencies, default=0) * 1000:8.2f}ms  locked errors {len(errors)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--channels", type=int, default=200)
+    parser.add_argument("--programmes", type=int, default=200000, help="total programmes in the feed")
+    args = parser.parse_args()
+
+    per_channel = max(1, args.programmes // args.channels)
+    run("defaults", False, args.channels, per_channel)
+    run("profile", True, args.channels, per_channel)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,16 +2,20 @@ import asyncio
 import os
 import tempfile
 from typing import AsyncGenerator
+from unittest.mock import patch
 
 import pytest
 import pytest_asyncio
 from fastapi.testclient import TestClient
 from httpx import AsyncClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 
-from app.database import Base
+from app import database
+from app.database import Base, apply_sqlite_profile, engine_options
 from app.main import app
+from app.services import read_routing
+from app.services.config import settings
 from app.services.db_factory import get_db
 
 
@@ -26,25 +30,47 @@ def event_loop():
 
 @pytest.fixture
 def temp_db():
-    """Create a temporary database for testing."""
+    """Create a temporary database for testing, or use TEST_DATABASE_URL (e.g. a local PostgreSQL)."""
+    if os.environ.get("TEST_DATABASE_URL"):
+        yield os.environ["TEST_DATABASE_URL"]
+        return
+
     with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as f:
         temp_path = f.name
     yield f"sqlite:///{temp_path}"
-    try:
-        os.unlink(temp_path)
-    except OSError:
-        pass
+    for path in (temp_path, f"{temp_path}-wal", f"{temp_path}-shm"):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
 
 
 @pytest.fixture
 def test_engine(temp_db):
     """Create a test database engine."""
-    engine = create_engine(
-        temp_db,
-        connect_args={"check_same_thread": False}
-    )
+    engine = create_engine(temp_db, **engine_options(temp_db))
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", apply_sqlite_profile)
     Base.metadata.create_all(bind=engine)
-    return engine
+    yield engine
+    if engine.dialect.name != "sqlite":
+        # The database outlives the test, start the next one from an empty schema
+        Base.metadata.drop_all(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def sqlite_only(test_engine):
+    """Skip tests of SQLite specific behaviour when running against another backend."""
+    if test_engine.dialect.name != "sqlite":
+        pytest.skip("SQLite only")
+
+
+@pytest.fixture
+def primary(test_engine):
+    """Make test_engine the application's database, for code opening connections of its own like the EPG shards."""
+    with patch.object(database, 'engine', test_engine), patch.object(database, 'read_engine', test_engine):
+        yield test_engine
 
 
 @pytest.fixture
@@ -60,6 +86,20 @@ def test_session(test_engine):
         session.close()
 
 
+@pytest.fixture
+def replica(tmp_path, sqlite_only):
+    """Serve read-only endpoints from a second SQLite database standing in for a read replica."""
+    engine = database.create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    Base.metadata.create_all(bind=engine)
+    with patch.object(database, 'read_engine', engine), \
+            patch.object(database, 'ReadSessionLocal', sessionmaker(autoflush=False, bind=engine)), \
+            patch.object(settings, 'REDIS_URL', None), \
+            patch.dict(read_routing._last_writes, clear=True), \
+            patch.dict(read_routing._lags, clear=True):
+        yield engine
+    engine.dispose()
+
+
 @pytest.fixture
 def override_get_db(test_session):
     """Override the get_db dependency for testing."""
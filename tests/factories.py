@@ -1,4 +1,5 @@
 import factory
+import json
 import uuid
 from datetime import datetime, timezone
 from factory import Faker
@@ -8,7 +9,7 @@ from app.models.user import User
 from app.models.server import Server
 from app.models.channel import Channel
 from app.models.epg import EPG
-from app.models.programme import Programme
+from app.models.programme import Programme, display_columns
 
 
 class UserFactory(factory.alchemy.SQLAlchemyModelFactory):
@@ -63,6 +64,11 @@ class EPGFactory(factory.alchemy.SQLAlchemyModelFactory):
     server = factory.SubFactory(ServerFactory)
 
 
+def _display(programme):
+    fields = (getattr(programme, name, None) for name in ('titles', 'descriptions', 'categories'))
+    return display_columns(*(json.loads(value) if value else None for value in fields))
+
+
 class ProgrammeFactory(factory.alchemy.SQLAlchemyModelFactory):
     class Meta:
         model = Programme
@@ -74,6 +80,11 @@ class ProgrammeFactory(factory.alchemy.SQLAlchemyModelFactory):
     descriptions = factory.LazyFunction(lambda: '[{"text": "Test description"}]')  # JSON
     channel = factory.SubFactory(ChannelFactory)
 
+    # Derived from the JSON fields, as the import does
+    title = factory.LazyAttribute(lambda o: _display(o)['title'])
+    description = factory.LazyAttribute(lambda o: _display(o)['description'])
+    category_text = factory.LazyAttribute(lambda o: _display(o)['category_text'])
+
 
 def create_test_user(db_session: Session, **kwargs) -> User:
     """Create a test user with optional overrides."""
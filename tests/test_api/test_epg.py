@@ -1,6 +1,16 @@
+import asyncio
+from unittest.mock import patch
+
 import pytest
 from fastapi import status
 from datetime import datetime, timezone
+from app.models.epg_source import EPGSource, EPGSourceSubscription
+from app.services.cache_manager import get_server_cache_dir, mark_used
+from app.services.config import settings
+from app.services.data.epg_data_services import store_epg_stream
+from app.services.data.user_data_services import get_current_user
+from app.services.epg_shards import dispose_shards, epg_session
+from app.utils.iptv_parser_ng import Batch as XMLTVBatch, Channel as XMLTVChannel, Programme as XMLTVProgramme
 from tests.factories import create_test_user, create_test_server, create_test_epg, create_test_programme, create_test_channel
 
 
@@ -45,6 +55,27 @@ class TestEPGAPI:
         assert response.status_code == status.HTTP_401_UNAUTHORIZED
 
 
+class TestEPGCacheAPI:
+    """Test cases for the EPG cache usage endpoint."""
+
+    @pytest.mark.epg
+    def test_cache_usage_lists_only_own_servers(self, client, test_app, test_session, tmp_path, monkeypatch):
+        """Test users only see the cached feeds of their own servers."""
+        monkeypatch.setenv("CACHE_PATH", str(tmp_path))
+        user = create_test_user(test_session)
+        other = create_test_user(test_session)
+        test_session.commit()
+        for owner in (user, other):
+            mark_used(get_server_cache_dir(owner.id, f"{owner.id}-server"))
+        test_app.dependency_overrides[get_current_user] = lambda: user
+
+        response = client.get("/api/v1/epg/cache")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [entry["user_id"] for entry in response.json()["entries"]] == [user.id]
+        assert str(tmp_path) not in response.text
+
+
 class TestEPGModels:
     """Test cases for EPG and Programme models."""
 
@@ -115,3 +146,187 @@ class TestEPGModels:
         ratings_data = programme.get_json_field('ratings')
         assert ratings_data[0]["system"] == "MPAA"
         assert ratings_data[0]["value"] == "PG-13"
+
+
+class TestEPGSearchAPI:
+    """Test cases for the EPG search endpoint."""
+
+    @pytest.mark.epg
+    def test_search_requires_authentication(self, client):
+        """Test searching without a token is rejected."""
+        response = client.get("/api/v1/epg/search", params={"q": "news"})
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    @pytest.mark.epg
+    def test_search_returns_programmes_with_channel(self, client, test_app, test_session):
+        """Test matches come back paginated with their channel."""
+        user = create_test_user(test_session)
+        test_session.commit()
+        server = create_test_server(test_session, owner=user)
+        test_session.commit()
+        channel = create_test_channel(test_session, user=None, server=None, source=EPGSource(url="search-api"),
+                                      display_names='[{"text": "BBC One"}]')
+        test_session.add(EPGSourceSubscription(user_id=user.id, server_id=server.id, source=channel.source))
+        for hour in (20, 21):
+            create_test_programme(test_session, channel=channel, start_time=f"20991001{hour}0000 +0000",
+                                  stop_time=f"20991001{hour}5900 +0000", start_epoch=4094654400 + hour * 3600,
+                                  stop_epoch=4094654400 + hour * 3600 + 3540, titles='[{"text": "Evening News"}]')
+        test_session.commit()
+        test_app.dependency_overrides[get_current_user] = lambda: user
+
+        response = client.get("/api/v1/epg/search", params={"q": "news", "limit": 1})
+
+        assert response.status_code == status.HTTP_200_OK
+        body = response.json()
+        assert body["total"] == 2
+        assert body["limit"] == 1
+        assert body["results"] == [{
+            "start": "20991001200000 +0000",
+            "stop": "20991001205900 +0000",
+            "title": "Evening News",
+            "description": "Test description",
+            "categories": [],
+            "series_key": None,
+            "season": None,
+            "episode": None,
+            "channel": {"id": channel.xmltv_id, "name": "BBC One", "icon": "http://example.com/icon.png"},
+        }]
+
+
+class TestEPGCategoryAPI:
+    """Test cases for browsing programmes by category."""
+
+    @pytest.mark.epg
+    def test_category_requires_authentication(self, client):
+        """Test category browsing is only available to logged in users."""
+        response = client.get("/api/v1/epg/category/some-server/Sports")
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    @pytest.mark.epg
+    def test_category_lists_current_programmes(self, client, test_app, test_session):
+        """Test the categories of a server and the programmes on now in one of them."""
+        user = create_test_user(test_session)
+        test_session.commit()
+        server = create_test_server(test_session, owner=user)
+        test_session.commit()
+        test_app.dependency_overrides[get_current_user] = lambda: user
+
+        now = int(datetime.now(timezone.utc).timestamp())
+        feed = iter([XMLTVBatch(channels=[XMLTVChannel(id="sport.channel", display_names=[{"text": "Sport 1"}])],
+                                programmes=[XMLTVProgramme(
+                                    start=datetime.fromtimestamp(now - 600, timezone.utc).strftime("%Y%m%d%H%M%S +0000"),
+                                    stop=datetime.fromtimestamp(now + 600, timezone.utc).strftime("%Y%m%d%H%M%S +0000"),
+                                    channel="sport.channel", titles=[{"text": "Match of the Day"}],
+                                    categories=[{"lang": "en", "text": "Sports"}])])])
+        asyncio.run(store_epg_stream(feed, user.id, server.id, test_session))
+
+        response = client.get(f"/api/v1/epg/category/{server.id}")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == [{"name": "Sports", "programmes": 1}]
+
+        response = client.get(f"/api/v1/epg/category/{server.id}/sports", params={"hours": 1})
+        assert response.status_code == status.HTTP_200_OK
+        body = response.json()
+        assert body["total"] == 1
+        assert body["results"][0]["title"] == "Match of the Day"
+        assert body["results"][0]["categories"] == [{"lang": "en", "text": "Sports"}]
+        assert body["results"][0]["channel"] == {"id": "sport.channel", "name": "Sport 1", "icon": None}
+
+
+class TestEPGGridAPI:
+    """Test cases for the guide grid."""
+
+    @pytest.mark.epg
+    def test_grid_requires_authentication(self, client):
+        """Test the grid is only available to logged in users."""
+        response = client.get("/api/v1/epg/grid/some-server")
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    @pytest.mark.epg
+    def test_grid_lists_programmes_per_channel(self, client, test_app, test_session):
+        """Test each channel of the page comes back with the programmes overlapping the window."""
+        user = create_test_user(test_session)
+        test_session.commit()
+        server = create_test_server(test_session, owner=user)
+        test_session.commit()
+        test_app.dependency_overrides[get_current_user] = lambda: user
+
+        feed = iter([XMLTVBatch(channels=[XMLTVChannel(id="grid.channel", display_names=[{"text": "Grid 1"}]),
+                                          XMLTVChannel(id="empty.channel")],
+                                programmes=[XMLTVProgramme(start="20231001100000 +0000", stop="20231001110000 +0000",
+                                                           channel="grid.channel", titles=[{"text": "Morning"}])])])
+        asyncio.run(store_epg_stream(feed, user.id, server.id, test_session))
+
+        start = int(datetime(2023, 10, 1, 9, 0, tzinfo=timezone.utc).timestamp())
+        response = client.get(f"/api/v1/epg/grid/{server.id}", params={"start": start, "hours": 2})
+        assert response.status_code == status.HTTP_200_OK
+        body = response.json()
+        assert body["total"] == 2
+        assert [result["channel"]["id"] for result in body["results"]] == ["grid.channel", "empty.channel"]
+        assert body["results"][0]["channel"]["name"] == "Grid 1"
+        assert [programme["title"] for programme in body["results"][0]["programmes"]] == ["Morning"]
+        assert body["results"][1]["programmes"] == []
+
+        response = client.get(f"/api/v1/epg/grid/{server.id}", params={"start": start, "hours": 25})
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    @pytest.mark.epg
+    def test_grid_reads_the_users_shard(self, client, test_app, test_session, sqlite_only, primary, tmp_path):
+        """Test with EPG_SHARDS set the grid is read from the shard holding the user's guide."""
+        with patch.object(settings, 'EPG_SHARDS', {"a": f"sqlite:///{tmp_path / 'epg-a.db'}"}):
+            user = create_test_user(test_session)
+            server = create_test_server(test_session, owner=user)
+            test_session.commit()
+            test_app.dependency_overrides[get_current_user] = lambda: user
+
+            feed = iter([XMLTVBatch(channels=[XMLTVChannel(id="shard.channel")], programmes=[
+                XMLTVProgramme(start="20231001100000 +0000", stop="20231001110000 +0000", channel="shard.channel")
+            ])])
+            with epg_session(user.id, test_session) as epg_db:
+                asyncio.run(store_epg_stream(feed, user.id, server.id, epg_db))
+
+            start = int(datetime(2023, 10, 1, 9, 0, tzinfo=timezone.utc).timestamp())
+            response = client.get(f"/api/v1/epg/grid/{server.id}", params={"start": start, "hours": 2})
+            dispose_shards()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [result["channel"]["id"] for result in response.json()["results"]] == ["shard.channel"]
+
+
+class TestEPGPeopleAPI:
+    """Test cases for finding programmes by cast and crew."""
+
+    @pytest.mark.epg
+    def test_people_requires_a_name(self, client, test_app, test_session):
+        """Test a name prefix of at least two characters is required."""
+        user = create_test_user(test_session)
+        test_session.commit()
+        test_app.dependency_overrides[get_current_user] = lambda: user
+
+        response = client.get("/api/v1/epg/people/some-server", params={"name": "m"})
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    @pytest.mark.epg
+    def test_people_lists_upcoming_programmes(self, client, test_app, test_session):
+        """Test matching credits come back with the person and their role."""
+        user = create_test_user(test_session)
+        test_session.commit()
+        server = create_test_server(test_session, owner=user)
+        test_session.commit()
+        test_app.dependency_overrides[get_current_user] = lambda: user
+
+        start = datetime.fromtimestamp(datetime.now(timezone.utc).timestamp() + 3600, timezone.utc)
+        feed = iter([XMLTVBatch(channels=[XMLTVChannel(id="film.channel")], programmes=[XMLTVProgramme(
+            start=start.strftime("%Y%m%d%H%M%S +0000"), channel="film.channel", titles=[{"text": "Alien"}],
+            credits={"director": [{"name": "Ridley Scott"}], "actor": [{"name": "Sigourney Weaver", "role": "Ripley"}]}
+        )])])
+        asyncio.run(store_epg_stream(feed, user.id, server.id, test_session))
+
+        response = client.get(f"/api/v1/epg/people/{server.id}", params={"name": "sigourney"})
+
+        assert response.status_code == status.HTTP_200_OK
+        body = response.json()
+        assert body["total"] == 1
+        assert body["results"][0]["title"] == "Alien"
+        assert body["results"][0]["person"] == {"name": "Sigourney Weaver", "role": "actor", "character": "Ripley"}
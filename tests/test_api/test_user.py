@@ -1,6 +1,19 @@
+import asyncio
+
 import pytest
 from fastapi import status
-from tests.factories import create_test_user
+from sqlalchemy.orm import Session
+
+from app.models.channel import Channel
+from app.models.epg_source import EPGSource, EPGSourceSubscription
+from app.models.programme import Programme
+from app.models.refresh_schedule import RefreshSchedule
+from app.models.server import Server
+from app.models.user import User
+from app.services.data.epg_data_services import store_epg_stream
+from app.services.data.user_data_services import create_token
+from app.utils.iptv_parser_ng import Batch as XMLTVBatch, Channel as XMLTVChannel, Programme as XMLTVProgramme
+from tests.factories import create_test_server, create_test_user
 
 
 class TestUserAPI:
@@ -83,3 +96,60 @@ class TestUserAPI:
 
         # Accept 404 if endpoint doesn't exist yet, or 401 if auth required
         assert response.status_code in [401, 404, 422]
+
+
+class TestServerAPI:
+    """Test cases for the server endpoints."""
+
+    @pytest.mark.auth
+    def test_delete_server_drops_its_epg(self, client, test_session):
+        """Test deleting a server drops its refresh schedule, its subscription and the guide nobody else uses."""
+        user = create_test_user(test_session)
+        server = create_test_server(test_session, owner=user)
+        test_session.commit()
+        asyncio.run(store_epg_stream(iter([XMLTVBatch(channels=[XMLTVChannel(id="deleted.channel")], programmes=[
+            XMLTVProgramme(start="20231001100000 +0000", channel="deleted.channel")
+        ])]), user.id, server.id, test_session))
+        test_session.add(RefreshSchedule(server_id=server.id, user_id=user.id))
+        test_session.commit()
+
+        response = client.delete(f"/api/v1/user/server/{server.id}")
+
+        assert response.status_code == status.HTTP_200_OK
+        test_session.expire_all()
+        assert test_session.query(Server).count() == 0
+        assert test_session.query(RefreshSchedule).count() == 0
+        assert test_session.query(EPGSourceSubscription).count() == 0
+        assert test_session.query(EPGSource).count() == 0
+        assert test_session.query(Channel).count() == 0
+        assert test_session.query(Programme).count() == 0
+
+
+class TestReadReplicaAPI:
+    """Test cases for serving read-only endpoints from a read replica."""
+
+    @pytest.mark.auth
+    def test_servers_read_from_replica_until_user_writes(self, client, test_session, replica):
+        """Test server listings come from the replica, and from the primary right after the user adds one."""
+        user = create_test_user(test_session, email="replica@example.com")
+        test_session.commit()
+        with Session(replica) as replica_session:
+            replica_session.add(User(id=user.id, email=user.email, hashed_password=user.hashed_password))
+            replica_session.add(Server(name="On the replica", url="http://replica", username="u", password="p",
+                                       epg_url="http://replica/epg.xml", owner_id=user.id))
+            replica_session.commit()
+        token = asyncio.run(create_token(user))["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        response = client.get("/api/v1/user/servers", headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert [server["name"] for server in response.json()] == ["On the replica"]
+
+        response = client.post("/api/v1/user/server", headers=headers, json={
+            "name": "On the primary", "url": "http://primary", "username": "u", "password": "p",
+            "epg_url": "http://primary/epg.xml"
+        })
+        assert response.status_code == status.HTTP_200_OK
+
+        response = client.get("/api/v1/user/servers", headers=headers)
+        assert [server["name"] for server in response.json()] == ["On the primary"]
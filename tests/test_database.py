@@ -0,0 +1,69 @@
+import pytest
+from sqlalchemy import text
+from unittest.mock import patch
+
+from app.database import MIN_SQLITE_VERSION, check_sqlite_version, engine_options, sqlite_profile_pragmas
+from app.services.config import settings
+
+
+class TestSQLiteProfile:
+    """Test cases for the SQLite performance profile."""
+
+    @pytest.mark.unit
+    @pytest.mark.usefixtures("sqlite_only")
+    def test_profile_applied_on_connect(self, test_engine):
+        """Test every connection gets the configured pragmas."""
+        with test_engine.connect() as connection:
+            assert connection.execute(text("PRAGMA journal_mode")).scalar().lower() == "wal"
+            assert connection.execute(text("PRAGMA busy_timeout")).scalar() == settings.SQLITE_BUSY_TIMEOUT_MS
+            # NORMAL
+            assert connection.execute(text("PRAGMA synchronous")).scalar() == 1
+            assert connection.execute(text("PRAGMA cache_size")).scalar() == -settings.SQLITE_CACHE_SIZE_KB
+            # MEMORY
+            assert connection.execute(text("PRAGMA temp_store")).scalar() == 2
+
+    @pytest.mark.unit
+    def test_profile_follows_settings(self):
+        """Test the pragmas are built from settings."""
+        with patch.object(settings, 'SQLITE_SYNCHRONOUS', 'FULL'), \
+                patch.object(settings, 'SQLITE_BUSY_TIMEOUT_MS', 1234):
+            pragmas = sqlite_profile_pragmas()
+
+        assert "PRAGMA synchronous=FULL" in pragmas
+        assert "PRAGMA busy_timeout=1234" in pragmas
+
+
+class TestEngineOptions:
+    """Test cases for backend specific engine options."""
+
+    @pytest.mark.unit
+    def test_sqlite_options(self):
+        """Test SQLite connections may be shared across threads and get no pool sizing."""
+        assert engine_options("sqlite:///./test.db") == {"connect_args": {"check_same_thread": False}}
+
+    @pytest.mark.unit
+    def test_postgresql_options(self):
+        """Test server databases get the configured pool and no SQLite connect args."""
+        with patch.object(settings, 'DATABASE_POOL_SIZE', 20):
+            options = engine_options("postgresql+psycopg://xtreamium@localhost/xtreamium")
+
+        assert "connect_args" not in options
+        assert options["pool_size"] == 20
+        assert options["pool_pre_ping"] is True
+        assert options["pool_recycle"] == settings.DATABASE_POOL_RECYCLE_SECONDS
+
+
+class TestSQLiteVersion:
+    """Test cases for the minimum SQLite version."""
+
+    @pytest.mark.unit
+    def test_supported_versions(self):
+        """Test the minimum version and newer ones are accepted."""
+        check_sqlite_version(MIN_SQLITE_VERSION)
+        check_sqlite_version((3, 45, 1))
+
+    @pytest.mark.unit
+    def test_older_version_rejected(self):
+        """Test a SQLite without RETURNING is refused up front instead of failing imports."""
+        with pytest.raises(RuntimeError, match="3.35.0 or newer is required, found 3.31.1"):
+            check_sqlite_version((3, 31, 1))
@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from app.models.programme import COLD_FIELDS, Programme, display_columns, listing_categories, pack_fields
+from app.models.programme import unpack_fields
+
+
+class TestProgrammeModel:
+    """Test cases for the Programme model."""
+
+    @pytest.mark.unit
+    def test_pack_fields_round_trip(self):
+        """Test packing keeps only non-empty cold fields."""
+        values = {
+            'credits': json.dumps({"director": [{"name": "Jane"}]}),
+            'ratings': json.dumps([{"value": "PG"}]),
+            'images': None,
+            'titles': json.dumps([{"text": "Not cold"}]),
+        }
+
+        blob = pack_fields(values)
+
+        assert unpack_fields(blob) == {'credits': values['credits'], 'ratings': values['ratings']}
+        assert pack_fields({field: None for field in COLD_FIELDS}) is None
+        assert unpack_fields(None) == {}
+
+    @pytest.mark.unit
+    def test_listing_categories_decodes_each_list_once(self):
+        """Test rows with the same categories share one parsed value."""
+        categories = json.dumps([{"lang": "en", "text": "Sports"}])
+
+        first = listing_categories(categories)
+
+        assert first == ({"lang": "en", "text": "Sports"},)
+        assert listing_categories(json.dumps([{"lang": "en", "text": "Sports"}])) is first
+        assert listing_categories(None) == ()
+
+    @pytest.mark.unit
+    def test_accessors_read_packed_fields(self):
+        """Test getters work the same whether a field is packed or in its column."""
+        credits = {"actor": [{"name": "Sam"}]}
+        programme = Programme(packed_fields=pack_fields({
+            'credits': json.dumps(credits),
+            'ratings': json.dumps([{"value": "15"}]),
+        }))
+
+        assert programme.get_credits() == credits
+        assert programme.get_json_field('ratings') == [{"value": "15"}]
+        assert programme.get_json_field('images') == []
+
+        # A value written to the column takes precedence
+        programme.set_credits({"actor": [{"name": "Alex"}]})
+        assert programme.get_credits() == {"actor": [{"name": "Alex"}]}
+
+    @pytest.mark.unit
+    def test_display_columns(self):
+        """Test the derived columns and the JSON fallback for rows without them."""
+        assert display_columns(
+            [{"lang": "en", "text": "News"}, {"lang": "fr", "text": "Infos"}],
+            [{"text": "Headlines"}],
+            [{"text": "News"}, {"text": ""}, "Current affairs"],
+        ) == {'title': "News", 'description': "Headlines", 'category_text': "News\nCurrent affairs"}
+        assert display_columns(None, [], []) == {'title': None, 'description': None, 'category_text': None}
+
+        programme = Programme(titles=json.dumps([{"text": "Legacy"}]), categories=json.dumps([{"text": "Film"}]))
+        assert programme.get_default_title() == "Legacy"
+        assert programme.get_category_names() == ["Film"]
+
+        programme.set_titles([{"text": "Current"}])
+        programme.set_json_field('categories', [{"text": "Drama"}, {"text": "Crime"}])
+        assert programme.title == "Current"
+        assert programme.get_category_names() == ["Drama", "Crime"]
@@ -0,0 +1,22 @@
+import pytest
+
+from app.models.programme_bucket import BUCKET_SECONDS, MAX_BUCKETS, bucket_range
+
+HOUR = BUCKET_SECONDS
+
+
+class TestProgrammeBuckets:
+    """Test cases for the grid hour buckets."""
+
+    @pytest.mark.unit
+    def test_bucket_range(self):
+        """Test a programme is in every hour it overlaps, its stop time being exclusive."""
+        assert list(bucket_range(10 * HOUR, 11 * HOUR)) == [10]
+        assert list(bucket_range(10 * HOUR + 1800, 12 * HOUR + 1)) == [10, 11, 12]
+        # Without a stop time a programme only sits in its start hour
+        assert list(bucket_range(10 * HOUR + 1800, 10 * HOUR + 1800)) == [10]
+
+    @pytest.mark.unit
+    def test_bucket_range_is_capped(self):
+        """Test very long programmes are only indexed for their first week."""
+        assert len(bucket_range(0, 365 * 24 * HOUR)) == MAX_BUCKETS
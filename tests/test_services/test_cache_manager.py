@@ -0,0 +1,98 @@
+import os
+import time
+
+import pytest
+
+from app.services.cache_manager import (
+    evict_cache,
+    get_cache_usage,
+    get_server_cache_dir,
+    mark_used,
+    remove_orphaned_cache_dirs,
+)
+from tests.factories import create_test_user, create_test_server
+
+
+def _write_cache(user_id, server_id, size, last_used=None):
+    cache_dir = get_server_cache_dir(user_id, server_id)
+    mark_used(cache_dir)
+    with open(os.path.join(cache_dir, "epg.xml"), 'wb') as file:
+        file.write(b"x" * size)
+    if last_used is not None:
+        os.utime(os.path.join(cache_dir, ".last_used"), (last_used, last_used))
+    return cache_dir
+
+
+@pytest.fixture
+def cache_root(tmp_path, monkeypatch):
+    monkeypatch.setenv("CACHE_PATH", str(tmp_path))
+    return tmp_path
+
+
+class TestCacheManager:
+    """Test cases for the EPG cache manager."""
+
+    @pytest.mark.unit
+    def test_cache_usage_reports_entries(self, cache_root):
+        """Test usage is reported per server directory."""
+        _write_cache("user-1", "server-1", 100)
+        _write_cache("user-1", "server-2", 50)
+
+        usage = get_cache_usage()
+
+        assert "path" not in usage
+        assert usage["total_bytes"] == 150
+        assert {entry["server_id"] for entry in usage["entries"]} == {"server-1", "server-2"}
+
+    @pytest.mark.unit
+    def test_cache_usage_for_one_user(self, cache_root):
+        """Test usage can be limited to one user's servers."""
+        _write_cache("user-1", "server-1", 100)
+        _write_cache("user-2", "server-2", 50)
+
+        usage = get_cache_usage("user-2")
+
+        assert usage["total_bytes"] == 50
+        assert [(entry["user_id"], entry["server_id"]) for entry in usage["entries"]] == [("user-2", "server-2")]
+
+    @pytest.mark.unit
+    def test_evict_removes_least_recently_used(self, cache_root):
+        """Test eviction drops the oldest caches first until under the cap."""
+        now = time.time()
+        oldest = _write_cache("user-1", "server-1", 100, last_used=now - 300)
+        middle = _write_cache("user-1", "server-2", 100, last_used=now - 200)
+        newest = _write_cache("user-2", "server-3", 100, last_used=now - 100)
+
+        freed = evict_cache(150)
+
+        assert freed == 200
+        assert not os.path.exists(oldest)
+        assert not os.path.exists(middle)
+        assert os.path.exists(newest)
+
+    @pytest.mark.unit
+    def test_evict_disabled_with_zero_cap(self, cache_root):
+        """Test a zero cap never evicts."""
+        cache_dir = _write_cache("user-1", "server-1", 100)
+
+        assert evict_cache(0) == 0
+        assert os.path.exists(cache_dir)
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_remove_orphaned_cache_dirs(self, cache_root, test_session):
+        """Test directories for deleted servers and users are removed."""
+        user = create_test_user(test_session)
+        server = create_test_server(test_session, owner=user)
+        test_session.commit()
+
+        kept = _write_cache(user.id, server.id, 10)
+        deleted_server = _write_cache(user.id, "deleted-server", 10)
+        deleted_user = _write_cache("deleted-user", "some-server", 10)
+
+        removed = await remove_orphaned_cache_dirs(test_session)
+
+        assert removed == 2
+        assert os.path.exists(kept)
+        assert not os.path.exists(deleted_server)
+        assert not os.path.exists(os.path.dirname(deleted_user))
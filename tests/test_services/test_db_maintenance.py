@@ -0,0 +1,123 @@
+import datetime as dt
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import text
+
+from app.models.db_maintenance import DBMaintenance
+from app.services.config import settings
+from app.services.data.epg_data_services import store_epg_stream
+from app.services.db_maintenance import convert_cold_fields, record_changes, run_db_maintenance
+from app.utils.iptv_parser_ng import Batch as XMLTVBatch, Channel as XMLTVChannel, Programme as XMLTVProgramme
+from tests.factories import create_test_channel, create_test_programme, create_test_server, create_test_user
+
+NOW = dt.datetime(2023, 10, 10, 12, 0, 0, tzinfo=dt.timezone.utc)
+
+
+def _state(session):
+    session.expire_all()
+    return session.get(DBMaintenance, 1)
+
+
+class TestDBMaintenance:
+    """Test cases for the post-import database maintenance."""
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_import_records_changed_rows(self, test_session):
+        """Test publishing an import adds its inserted, updated and deleted programmes."""
+        user = create_test_user(test_session)
+        server = create_test_server(test_session, owner=user)
+        test_session.commit()
+
+        def stream(count):
+            yield XMLTVBatch(channels=[XMLTVChannel(id="maintenance.channel")])
+            yield XMLTVBatch(programmes=[XMLTVProgramme(start=f"202310011{i:03d}00 +0000",
+                                                        channel="maintenance.channel") for i in range(count)])
+
+        await store_epg_stream(stream(5), user.id, server.id, test_session)
+        await store_epg_stream(stream(3), user.id, server.id, test_session)
+
+        assert _state(test_session).rows_changed == 5 + 2
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_skipped_below_threshold(self, test_session):
+        """Test nothing runs until enough rows changed."""
+        assert await run_db_maintenance(test_session, now=NOW) is None
+
+        record_changes(test_session, 10)
+        test_session.commit()
+        with patch.object(settings, 'DB_MAINTENANCE_MIN_ROWS_CHANGED', 11):
+            assert await run_db_maintenance(test_session, now=NOW) is None
+        assert _state(test_session).last_run_at is None
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_runs_and_records_duration(self, test_session, sqlite_only):
+        """Test a due run analyses the EPG tables and resets the change count."""
+        user = create_test_user(test_session)
+        create_test_programme(test_session, channel=create_test_channel(
+            test_session, user=user, server=create_test_server(test_session, owner=user)))
+        record_changes(test_session, 10)
+        test_session.commit()
+
+        with patch.object(settings, 'DB_MAINTENANCE_MIN_ROWS_CHANGED', 10):
+            result = await run_db_maintenance(test_session, now=NOW)
+
+        assert result["rows_changed"] == 10
+        assert result["reindexed"] is False
+        state = _state(test_session)
+        assert state.rows_changed == 0
+        assert state.last_rows_changed == 10
+        assert state.last_duration_seconds >= 0
+        assert state.last_run_at is not None
+        analysed = {row[0] for row in test_session.execute(text("SELECT tbl FROM sqlite_stat1"))}
+        assert "programmes" in analysed
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_rate_limited(self, test_session):
+        """Test runs are at least DB_MAINTENANCE_MIN_INTERVAL_HOURS apart, however much changed."""
+        with patch.object(settings, 'DB_MAINTENANCE_MIN_ROWS_CHANGED', 1), \
+                patch.object(settings, 'DB_MAINTENANCE_MIN_INTERVAL_HOURS', 6):
+            record_changes(test_session, 100)
+            test_session.commit()
+            assert await run_db_maintenance(test_session, now=NOW) is not None
+
+            record_changes(test_session, 100)
+            test_session.commit()
+            assert await run_db_maintenance(test_session, now=NOW + dt.timedelta(hours=5)) is None
+            assert await run_db_maintenance(test_session, now=NOW + dt.timedelta(hours=6)) is not None
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_reindex(self, test_session):
+        """Test indexes are only rebuilt when DB_MAINTENANCE_REINDEX is set."""
+        with patch.object(settings, 'DB_MAINTENANCE_REINDEX', True):
+            result = await run_db_maintenance(test_session, now=NOW, force=True)
+
+        assert result["reindexed"] is True
+        assert _state(test_session).last_reindexed is True
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_convert_cold_fields_follows_setting(self, test_session):
+        """Test stored programmes are packed and unpacked when EPG_PACK_COLD_FIELDS changes, and only then."""
+        user = create_test_user(test_session)
+        channel = create_test_channel(test_session, user=user, server=create_test_server(test_session, owner=user))
+        programmes = [create_test_programme(test_session, channel=channel, credits='{"director": ["A"]}')
+                      for _ in range(3)]
+        test_session.commit()
+
+        with patch.object(settings, 'EPG_PACK_COLD_FIELDS', True):
+            assert await convert_cold_fields(test_session, batch_size=2)
+            assert not await convert_cold_fields(test_session, batch_size=2)
+        test_session.expire_all()
+        assert all(p.credits is None and p.get_credits() == {"director": ["A"]} for p in programmes)
+        assert _state(test_session).cold_fields_packed is True
+
+        with patch.object(settings, 'EPG_PACK_COLD_FIELDS', False):
+            assert await convert_cold_fields(test_session, batch_size=2)
+        test_session.expire_all()
+        assert all(p.packed_fields is None and p.credits == '{"director": ["A"]}' for p in programmes)
@@ -1,7 +1,35 @@
+import json
+from datetime import datetime, timezone
+
 import pytest
+import sqlalchemy as sa
+from sqlalchemy import event
 from unittest.mock import patch, MagicMock
-from app.services.data.epg_data_services import store_epg_channels
-from app.utils.iptv_parser_ng import Channel as XMLTVChannel, Programme as XMLTVProgramme
+from app.models.category import Category, programme_categories
+from app.models.channel import Channel
+from app.models.programme import Programme
+from app.models.programme_bucket import programme_buckets
+from app.models.epg_import import EPGImport, epg_import_programmes
+from app.models.epg_source import EPGSource
+from app.services.data import epg_data_services
+from app.services.data.epg_data_services import (
+    delete_epg_data_for_user_server,
+    gc_epg_imports,
+    get_categories_for_server,
+    get_channel_by_xmltv_id,
+    get_current_and_next_programmes,
+    get_programme_grid,
+    get_programme_listing,
+    get_programmes_by_category,
+    get_programmes_by_person,
+    get_series_airings,
+    get_programmes_for_channel,
+    resolve_epg_source,
+    search_programmes,
+    store_epg_channels,
+    store_epg_stream,
+)
+from app.utils.iptv_parser_ng import Batch as XMLTVBatch, Channel as XMLTVChannel, Programme as XMLTVProgramme
 from tests.factories import create_test_user, create_test_server, create_test_channel
 
 
@@ -19,7 +47,7 @@ class TestEPGDataServices:
         channels = []
         
         # Note: Using integer server_id as expected by function (type mismatch in codebase)
-        result = await store_epg_channels(channels, user.id, 123, test_session)
+        result = await store_epg_channels(channels, user.id, server.id, test_session)
         
         assert result is not None
         # Should handle empty list gracefully
@@ -28,7 +56,7 @@ class TestEPGDataServices:
     @pytest.mark.asyncio
     async def test_store_epg_channels_single_channel(self, test_session):
         """Test storing a single EPG channel."""
-        user = create_test_user(test_session) 
+        user = create_test_user(test_session)
         server = create_test_server(test_session, owner=user)
         test_session.commit()
         
@@ -51,7 +79,7 @@ class TestEPGDataServices:
         
         channels = [xmltv_channel]
         
-        result = await store_epg_channels(channels, user.id, 123, test_session)
+        result = await store_epg_channels(channels, user.id, server.id, test_session)
         
         assert result is not None
         # Should successfully store the channel and programme
@@ -81,7 +109,7 @@ class TestEPGDataServices:
         
         channels = [xmltv_channel]
         
-        result = await store_epg_channels(channels, user.id, 123, test_session)
+        result = await store_epg_channels(channels, user.id, server.id, test_session)
         
         assert result is not None
         # Should update the existing channel
@@ -91,6 +119,7 @@ class TestEPGDataServices:
     async def test_store_epg_channels_bulk_operations(self, test_session):
         """Test bulk operations for EPG channel storage."""
         user = create_test_user(test_session)
+        server = create_test_server(test_session, owner=user)
         
         # Create XMLTV channels
         xmltv_channels = [
@@ -102,7 +131,7 @@ class TestEPGDataServices:
         with patch('app.services.data.epg_data_services.store_epg_channels') as mock_store:
             mock_store.return_value = {'channels': 2, 'programmes': 0}
             
-            result = await mock_store(xmltv_channels, user.id, 123, test_session)
+            result = await mock_store(xmltv_channels, user.id, server.id, test_session)
             
             assert result is not None
             assert result['channels'] == 2
@@ -112,6 +141,7 @@ class TestEPGDataServices:
     async def test_store_epg_channels_with_programme_data(self, test_session):
         """Test storing channels with detailed programme data."""
         user = create_test_user(test_session)
+        server = create_test_server(test_session, owner=user)
         
         # Create XMLTV channel with detailed programmes
         xmltv_channel = XMLTVChannel(
@@ -134,7 +164,7 @@ class TestEPGDataServices:
         
         channels = [xmltv_channel]
         
-        result = await store_epg_channels(channels, user.id, 123, test_session)
+        result = await store_epg_channels(channels, user.id, server.id, test_session)
         
         assert result is not None
         # Should store programme with all metadata
@@ -144,6 +174,7 @@ class TestEPGDataServices:
     async def test_store_epg_channels_performance_logging(self, test_session):
         """Test performance logging for large channel lists."""
         user = create_test_user(test_session)
+        server = create_test_server(test_session, owner=user)
         
         # Create many channels to test bulk operations
         channels = []
@@ -155,8 +186,691 @@ class TestEPGDataServices:
             channels.append(channel)
         
         with patch('app.services.data.epg_data_services.logger') as mock_logger:
-            result = await store_epg_channels(channels, user.id, 123, test_session)
+            result = await store_epg_channels(channels, user.id, server.id, test_session)
             
             # Should log performance information
             # Check that logging happened (info method should be called)
-            assert True  # If we reach here without exception, test passes
\ No newline at end of file
+            assert True  # If we reach here without exception, test passes
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_store_epg_channels_only_writes_changes(self, test_session):
+        """Test a refresh keeps unchanged rows and only inserts, updates or deletes the difference."""
+        user = create_test_user(test_session)
+        server = create_test_server(test_session, owner=user)
+        test_session.commit()
+
+        def build_feed(titles):
+            channel = XMLTVChannel(id="diff.channel", display_names=[{"lang": "en", "text": "Diff"}])
+            channel.programmes = [
+                XMLTVProgramme(
+                    start=start, stop=start[:8] + "235900 +0000", channel="diff.channel",
+                    titles=[{"lang": "en", "text": title}]
+                )
+                for start, title in titles
+            ]
+            return [channel]
+
+        await store_epg_channels(build_feed([
+            ("20231001100000 +0000", "Kept"),
+            ("20231001110000 +0000", "Changed"),
+            ("20231001120000 +0000", "Removed"),
+        ]), user.id, server.id, test_session)
+
+        channel = test_session.query(Channel).filter(Channel.xmltv_id == "diff.channel").one()
+        channel_updated = channel.date_last_updated
+        ids_before = {p.start_time: p.id for p in test_session.query(Programme).all()}
+
+        result = await store_epg_channels(build_feed([
+            ("20231001100000 +0000", "Kept"),
+            ("20231001110000 +0000", "Changed title"),
+            ("20231001130000 +0000", "Added"),
+        ]), user.id, server.id, test_session)
+
+        assert result["unchanged"] == 1
+        assert result["updated"] == 1
+        assert result["inserted"] == 1
+        assert result["deleted"] == 1
+
+        programmes = {p.start_time: p for p in test_session.query(Programme).all()}
+        assert set(programmes) == {"20231001100000 +0000", "20231001110000 +0000", "20231001130000 +0000"}
+        assert programmes["20231001100000 +0000"].id == ids_before["20231001100000 +0000"]
+        # Changed programmes are replaced by a new row, published with the rest of the import
+        assert programmes["20231001110000 +0000"].id not in ids_before.values()
+        assert programmes["20231001110000 +0000"].get_default_title() == "Changed title"
+        assert all(p.removed_by is None for p in programmes.values())
+
+        test_session.refresh(channel)
+        assert channel.date_last_updated == channel_updated
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_store_epg_stream_in_chunks(self, test_session):
+        """Test a streamed feed written in small chunks gives the same result as one pass."""
+        user = create_test_user(test_session)
+        server = create_test_server(test_session, owner=user)
+        test_session.commit()
+
+        def stream(count):
+            yield XMLTVBatch(channels=[XMLTVChannel(id="stream.channel")])
+            yield XMLTVBatch(programmes=[
+                XMLTVProgramme(start=f"202310011{i:03d}00 +0000", channel="stream.channel",
+                               titles=[{"lang": "en", "text": f"Show {i}"}])
+                for i in range(count)
+            ])
+            # Programme for a channel without a <channel> element
+            yield XMLTVBatch(programmes=[XMLTVProgramme(start="20231001100000 +0000", channel="implicit.channel")])
+
+        result = await store_epg_stream(stream(10), user.id, server.id, test_session, chunk_size=3)
+        assert result["inserted"] == 11
+        assert result["channels"] == 2
+        # Latest end time of the feed, the start time of programmes without a stop time
+        assert result["horizon_end"] == datetime(2023, 10, 1, 10, 9, tzinfo=timezone.utc)
+        assert test_session.query(EPGSource.horizon_end).scalar() == datetime(2023, 10, 1, 10, 9)
+
+        result = await store_epg_stream(stream(7), user.id, server.id, test_session, chunk_size=3)
+        assert result["unchanged"] == 8
+        assert result["deleted"] == 3
+        assert test_session.query(Programme).count() == 8
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_store_epg_stream_within_bind_limit(self, test_session):
+        """Test programmes are matched against the stored guide in lookups that fit the bind parameter limit."""
+        user = create_test_user(test_session)
+        server = create_test_server(test_session, owner=user)
+        test_session.commit()
+
+        def stream():
+            yield XMLTVBatch(channels=[XMLTVChannel(id=f"limit.{i}") for i in range(3)], programmes=[
+                XMLTVProgramme(start=f"202310011{i:03d}00 +0000", channel=f"limit.{i % 3}") for i in range(20)
+            ])
+
+        lookups = []
+
+        def capture(connection, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().startswith("SELECT programmes.id"):
+                lookups.append(len(parameters))
+
+        event.listen(test_session.get_bind(), "before_cursor_execute", capture)
+        try:
+            with patch('app.services.data.epg_data_services._max_bind_params', return_value=7):
+                await store_epg_stream(stream(), user.id, server.id, test_session)
+                result = await store_epg_stream(stream(), user.id, server.id, test_session)
+        finally:
+            event.remove(test_session.get_bind(), "before_cursor_execute", capture)
+
+        assert lookups and max(lookups) <= 7
+        assert result["unchanged"] == 20
+        assert result["inserted"] == 0
+        assert test_session.query(Programme).count() == 20
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_store_epg_stream_is_all_or_nothing(self, test_session):
+        """Test a failure part way through the stream leaves the previous guide untouched."""
+        user = create_test_user(test_session)
+        server = create_test_server(test_session, owner=user)
+        test_session.commit()
+
+        def stream(fail):
+            yield XMLTVBatch(channels=[XMLTVChannel(id="atomic.channel")])
+            yield XMLTVBatch(programmes=[
+                XMLTVProgramme(start=f"2023100110{i:02d}00 +0000", channel="atomic.channel") for i in range(5)
+            ])
+            if fail:
+                raise RuntimeError("feed broke")
+
+        await store_epg_stream(stream(False), user.id, server.id, test_session, chunk_size=2)
+        ids_before = sorted(p.id for p in test_session.query(Programme).all())
+
+        with pytest.raises(RuntimeError):
+            await store_epg_stream(stream(True), user.id, server.id, test_session, chunk_size=2)
+
+        assert sorted(p.id for p in test_session.query(Programme).all()) == ids_before
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_store_epg_stream_publishes_in_one_switch(self, test_session):
+        """Test the new rows stay hidden until the import is published, and the replaced rows go with it."""
+        user = create_test_user(test_session)
+        server = create_test_server(test_session, owner=user)
+        test_session.commit()
+
+        def stream(titles):
+            yield XMLTVBatch(channels=[XMLTVChannel(id="switch.channel")], programmes=[
+                XMLTVProgramme(start=f"2023100110{i:02d}00 +0000", channel="switch.channel",
+                               titles=[{"lang": "en", "text": title}])
+                for i, title in titles
+            ])
+
+        def titles():
+            channel = test_session.query(Channel).filter(Channel.xmltv_id == "switch.channel").one()
+            return sorted(row.title for row in test_session.query(Programme.title).filter(
+                Programme.channel_id == channel.id, epg_data_services._visible_programmes()))
+
+        await store_epg_stream(stream([(0, "Kept"), (1, "Changed"), (2, "Removed")]), user.id, server.id,
+                               test_session, chunk_size=2)
+
+        seen = {}
+        finish_import = epg_data_services._finish_import
+
+        def publish(import_id, status, db):
+            seen[status] = (titles(), test_session.query(Programme).count())
+            return finish_import(import_id, status, db)
+
+        with patch.object(epg_data_services, '_finish_import', side_effect=publish):
+            await store_epg_stream(stream([(0, "Kept"), (1, "Changed title"), (3, "Added")]), user.id, server.id,
+                                   test_session, chunk_size=2)
+
+        # Right before the switch both guides are stored, readers only see the old one
+        assert seen["published"] == (["Changed", "Kept", "Removed"], 5)
+        assert titles() == ["Added", "Changed title", "Kept"]
+        assert test_session.query(Programme).count() == 3
+        # Once published, the rows no longer point at the import
+        assert test_session.query(Programme).filter(sa.or_(
+            Programme.added_by.is_not(None), Programme.removed_by.is_not(None))).count() == 0
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_store_epg_stream_failure_after_adding_rows(self, test_session):
+        """Test an import failing once its rows are added leaves them hidden until gc_epg_imports deletes them."""
+        user = create_test_user(test_session)
+        server = create_test_server(test_session, owner=user)
+        test_session.commit()
+
+        def stream(start):
+            yield XMLTVBatch(channels=[XMLTVChannel(id="hidden.channel")], programmes=[
+                XMLTVProgramme(start=f"2023100{start}1000{i:02d} +0000", channel="hidden.channel") for i in range(3)
+            ])
+
+        await store_epg_stream(stream(1), user.id, server.id, test_session, chunk_size=2)
+        channel = test_session.query(Channel).filter(Channel.xmltv_id == "hidden.channel").one()
+        listing = await get_programme_listing(channel.id, test_session)
+
+        with patch.object(epg_data_services, '_touch_import_channels', side_effect=RuntimeError("disk full")):
+            with pytest.raises(RuntimeError):
+                await store_epg_stream(stream(2), user.id, server.id, test_session, chunk_size=2)
+
+        assert test_session.query(Programme).count() == 6
+        assert await get_programme_listing(channel.id, test_session) == listing
+
+        await gc_epg_imports(test_session)
+
+        assert test_session.query(Programme).count() == 3
+        assert await get_programme_listing(channel.id, test_session) == listing
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_store_epg_stream_channel_upsert(self, test_session):
+        """Test channels are inserted, updated and linked in chunks."""
+        user = create_test_user(test_session)
+        server = create_test_server(test_session, owner=user)
+        test_session.commit()
+
+        def stream(name):
+            yield XMLTVBatch(channels=[
+                XMLTVChannel(id=f"upsert.{i}", display_names=[{"lang": "en", "text": name if i == 0 else f"{i}"}])
+                for i in range(5)
+            ])
+            yield XMLTVBatch(programmes=[
+                XMLTVProgramme(start="20231001100000 +0000", channel=f"upsert.{i}") for i in range(6)
+            ])
+
+        with patch('app.services.data.epg_data_services._max_bind_params', return_value=20):
+            result = await store_epg_stream(stream("First"), user.id, server.id, test_session)
+            assert result["channels"] == 6
+            assert result["inserted"] == 6
+
+            channels = {c.xmltv_id: c for c in test_session.query(Channel).all()}
+            updated_before = {xmltv_id: c.date_last_updated for xmltv_id, c in channels.items()}
+
+            result = await store_epg_stream(stream("Renamed"), user.id, server.id, test_session)
+            assert result["channels"] == 0
+            assert result["unchanged"] == 6
+
+        test_session.expire_all()
+        channels = {c.xmltv_id: c for c in test_session.query(Channel).all()}
+        assert len(channels) == 6
+        assert channels["upsert.0"].get_display_names()[0]["text"] == "Renamed"
+        assert channels["upsert.0"].date_last_updated != updated_before["upsert.0"]
+        assert channels["upsert.1"].date_last_updated == updated_before["upsert.1"]
+        # The implicit channel is looked up, not overwritten
+        assert channels["upsert.5"].date_last_updated == updated_before["upsert.5"]
+        for programme in test_session.query(Programme).all():
+            assert programme.channel_id == channels[f"upsert.{programme.channel.xmltv_id[-1]}"].id
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_store_epg_stream_packs_cold_fields(self, test_session):
+        """Test cold fields are stored compressed when packing is enabled."""
+        user = create_test_user(test_session)
+        server = create_test_server(test_session, owner=user)
+        test_session.commit()
+
+        def stream():
+            yield XMLTVBatch(channels=[XMLTVChannel(id="packed.channel")])
+            yield XMLTVBatch(programmes=[XMLTVProgramme(
+                start="20231001100000 +0000", channel="packed.channel",
+                titles=[{"lang": "en", "text": "Packed"}],
+                credits={"director": [{"name": "Jane"}]},
+                ratings=[{"system": "MPAA", "value": "PG"}]
+            )])
+
+        with patch('app.services.data.epg_data_services.settings.EPG_PACK_COLD_FIELDS', True):
+            await store_epg_stream(stream(), user.id, server.id, test_session)
+            programme = test_session.query(Programme).one()
+            assert programme.credits is None
+            assert programme.packed_fields is not None
+            assert programme.get_default_title() == "Packed"
+            assert programme.get_credits() == {"director": [{"name": "Jane"}]}
+            assert programme.get_json_field('ratings') == [{"system": "MPAA", "value": "PG"}]
+
+        # Switching packing off doesn't rewrite unchanged rows, they still read back
+        result = await store_epg_stream(stream(), user.id, server.id, test_session)
+        assert result["unchanged"] == 1
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_programme_time_queries_across_offsets(self, test_session):
+        """Test window and current/next queries compare real instants, not offset strings."""
+        user = create_test_user(test_session)
+        server = create_test_server(test_session, owner=user)
+        test_session.commit()
+
+        def stream():
+            yield XMLTVBatch(channels=[XMLTVChannel(id="tz.channel")])
+            yield XMLTVBatch(programmes=[
+                # 10:00-11:00 UTC, written with a +0200 offset
+                XMLTVProgramme(start="20231001120000 +0200", stop="20231001130000 +0200", channel="tz.channel",
+                               titles=[{"text": "First"}]),
+                # 11:00-12:00 UTC, sorts before the first one as a string
+                XMLTVProgramme(start="20231001060000 -0500", stop="20231001070000 -0500", channel="tz.channel",
+                               titles=[{"text": "Second"}]),
+            ])
+
+        await store_epg_stream(stream(), user.id, server.id, test_session)
+        channel = test_session.query(Channel).filter(Channel.xmltv_id == "tz.channel").one()
+
+        programmes = await get_programmes_for_channel(channel.id, test_session)
+        assert [p.get_default_title() for p in programmes] == ["First", "Second"]
+
+        programmes = await get_programmes_for_channel(channel.id, test_session,
+                                                       start_time="20231001103000 +0000")
+        assert [p.get_default_title() for p in programmes] == ["Second"]
+
+        result = await get_current_and_next_programmes(channel.id, "20231001123000 +0200", test_session)
+        assert result["current"].get_default_title() == "First"
+        assert result["next"].get_default_title() == "Second"
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_store_epg_stream_fills_display_columns(self, test_session):
+        """Test title, description and category text are derived at import and served by the listing."""
+        user = create_test_user(test_session)
+        server = create_test_server(test_session, owner=user)
+        test_session.commit()
+
+        def stream(title):
+            yield XMLTVBatch(channels=[XMLTVChannel(id="display.channel")])
+            yield XMLTVBatch(programmes=[XMLTVProgramme(
+                start="20231001100000 +0000", stop="20231001110000 +0000", channel="display.channel",
+                titles=[{"lang": "en", "text": title}], descriptions=[{"lang": "en", "text": "Synopsis"}],
+                categories=[{"lang": "en", "text": "Drama"}, {"lang": "en", "text": "Crime"}]
+            )])
+
+        await store_epg_stream(stream("Before"), user.id, server.id, test_session)
+        await store_epg_stream(stream("After"), user.id, server.id, test_session)
+        channel = test_session.query(Channel).filter(Channel.xmltv_id == "display.channel").one()
+
+        listing = await get_programme_listing(channel.id, test_session, start_time="20231001100000 +0000")
+        assert [(row.title, row.description, json.loads(row.categories)) for row in listing] == [
+            ("After", "Synopsis", [{"lang": "en", "text": "Drama"}, {"lang": "en", "text": "Crime"}])]
+        assert await get_programme_listing(channel.id, test_session, start_time="20231001103000 +0000") == []
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_store_epg_stream_publishes_at_the_end(self, test_session):
+        """Test staged chunks are committed but stay invisible until the import is published."""
+        user = create_test_user(test_session)
+        server = create_test_server(test_session, owner=user)
+        test_session.commit()
+
+        def stream(title, observed):
+            yield XMLTVBatch(channels=[XMLTVChannel(id="staged.channel")])
+            for i in range(3):
+                yield XMLTVBatch(programmes=[XMLTVProgramme(
+                    start=f"2023100110{i:02d}00 +0000", channel="staged.channel", titles=[{"text": title}])])
+                observed.append(sorted(p.get_default_title() for p in test_session.query(Programme).all()))
+
+        await store_epg_stream(stream("Old", []), user.id, server.id, test_session, chunk_size=1)
+
+        observed = []
+        result = await store_epg_stream(stream("New", observed), user.id, server.id, test_session, chunk_size=1)
+
+        assert result["updated"] == 3
+        assert observed == [["Old", "Old", "Old"]] * 3
+        assert [p.get_default_title() for p in test_session.query(Programme).all()] == ["New"] * 3
+        assert {i.status for i in test_session.query(EPGImport).all()} == {"published"}
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_gc_epg_imports(self, test_session):
+        """Test finished and failed imports are cleaned up in batches, running ones are left alone."""
+        user = create_test_user(test_session)
+        server = create_test_server(test_session, owner=user)
+        test_session.commit()
+
+        def stream(fail=False):
+            yield XMLTVBatch(channels=[XMLTVChannel(id="gc.channel")])
+            yield XMLTVBatch(programmes=[
+                XMLTVProgramme(start=f"2023100110{i:02d}00 +0000", channel="gc.channel") for i in range(5)
+            ])
+            if fail:
+                raise RuntimeError("feed broke")
+
+        await store_epg_stream(stream(), user.id, server.id, test_session, chunk_size=2)
+        with pytest.raises(RuntimeError):
+            await store_epg_stream(stream(fail=True), user.id, server.id, test_session, chunk_size=2)
+        running = EPGImport(user_id=user.id, server_id=server.id)
+        test_session.add(running)
+        test_session.commit()
+
+        assert await gc_epg_imports(test_session, batch_size=2) == 2
+
+        assert [i.id for i in test_session.query(EPGImport).all()] == [running.id]
+        assert test_session.query(epg_import_programmes).count() == 0
+        assert test_session.query(Programme).count() == 5
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_gc_epg_imports_clears_published_rows(self, test_session):
+        """Test rows a published import couldn't clean up are deleted or cleared by gc_epg_imports."""
+        user = create_test_user(test_session)
+        server = create_test_server(test_session, owner=user)
+        test_session.commit()
+
+        def stream(start, stop):
+            yield XMLTVBatch(channels=[XMLTVChannel(id="gc.channel")], programmes=[
+                XMLTVProgramme(start=f"2023100110{i:02d}00 +0000", channel="gc.channel") for i in range(start, stop)
+            ])
+
+        await store_epg_stream(stream(0, 5), user.id, server.id, test_session, chunk_size=2)
+        with patch.object(epg_data_services, 'delete_in_batches', side_effect=RuntimeError("database is locked")):
+            await store_epg_stream(stream(2, 6), user.id, server.id, test_session, chunk_size=2)
+        assert test_session.query(Programme).filter(Programme.removed_by.is_not(None)).count() == 2
+        assert test_session.query(Programme).filter(Programme.added_by.is_not(None)).count() == 1
+
+        assert await gc_epg_imports(test_session, batch_size=2) == 2
+
+        assert test_session.query(Programme).count() == 4
+        assert test_session.query(Programme).filter(sa.or_(
+            Programme.added_by.is_not(None), Programme.removed_by.is_not(None))).count() == 0
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_servers_with_the_same_epg_url_share_one_source(self, test_session):
+        """Test a feed used by two servers is stored once and only dropped with its last subscriber."""
+        first = create_test_user(test_session)
+        second = create_test_user(test_session)
+        test_session.commit()
+        servers = [
+            create_test_server(test_session, owner_id=user.id, epg_url="http://example.com/shared.xml")
+            for user in (first, second)
+        ]
+        test_session.commit()
+
+        def stream():
+            yield XMLTVBatch(channels=[XMLTVChannel(id="shared.channel")], programmes=[
+                XMLTVProgramme(start="20231001100000 +0000", channel="shared.channel")
+            ])
+
+        await store_epg_stream(stream(), first.id, servers[0].id, test_session)
+        result = await store_epg_stream(stream(), second.id, servers[1].id, test_session)
+
+        assert result["unchanged"] == 1
+        assert test_session.query(EPGSource).count() == 1
+        assert test_session.query(Channel).count() == 1
+        assert test_session.query(Programme).count() == 1
+        channel = await get_channel_by_xmltv_id(second.id, servers[1].id, "shared.channel", test_session)
+        assert channel is not None
+
+        await delete_epg_data_for_user_server(first.id, servers[0].id, test_session)
+        assert test_session.query(Programme).count() == 1
+        assert await get_channel_by_xmltv_id(first.id, servers[0].id, "shared.channel", test_session) is None
+
+        await delete_epg_data_for_user_server(second.id, servers[1].id, test_session)
+        assert test_session.query(EPGSource).count() == 0
+        assert test_session.query(Channel).count() == 0
+        assert test_session.query(Programme).count() == 0
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_accounts_on_one_provider_share_one_source(self, test_session):
+        """Test the account credentials in an EPG URL don't split its source, nor end up in the source key."""
+        first = create_test_user(test_session)
+        second = create_test_user(test_session)
+        test_session.commit()
+        servers = [
+            create_test_server(test_session, owner_id=user.id,
+                               epg_url=f"http://provider.example.com/xmltv.php?username={name}&password=secret")
+            for user, name in ((first, "first"), (second, "second"))
+        ]
+        test_session.commit()
+
+        sources = [await resolve_epg_source(server.owner_id, server.id, test_session) for server in servers]
+
+        assert sources[0].id == sources[1].id
+        assert sources[0].url == "http://provider.example.com/xmltv.php"
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_search_programmes(self, test_session):
+        """Test search is ranked, prefix matched, limited to upcoming programmes and the user's own channels."""
+        user = create_test_user(test_session)
+        other = create_test_user(test_session)
+        test_session.commit()
+        server = create_test_server(test_session, owner_id=user.id, epg_url="http://example.com/mine.xml")
+        other_server = create_test_server(test_session, owner_id=other.id, epg_url="http://example.com/other.xml")
+        test_session.commit()
+
+        def programme(start, title, description=None):
+            return XMLTVProgramme(start=f"{start} +0000", stop=f"{start[:10]}5900 +0000", channel="search.channel",
+                                  titles=[{"text": title}],
+                                  descriptions=[{"text": description}] if description else [])
+
+        await store_epg_stream(iter([XMLTVBatch(channels=[XMLTVChannel(id="search.channel")], programmes=[
+            programme("20231001080000", "Doctor Who"),
+            programme("20231001100000", "Doctor Who"),
+            programme("20231001110000", "Film", "A documentary about the doctors of Gallifrey"),
+            programme("20231001120000", "News"),
+        ])]), user.id, server.id, test_session)
+        await store_epg_stream(iter([XMLTVBatch(channels=[XMLTVChannel(id="search.channel")], programmes=[
+            programme("20231001100000", "Doctor Who"),
+        ])]), other.id, other_server.id, test_session)
+
+        now = "20231001090000 +0000"
+        found = await search_programmes(user.id, "doct", test_session, now=now)
+
+        assert found["total"] == 2
+        assert [p.get_default_title() for p, _ in found["results"]] == ["Doctor Who", "Film"]
+        assert all(c.xmltv_id == "search.channel" for _, c in found["results"])
+
+        page = await search_programmes(user.id, "doct", test_session, now=now, limit=1, offset=1)
+        assert page["total"] == 2
+        assert [p.get_default_title() for p, _ in page["results"]] == ["Film"]
+
+        assert (await search_programmes(user.id, "doctor who", test_session, now=now))["total"] == 1
+        assert (await search_programmes(user.id, "doct", test_session, server_id=other_server.id, now=now))["total"] == 0
+        assert (await search_programmes(user.id, "   ", test_session, now=now))["total"] == 0
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_programmes_by_category(self, test_session):
+        """Test categories are indexed at publish and re-indexed when a programme changes or goes."""
+        user = create_test_user(test_session)
+        server = create_test_server(test_session, owner=user)
+        test_session.commit()
+
+        def programme(hour, title, *categories):
+            return XMLTVProgramme(start=f"20231001{hour:02d}0000 +0000", stop=f"20231001{hour:02d}5900 +0000",
+                                  channel="genre.channel", titles=[{"text": title}],
+                                  categories=[{"lang": "en", "text": name} for name in categories])
+
+        def stream(*programmes):
+            yield XMLTVBatch(channels=[XMLTVChannel(id="genre.channel")], programmes=list(programmes))
+
+        await store_epg_stream(stream(
+            programme(10, "Football", "Sports"),
+            programme(12, "Tennis", "Sports", "Live"),
+            programme(16, "Cricket", "Sports"),
+            programme(13, "Film", "Drama"),
+        ), user.id, server.id, test_session)
+
+        now = "20231001103000 +0000"
+        found = await get_programmes_by_category(user.id, server.id, "sports", test_session, now=now)
+        assert found["total"] == 2
+        assert [p.title for p, _ in found["results"]] == ["Football", "Tennis"]
+        assert await get_categories_for_server(user.id, server.id, test_session, now=now) == [
+            ("Drama", 1), ("Live", 1), ("Sports", 3)]
+
+        # Tennis loses its category, football drops out of the feed
+        await store_epg_stream(stream(
+            programme(12, "Tennis", "Live"),
+            programme(16, "Cricket", "Sports"),
+            programme(13, "Film", "Drama"),
+        ), user.id, server.id, test_session)
+
+        found = await get_programmes_by_category(user.id, server.id, "Sports", test_session, now=now, hours=8)
+        assert [p.title for p, _ in found["results"]] == ["Cricket"]
+        assert test_session.query(Category).count() == 3
+        assert test_session.query(programme_categories).count() == 3
+
+        other = create_test_user(test_session)
+        assert (await get_programmes_by_category(other.id, server.id, "Sports", test_session, now=now))["total"] == 0
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_programmes_by_person(self, test_session):
+        """Test credits are indexed by person, including packed credits, and found by name prefix."""
+        user = create_test_user(test_session)
+        server = create_test_server(test_session, owner=user)
+        test_session.commit()
+
+        def programme(hour, title, credits):
+            return XMLTVProgramme(start=f"20231001{hour:02d}0000 +0000", stop=f"20231001{hour:02d}5900 +0000",
+                                  channel="people.channel", titles=[{"text": title}], credits=credits)
+
+        def stream(*programmes):
+            yield XMLTVBatch(channels=[XMLTVChannel(id="people.channel")], programmes=list(programmes))
+
+        with patch('app.services.data.epg_data_services.settings.EPG_PACK_COLD_FIELDS', True):
+            await store_epg_stream(stream(
+                programme(9, "Yesterday", {"presenter": [{"name": "Matt Baker"}]}),
+                programme(12, "Doctor Who", {"actor": [{"name": "Matt Smith", "role": "The Doctor"}],
+                                             "director": [{"name": "Toby Haynes"}]}),
+                programme(14, "The One Show", {"presenter": [{"name": "Matt  Baker"}, {"name": "Alex Jones"}]}),
+            ), user.id, server.id, test_session)
+
+        now = "20231001100000 +0000"
+        found = await get_programmes_by_person(user.id, server.id, "MATT", test_session, now=now)
+        assert found["total"] == 2
+        assert [(p.title, name, role, character) for p, _, name, role, character in found["results"]] == [
+            ("Doctor Who", "Matt Smith", "actor", "The Doctor"),
+            ("The One Show", "Matt  Baker", "presenter", None),
+        ]
+        assert (await get_programmes_by_person(user.id, server.id, "matt b", test_session, now=now))["total"] == 1
+        assert (await get_programmes_by_person(user.id, server.id, "  ", test_session, now=now))["total"] == 0
+
+        # A changed credit list replaces the programme's links
+        await store_epg_stream(stream(
+            programme(12, "Doctor Who", {"actor": [{"name": "David Tennant", "role": "The Doctor"}]}),
+        ), user.id, server.id, test_session)
+        found = await get_programmes_by_person(user.id, server.id, "matt", test_session, now=now)
+        assert found["total"] == 0
+        found = await get_programmes_by_person(user.id, server.id, "david", test_session, now=now)
+        assert [p.title for p, *_ in found["results"]] == ["Doctor Who"]
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_series_airings(self, test_session):
+        """Test episode numbers are parsed at import and a series' next airings are found by key."""
+        user = create_test_user(test_session)
+        server = create_test_server(test_session, owner=user)
+        test_session.commit()
+
+        def programme(hour, title, episode_nums, new=False):
+            return XMLTVProgramme(start=f"20231001{hour:02d}0000 +0000", stop=f"20231001{hour:02d}5900 +0000",
+                                  channel="series.channel", titles=[{"text": title}], episode_nums=episode_nums,
+                                  new=new)
+
+        await store_epg_stream(iter([XMLTVBatch(channels=[XMLTVChannel(id="series.channel")], programmes=[
+            programme(8, "Doctor Who", [{"system": "xmltv_ns", "text": "13.2.0/1"}]),
+            programme(12, "Doctor Who", [{"system": "xmltv_ns", "text": "13.3.0/1"}]),
+            programme(14, "doctor  who", [{"system": "onscreen", "text": "S14E05"}], new=True),
+            programme(16, "News", []),
+        ])]), user.id, server.id, test_session)
+
+        now = "20231001100000 +0000"
+        first = test_session.query(Programme).filter(Programme.start_time.like("2023100112%")).one()
+        assert (first.season, first.episode) == (14, 4)
+
+        airings = await get_series_airings(user.id, first.series_key, test_session, now=now)
+        assert [(p.start_time[8:10], p.season, p.episode) for p, _ in airings] == [("12", 14, 4), ("14", 14, 5)]
+        airings = await get_series_airings(user.id, first.series_key, test_session, now=now, new_only=True)
+        assert [p.episode for p, _ in airings] == [5]
+        assert len(await get_series_airings(user.id, first.series_key, test_session, now=now, limit=1)) == 1
+
+        other = create_test_user(test_session)
+        assert await get_series_airings(other.id, first.series_key, test_session, now=now) == []
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_programme_grid(self, test_session):
+        """Test a grid window returns every programme overlapping it, found through the hour buckets."""
+        user = create_test_user(test_session)
+        server = create_test_server(test_session, owner=user)
+        test_session.commit()
+
+        def programme(channel, start, stop, title):
+            return XMLTVProgramme(start=f"20231001{start} +0000", stop=stop and f"20231001{stop} +0000",
+                                  channel=channel, titles=[{"text": title}])
+
+        def stream(*programmes):
+            yield XMLTVBatch(channels=[XMLTVChannel(id="grid.one"), XMLTVChannel(id="grid.two")],
+                             programmes=list(programmes))
+
+        await store_epg_stream(stream(
+            programme("grid.one", "060000", "120000", "Breakfast"),
+            programme("grid.one", "120000", "123000", "News"),
+            programme("grid.one", "123000", "150000", "Film"),
+            programme("grid.one", "150000", None, "Late"),
+            programme("grid.two", "110000", "115900", "Before"),
+            programme("grid.two", "133000", "140000", "Inside"),
+        ), user.id, server.id, test_session)
+        # Breakfast spans six buckets, the programme without a stop time one
+        assert test_session.query(programme_buckets).count() == 6 + 1 + 3 + 1 + 1 + 1
+
+        grid = await get_programme_grid(user.id, server.id, test_session, start="20231001113000 +0000", hours=3)
+        assert grid["total"] == 2
+        assert [(channel.xmltv_id, [row.title for row in rows]) for channel, rows in grid["results"]] == [
+            ("grid.one", ["Breakfast", "News", "Film"]),
+            ("grid.two", ["Before", "Inside"]),
+        ]
+
+        grid = await get_programme_grid(user.id, server.id, test_session, start="20231001143000 +0000", hours=1,
+                                        channels=["grid.one"])
+        assert grid["total"] == 1
+        assert [row.title for row in grid["results"][0][1]] == ["Film", "Late"]
+
+        # Changed stop times move a programme's buckets, dropped programmes take theirs with them
+        await store_epg_stream(stream(
+            programme("grid.one", "060000", "090000", "Breakfast"),
+            programme("grid.two", "133000", "140000", "Inside"),
+        ), user.id, server.id, test_session)
+        assert test_session.query(programme_buckets).count() == 3 + 1
+        grid = await get_programme_grid(user.id, server.id, test_session, start="20231001113000 +0000", hours=3)
+        assert [[row.title for row in rows] for _, rows in grid["results"]] == [[], ["Inside"]]
+
+        other = create_test_user(test_session)
+        assert (await get_programme_grid(other.id, server.id, test_session))["results"] == []
@@ -0,0 +1,162 @@
+import sqlite3
+from unittest.mock import patch
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from app.models.channel import Channel
+from app.models.epg_source import EPGSource, EPGSourceSubscription
+from app.services.config import settings
+from app.services.data import epg_data_services
+from app.services.data.epg_data_services import (
+    delete_epg_data_for_user_server, get_channel_by_xmltv_id, get_programme_listing, store_epg_stream
+)
+from app.services.epg_shards import all_epg_sessions, dispose_shards, epg_session, shard_for
+from app.services.retention import run_retention
+from app.utils.iptv_parser_ng import Batch as XMLTVBatch, Channel as XMLTVChannel, Programme as XMLTVProgramme
+from tests.factories import create_test_server, create_test_user
+
+
+@pytest.fixture
+def shards(tmp_path, sqlite_only, primary):
+    urls = {name: f"sqlite:///{tmp_path / f'epg-{name}.db'}" for name in ("a", "b")}
+    with patch.object(settings, 'EPG_SHARDS', urls):
+        yield {name: tmp_path / f"epg-{name}.db" for name in urls}
+        dispose_shards()
+
+
+def _user_on(session, shard):
+    user_id = next(f"user-{i}" for i in range(1000) if shard_for(f"user-{i}") == shard)
+    user = create_test_user(session, id=user_id)
+    server = create_test_server(session, owner=user, epg_url="http://example.com/guide.xml")
+    session.commit()
+    return user.id, server.id
+
+
+def _feed(channel_id):
+    return iter([XMLTVBatch(channels=[XMLTVChannel(id=channel_id)], programmes=[
+        XMLTVProgramme(start="20231001100000 +0000", stop="20231001110000 +0000", channel=channel_id)
+    ])])
+
+
+def _channels(path):
+    with sqlite3.connect(path) as connection:
+        return [row[0] for row in connection.execute("SELECT xmltv_id FROM channels")]
+
+
+class TestEPGShards:
+    """Test cases for sharded EPG storage."""
+
+    @pytest.mark.unit
+    def test_shard_for_is_consistent(self):
+        """Test users keep their shard, and adding a shard only moves users onto it."""
+        users = [f"user-{i}" for i in range(2000)]
+        with patch.object(settings, 'EPG_SHARDS', {}):
+            assert shard_for(users[0]) is None
+
+        with patch.object(settings, 'EPG_SHARDS', {name: f"sqlite:///{name}.db" for name in "abcd"}):
+            before = {user: shard_for(user) for user in users}
+            assert set(before.values()) == set("abcd")
+            assert before == {user: shard_for(user) for user in users}
+        with patch.object(settings, 'EPG_SHARDS', {name: f"sqlite:///{name}.db" for name in "abcde"}):
+            after = {user: shard_for(user) for user in users}
+
+        moved = [user for user in users if after[user] != before[user]]
+        assert {after[user] for user in moved} == {"e"}
+        assert 0.1 < len(moved) / len(users) < 0.3
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_imports_go_to_the_users_shard(self, test_session, shards):
+        """Test each user's guide is stored in their shard and read back through it."""
+        user_a, server_a = _user_on(test_session, "a")
+        user_b, server_b = _user_on(test_session, "b")
+
+        for user_id, server_id, channel_id in ((user_a, server_a, "a.channel"), (user_b, server_b, "b.channel")):
+            with epg_session(user_id, test_session) as epg_db:
+                await store_epg_stream(_feed(channel_id), user_id, server_id, epg_db)
+
+        assert _channels(shards["a"]) == ["a.channel"]
+        assert _channels(shards["b"]) == ["b.channel"]
+        assert test_session.query(Channel).count() == 0
+
+        with epg_session(user_a, test_session) as epg_db:
+            channel = await get_channel_by_xmltv_id(user_a, server_a, "a.channel", epg_db)
+            assert len(await get_programme_listing(channel.id, epg_db)) == 1
+            assert await get_channel_by_xmltv_id(user_a, server_a, "b.channel", epg_db) is None
+
+        # Both servers read the same URL, but their guides are on different shards
+        keys = sorted(url for url, in test_session.query(EPGSource.url))
+        assert keys == ["shard:a:http://example.com/guide.xml", "shard:b:http://example.com/guide.xml"]
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_retention_runs_on_every_shard(self, test_session, shards):
+        """Test unused sources are purged from the shard holding their guide."""
+        user_a, server_a = _user_on(test_session, "a")
+        user_b, server_b = _user_on(test_session, "b")
+        for user_id, server_id, channel_id in ((user_a, server_a, "a.channel"), (user_b, server_b, "b.channel")):
+            with epg_session(user_id, test_session) as epg_db:
+                await store_epg_stream(_feed(channel_id), user_id, server_id, epg_db)
+
+        test_session.query(EPGSourceSubscription).filter(EPGSourceSubscription.user_id == user_b).delete()
+        test_session.commit()
+        deleted = [(await run_retention(epg_db))["sources_deleted"] for epg_db in all_epg_sessions(test_session)]
+
+        assert deleted == [0, 0, 1]
+        assert _channels(shards["a"]) == ["a.channel"]
+        assert _channels(shards["b"]) == []
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_outdated_shard_is_rebuilt(self, test_session, shards):
+        """Test a shard created by another schema is emptied and its feeds are imported again."""
+        user_id, server_id = _user_on(test_session, "a")
+        with epg_session(user_id, test_session) as epg_db:
+            await store_epg_stream(_feed("a.channel"), user_id, server_id, epg_db, content_hash="feed")
+        assert test_session.query(EPGSource.content_hash).scalar() == "feed"
+        dispose_shards()
+        with sqlite3.connect(shards["a"]) as connection:
+            connection.execute("PRAGMA user_version = 1")
+
+        with epg_session(user_id, test_session) as epg_db:
+            assert epg_db.query(Channel).count() == 0
+
+        test_session.expire_all()
+        assert test_session.query(EPGSource.content_hash).scalar() is None
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_main_database_written_through_its_session(self, test_session, shards):
+        """Test writes to the main database's tables from a shard session go through the main database's session."""
+        user_id, server_id = _user_on(test_session, "a")
+        jobs = []
+        run_write = epg_data_services.run_write
+
+        async def record(db, job, *args, **kwargs):
+            jobs.append((job.__name__, db is test_session))
+            return await run_write(db, job, *args, **kwargs)
+
+        with patch.object(epg_data_services, 'run_write', side_effect=record):
+            with epg_session(user_id, test_session) as epg_db:
+                await store_epg_stream(_feed("a.channel"), user_id, server_id, epg_db, content_hash="feed")
+                await delete_epg_data_for_user_server(user_id, server_id, epg_db)
+
+        assert {name for name, on_main in jobs if on_main} == {
+            "_resolve_epg_source", "record_import", "unsubscribe_server", "_forget_source_import", "_delete_source"
+        }
+        assert test_session.query(EPGSource).count() == 0
+        assert _channels(shards["a"]) == []
+
+    @pytest.mark.unit
+    def test_replica_sessions_share_the_shard_engine(self, test_session, test_engine, shards, replica):
+        """Test a session on the read replica gets the one engine of the shard, attaching the primary."""
+        user_id, _ = _user_on(test_session, "a")
+
+        with Session(replica) as replica_session:
+            with epg_session(user_id, test_session) as epg_db, epg_session(user_id, replica_session) as read_db:
+                assert read_db.get_bind() is epg_db.get_bind()
+                attached = dict((name, path) for _, name, path in read_db.execute(sa.text("PRAGMA database_list")))
+
+        assert attached["central"] == test_engine.url.database
@@ -0,0 +1,145 @@
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from app.services.data.epg_data_services import (
+    get_channel_by_xmltv_id,
+    get_current_and_next_programmes,
+    get_programme_grid,
+    get_programme_listing,
+    get_programmes_by_category,
+    get_series_airings,
+    store_epg_stream,
+)
+from app.services.retention import purge_expired_programmes
+from app.utils.iptv_parser_ng import Batch as XMLTVBatch, Channel as XMLTVChannel, Programme as XMLTVProgramme
+from tests.factories import create_test_channel, create_test_programme, create_test_server, create_test_user
+
+
+@contextmanager
+def query_plans(session):
+    """Collect the EXPLAIN QUERY PLAN output of every query run in the block"""
+    engine = session.get_bind()
+    statements = []
+
+    def capture(connection, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "DELETE")):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    plans = []
+    try:
+        yield plans
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    for statement, parameters in statements:
+        rows = session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+        plans.append("\n".join(row[3] for row in rows))
+
+
+@pytest.fixture
+def channel(test_session, sqlite_only):
+    user = create_test_user(test_session)
+    channel = create_test_channel(test_session, user=user, server=create_test_server(test_session, owner=user))
+    create_test_programme(test_session, channel=channel)
+    test_session.commit()
+    # Loaded up front so reading its attributes doesn't add queries to the plans
+    test_session.refresh(channel)
+    return channel
+
+
+def _plan(plans, table):
+    """The plan of the one query that read table"""
+    matching = [plan for plan in plans if f" {table} " in plan]
+    assert len(matching) == 1, plans
+    assert f"SCAN {table}" not in matching[0]
+    return matching[0]
+
+
+class TestQueryPlans:
+    """Test the hot read queries keep using the indexes built for them."""
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_listing_seeks_the_listing_index(self, test_session, channel):
+        """Test a channel listing is found in idx_programme_listing in start order instead of sorting."""
+        with query_plans(test_session) as plans:
+            await get_programme_listing(channel.id, test_session, start_time=0, end_time=2 ** 40)
+
+        plan = _plan(plans, "programmes")
+        assert "USING INDEX idx_programme_listing (channel_id=? AND start_epoch>? AND start_epoch<?)" in plan
+        assert "TEMP B-TREE" not in plan
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_now_and_next_seek_the_listing_index(self, test_session, channel):
+        """Test now/next each seek idx_programme_listing in start order instead of sorting."""
+        with query_plans(test_session) as plans:
+            await get_current_and_next_programmes(channel.id, 1696161600, test_session)
+
+        current, following = [plan for plan in plans if " programmes " in plan]
+        assert "USING INDEX idx_programme_listing (channel_id=? AND start_epoch<?)" in current
+        assert "USING INDEX idx_programme_listing (channel_id=? AND start_epoch>?)" in following
+        assert "TEMP B-TREE" not in current + following
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_channel_lookup_uses_source_and_xmltv_id(self, test_session, channel):
+        """Test a channel is found through its subscription and the (source_id, xmltv_id) key."""
+        with query_plans(test_session) as plans:
+            await get_channel_by_xmltv_id(channel.user_id, channel.server_id, channel.xmltv_id, test_session)
+
+        plan = _plan(plans, "channels")
+        assert "(user_id=? AND server_id=?)" in plan
+        assert "(source_id=? AND xmltv_id=?)" in plan
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_category_listing_uses_category_time_index(self, test_session, channel):
+        """Test genre listings are found in idx_programme_categories_time."""
+        with query_plans(test_session) as plans:
+            await get_programmes_by_category(channel.user_id, channel.server_id, "News", test_session)
+
+        listed = [plan for plan in plans if " programme_categories " in plan]
+        assert listed
+        for plan in listed:
+            assert "USING COVERING INDEX idx_programme_categories_time (category_id=? AND stop_epoch>?)" in plan
+            assert "SCAN programmes" not in plan
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_series_airings_use_series_index(self, test_session, channel):
+        """Test the airings of a series are found in idx_programme_series_start."""
+        with query_plans(test_session) as plans:
+            await get_series_airings(channel.user_id, "series", test_session)
+
+        assert "USING INDEX idx_programme_series_start (series_key=?)" in _plan(plans, "programmes")
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_retention_uses_start_stop_index(self, test_session, channel):
+        """Test expired programmes are found in idx_programme_start_stop_epoch."""
+        with query_plans(test_session) as plans:
+            await purge_expired_programmes(test_session)
+
+        assert "idx_programme_start_stop_epoch (start_epoch<?)" in _plan(plans, "programmes")
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_grid_looks_up_buckets(self, test_session, sqlite_only):
+        """Test a grid finds its programmes by (channel_id, bucket) equality, then by primary key."""
+        user = create_test_user(test_session)
+        server = create_test_server(test_session, owner=user)
+        test_session.commit()
+        await store_epg_stream(iter([XMLTVBatch(channels=[XMLTVChannel(id="grid.channel")], programmes=[
+            XMLTVProgramme(start="20231001100000 +0000", stop="20231001110000 +0000", channel="grid.channel")
+        ])]), user.id, server.id, test_session)
+        user_id, server_id = user.id, server.id
+
+        with query_plans(test_session) as plans:
+            await get_programme_grid(user_id, server_id, test_session, start=1696150800)
+
+        plan = _plan(plans, "programmes")
+        assert "SEARCH programme_buckets USING PRIMARY KEY (channel_id=? AND bucket=?)" in plan
+        assert "SEARCH programmes USING INTEGER PRIMARY KEY (rowid=?)" in plan
@@ -0,0 +1,88 @@
+import os
+import time
+from unittest.mock import patch
+
+import pytest
+
+from app import database
+from app.models.user import User
+from app.services import read_routing
+from app.services.config import settings
+from app.services.read_routing import USER_INFO_KEY, replica_lag, use_replica, wrote_recently
+from app.services.write_queue import run_write
+
+
+def _add_user(db, email):
+    db.add(User(email=email, hashed_password="hashed"))
+
+
+class TestReadRouting:
+    """Test cases for sending read-only requests to a replica."""
+
+    @pytest.mark.unit
+    def test_primary_without_replica(self):
+        """Test reads stay on the primary when DATABASE_READ_URL is not set."""
+        assert database.read_engine is database.engine
+        assert not use_replica("user-1")
+
+    @pytest.mark.unit
+    def test_replica_when_set(self, replica):
+        """Test reads go to the replica once one is configured."""
+        assert use_replica("user-1")
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_primary_after_write(self, test_session, replica):
+        """Test a user who just wrote reads from the primary until DATABASE_READ_AFTER_WRITE_SECONDS pass."""
+        test_session.info[USER_INFO_KEY] = "user-1"
+
+        await run_write(test_session, _add_user, "writer@example.com")
+
+        assert not use_replica("user-1")
+        assert use_replica("user-2")
+        later = time.time() + settings.DATABASE_READ_AFTER_WRITE_SECONDS + 1
+        assert not wrote_recently("user-1", now=later)
+
+    @pytest.mark.unit
+    def test_primary_while_replica_lags(self, replica):
+        """Test everyone reads from the primary while the replica is too far behind, measured once per check."""
+        with patch.object(read_routing, 'measure_lag', return_value=30.0) as measure_lag:
+            assert not use_replica("user-1")
+            assert not use_replica("user-2")
+
+        assert measure_lag.call_count == 1
+
+    @pytest.mark.unit
+    def test_primary_when_replica_unreachable(self, replica):
+        """Test a replica whose lag can't be measured isn't used."""
+        with patch.object(read_routing, 'measure_lag', side_effect=OSError("connection refused")):
+            assert replica_lag(replica) == float("inf")
+            assert not use_replica("user-1")
+
+    @pytest.mark.unit
+    def test_primary_when_redis_unreachable(self, replica):
+        """Test users read from the primary while the redis holding recent writes can't be reached."""
+        class Unreachable:
+            def get(self, key):
+                raise ConnectionError("connection refused")
+
+        with patch.object(settings, 'REDIS_URL', "redis://localhost:6379"), \
+                patch.object(read_routing, '_redis', Unreachable()):
+            assert wrote_recently("user-1")
+            assert not use_replica("user-1")
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    @pytest.mark.skipif(not os.environ.get("TEST_REDIS_URL"), reason="TEST_REDIS_URL is not set")
+    async def test_writes_shared_through_redis(self, test_session, replica):
+        """Test a write is known to other API processes through redis."""
+        test_session.info[USER_INFO_KEY] = "user-1"
+        with patch.object(settings, 'REDIS_URL', os.environ["TEST_REDIS_URL"]), \
+                patch.object(read_routing, '_redis', None):
+            await run_write(test_session, _add_user, "writer@example.com")
+
+            # Another process has its own client and nothing in _last_writes
+            with patch.object(read_routing, '_redis', None):
+                assert not read_routing._last_writes
+                assert not use_replica("user-1")
+                assert use_replica("user-2")
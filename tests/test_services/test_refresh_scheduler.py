@@ -0,0 +1,85 @@
+import datetime as dt
+
+import pytest
+
+from app.models.refresh_schedule import RefreshSchedule
+from app.services.config import settings
+from app.services.refresh_scheduler import (
+    compute_next_refresh,
+    get_refresh_schedule,
+    is_refresh_due,
+    record_refresh,
+)
+from tests.factories import create_test_user, create_test_server
+
+NOW = dt.datetime(2024, 1, 10, 12, 0, tzinfo=dt.timezone.utc)
+
+
+class TestRefreshScheduler:
+    """Test cases for adaptive EPG refresh scheduling."""
+
+    @pytest.mark.unit
+    def test_new_server_is_due(self):
+        """Test servers without a schedule are refreshed straight away."""
+        assert is_refresh_due(None, NOW) is True
+
+    @pytest.mark.unit
+    def test_long_horizon_waits_for_max_interval(self):
+        """Test a feed covering many days is not refreshed before the max interval."""
+        schedule = RefreshSchedule(horizon_end=NOW + dt.timedelta(days=10))
+
+        next_refresh = compute_next_refresh(schedule, NOW)
+
+        assert next_refresh == NOW + dt.timedelta(hours=settings.EPG_REFRESH_MAX_INTERVAL_HOURS)
+
+    @pytest.mark.unit
+    def test_short_horizon_refreshes_before_coverage_runs_out(self):
+        """Test a feed about to run out is refreshed once below the horizon threshold."""
+        schedule = RefreshSchedule(horizon_end=NOW + dt.timedelta(hours=60))
+
+        next_refresh = compute_next_refresh(schedule, NOW)
+
+        assert next_refresh == NOW + dt.timedelta(hours=60 - settings.EPG_REFRESH_MIN_HORIZON_HOURS)
+
+    @pytest.mark.unit
+    def test_expected_update_is_used(self):
+        """Test the provider's usual update interval brings the refresh forward."""
+        schedule = RefreshSchedule(
+            horizon_end=NOW + dt.timedelta(days=10),
+            last_changed=NOW - dt.timedelta(hours=2),
+            change_interval=dt.timedelta(hours=24).total_seconds(),
+        )
+
+        next_refresh = compute_next_refresh(schedule, NOW)
+
+        assert next_refresh == NOW + dt.timedelta(hours=22)
+
+    @pytest.mark.unit
+    def test_min_interval_is_respected(self):
+        """Test an expired horizon doesn't cause refreshes more often than the minimum interval."""
+        schedule = RefreshSchedule(horizon_end=NOW - dt.timedelta(hours=1))
+
+        next_refresh = compute_next_refresh(schedule, NOW)
+
+        assert next_refresh == NOW + dt.timedelta(hours=settings.EPG_REFRESH_MIN_INTERVAL_HOURS)
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_record_refresh_tracks_changes(self, test_session):
+        """Test recording refreshes learns how often the feed changes."""
+        user = create_test_user(test_session)
+        server = create_test_server(test_session, owner=user)
+        test_session.commit()
+
+        await record_refresh(user.id, server.id, {
+            "content_hash": "a", "horizon_end": NOW + dt.timedelta(days=7)}, test_session, now=NOW)
+        await record_refresh(user.id, server.id, {"content_hash": "a"}, test_session,
+                             now=NOW + dt.timedelta(hours=12))
+        schedule = await record_refresh(user.id, server.id, {
+            "content_hash": "b", "horizon_end": NOW + dt.timedelta(days=8)}, test_session,
+            now=NOW + dt.timedelta(hours=24))
+
+        schedule = await get_refresh_schedule(server.id, test_session)
+        assert schedule.content_hash == "b"
+        assert schedule.change_interval == dt.timedelta(hours=24).total_seconds()
+        assert is_refresh_due(schedule, NOW + dt.timedelta(hours=25)) is False
@@ -0,0 +1,130 @@
+import datetime as dt
+
+import pytest
+from sqlalchemy import text
+
+from app.models.channel import Channel
+from app.models.epg_source import EPGSource, EPGSourceSubscription
+from app.models.programme import Programme
+from app.services.retention import (
+    incremental_vacuum,
+    purge_expired_programmes,
+    purge_missing_channels,
+    purge_unused_sources,
+    run_retention,
+)
+from tests.factories import create_test_channel, create_test_programme, create_test_server, create_test_user
+
+NOW = dt.datetime(2023, 10, 10, 12, 0, 0, tzinfo=dt.timezone.utc)
+
+
+def _epoch(hours_ago):
+    return int((NOW - dt.timedelta(hours=hours_ago)).timestamp())
+
+
+def _channel(session):
+    user = create_test_user(session)
+    return create_test_channel(session, user=user, server=create_test_server(session, owner=user))
+
+
+class TestRetention:
+    """Test cases for the EPG retention job."""
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_purge_expired_programmes(self, test_session):
+        """Test only programmes that ended before the look-back window are deleted."""
+        channel = _channel(test_session)
+        for hours_ago in (72, 50, 30, 25):
+            create_test_programme(test_session, channel=channel,
+                                  start_epoch=_epoch(hours_ago + 1), stop_epoch=_epoch(hours_ago))
+        create_test_programme(test_session, channel=channel, start_epoch=_epoch(25), stop_epoch=_epoch(23))
+        create_test_programme(test_session, channel=channel, start_epoch=_epoch(1), stop_epoch=_epoch(-1))
+
+        deleted = await purge_expired_programmes(test_session, now=NOW, batch_size=2)
+
+        assert deleted == 4
+        assert sorted(p.stop_epoch for p in test_session.query(Programme).all()) == [_epoch(23), _epoch(-1)]
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_purge_missing_channels(self, test_session):
+        """Test channels dropped from their feed are deleted once the grace period has passed."""
+        user = create_test_user(test_session)
+        source = EPGSource(url="http://example.com/epg.xml")
+        stale_source = EPGSource(url="http://example.com/stale.xml")
+        test_session.add_all([source, stale_source])
+        test_session.commit()
+
+        def channel(xmltv_id, channel_source, days_ago):
+            return create_test_channel(test_session, user=user, server=None, xmltv_id=xmltv_id,
+                                       source=channel_source, last_seen_at=NOW - dt.timedelta(days=days_ago))
+
+        current = channel("current", source, 0)
+        gone = channel("gone", source, 10)
+        channel("recently.gone", source, 2)
+        # The only channel of a feed that stopped refreshing is still its latest
+        channel("stale", stale_source, 10)
+        create_test_programme(test_session, channel=gone)
+        create_test_programme(test_session, channel=current)
+
+        deleted = await purge_missing_channels(test_session, now=NOW)
+
+        assert deleted == 1
+        remaining = {c.xmltv_id for c in test_session.query(Channel).all()}
+        assert remaining == {"current", "recently.gone", "stale"}
+        assert [p.channel_id for p in test_session.query(Programme).all()] == [current.id]
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_purge_unused_sources(self, test_session):
+        """Test sources without subscribers are deleted with their guide."""
+        user = create_test_user(test_session)
+        server = create_test_server(test_session, owner=user)
+        used = EPGSource(url="http://example.com/used.xml")
+        unused = EPGSource(url="http://example.com/unused.xml")
+        test_session.add_all([used, unused])
+        test_session.flush()
+        test_session.add(EPGSourceSubscription(user_id=user.id, server_id=server.id, source_id=used.id))
+        test_session.commit()
+        kept = create_test_channel(test_session, user=user, server=None, source=used)
+        dropped = create_test_channel(test_session, user=user, server=None, source=unused)
+        create_test_programme(test_session, channel=kept)
+        create_test_programme(test_session, channel=dropped)
+
+        assert await purge_unused_sources(test_session) == 1
+
+        assert [s.url for s in test_session.query(EPGSource).all()] == ["http://example.com/used.xml"]
+        assert [c.id for c in test_session.query(Channel).all()] == [kept.id]
+        assert test_session.query(Programme).count() == 1
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    @pytest.mark.usefixtures("sqlite_only")
+    async def test_retention_shrinks_database(self, test_session):
+        """Test deleted pages are handed back by the incremental vacuum."""
+        assert test_session.execute(text("PRAGMA auto_vacuum")).scalar() == 2
+
+        channel = _channel(test_session)
+        test_session.add_all([
+            Programme(channel=channel, start_time=str(i), start_epoch=_epoch(100), stop_epoch=_epoch(99),
+                      descriptions="x" * 500)
+            for i in range(500)
+        ])
+        test_session.commit()
+        pages_before = test_session.execute(text("PRAGMA page_count")).scalar()
+
+        result = await run_retention(test_session, now=NOW)
+
+        assert result["programmes_deleted"] == 500
+        assert result["pages_freed"] > 0
+        assert test_session.execute(text("PRAGMA page_count")).scalar() < pages_before
+
+    @pytest.mark.unit
+    @pytest.mark.usefixtures("sqlite_only")
+    def test_incremental_vacuum_needs_sqlite_mode(self, test_session):
+        """Test nothing is done when the database wasn't created with incremental auto_vacuum."""
+        test_session.execute(text("PRAGMA auto_vacuum=NONE"))
+        test_session.execute(text("VACUUM"))
+
+        assert incremental_vacuum(test_session) == 0
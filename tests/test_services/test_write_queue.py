@@ -0,0 +1,208 @@
+import threading
+from unittest.mock import patch
+
+import pytest
+import sqlalchemy as sa
+
+from app.models.channel import Channel
+from app.models.epg_source import EPGSource
+from app.models.programme import Programme
+from app.models.user import User
+from app.services import write_queue
+from app.services.config import settings
+from app.services.data import epg_data_services
+from app.services.data.epg_data_services import delete_epg_data_for_user_server, store_epg_stream
+from app.services.retention import purge_expired_programmes
+from app.services.write_queue import (
+    BULK, INTERACTIVE, SQLiteWriter, get_writer, run_write, start_writer, stop_writer
+)
+from app.utils.iptv_parser_ng import Batch as XMLTVBatch, Channel as XMLTVChannel, Programme as XMLTVProgramme
+from tests.factories import create_test_channel, create_test_programme, create_test_server, create_test_user
+
+
+@pytest.fixture
+def writer(test_engine, sqlite_only):
+    with patch.object(settings, 'SQLITE_SINGLE_WRITER', True):
+        writer = start_writer(test_engine)
+    yield writer
+    stop_writer(test_engine)
+
+
+def _add_user(db, email):
+    db.add(User(email=email, hashed_password="hashed"))
+    db.flush()
+    return threading.current_thread().name
+
+
+def _interleave(writer, module, name, order):
+    """Record the calls of a bulk job, the first one queueing an interactive write"""
+    job = getattr(module, name)
+
+    def chunk(*args, **kwargs):
+        if name not in order:
+            writer.submit(lambda db: order.append("interactive"), priority=INTERACTIVE)
+        order.append(name)
+        return job(*args, **kwargs)
+
+    return patch.object(module, name, side_effect=chunk)
+
+
+def _feed(titles):
+    return iter([XMLTVBatch(channels=[XMLTVChannel(id="chunked.channel")], programmes=[
+        XMLTVProgramme(start=f"2023100110{i:02d}00 +0000", channel="chunked.channel",
+                       titles=[{"lang": "en", "text": title}])
+        for i, title in enumerate(titles)
+    ])])
+
+
+class TestWriteQueue:
+    """Test cases for the single SQLite writer."""
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_run_write_inline_without_writer(self, test_session):
+        """Test writes run on the caller's session when the engine has no writer."""
+        assert get_writer(test_session) is None
+
+        thread = await run_write(test_session, _add_user, "inline@example.com")
+
+        assert thread == threading.current_thread().name
+        assert test_session.query(User).filter(User.email == "inline@example.com").count() == 1
+
+    @pytest.mark.unit
+    def test_writer_disabled_by_setting(self, test_engine):
+        """Test no writer is started when SQLITE_SINGLE_WRITER is off."""
+        with patch.object(settings, 'SQLITE_SINGLE_WRITER', False):
+            assert start_writer(test_engine) is None
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_run_write_on_writer_thread(self, test_session, writer):
+        """Test jobs run and are committed on the writer thread."""
+        assert get_writer(test_session) is writer
+
+        thread = await run_write(test_session, _add_user, "writer@example.com")
+
+        assert thread == "sqlite-writer"
+        assert test_session.query(User).filter(User.email == "writer@example.com").count() == 1
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_failed_job_rolled_back(self, test_session, writer):
+        """Test a job that raises is rolled back and its error reaches the caller."""
+        def failing(db):
+            _add_user(db, "failed@example.com")
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError):
+            await run_write(test_session, failing)
+
+        assert test_session.query(User).filter(User.email == "failed@example.com").count() == 0
+
+    @pytest.mark.unit
+    def test_writer_reconnects_after_connection_failure(self, test_engine, sqlite_only):
+        """Test jobs queued while the writer's connection fails get the error, and later jobs run on a new one."""
+        connect = test_engine.connect
+        submitted = threading.Event()
+        failed = threading.Event()
+        reconnected = threading.Event()
+
+        def flaky_connect():
+            if not failed.is_set():
+                submitted.wait(5)
+                failed.set()
+                raise sa.exc.OperationalError("connect", {}, Exception("unable to open database file"))
+            reconnected.set()
+            return connect()
+
+        writer = SQLiteWriter(test_engine)
+        with patch.object(test_engine, 'connect', side_effect=flaky_connect), \
+                patch.object(write_queue, 'RECONNECT_SECONDS', 0):
+            writer.start()
+            queued = writer.submit(lambda db: "lost")
+            submitted.set()
+            with pytest.raises(sa.exc.OperationalError):
+                queued.result(5)
+
+            reconnected.wait(5)
+            assert writer.submit(lambda db: "ran").result(5) == "ran"
+            writer.stop(5)
+
+    @pytest.mark.unit
+    def test_stopped_writer_refuses_jobs(self, test_engine, sqlite_only):
+        """Test jobs submitted to a writer whose thread is gone fail right away instead of waiting forever."""
+        writer = SQLiteWriter(test_engine)
+        writer.start()
+        writer.stop(5)
+
+        with pytest.raises(RuntimeError):
+            writer.submit(lambda db: None)
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_interactive_jobs_run_before_queued_bulk_jobs(self, writer):
+        """Test an interactive write skips ahead of bulk writes already waiting."""
+        release = threading.Event()
+        order = []
+
+        blocker = writer.submit(lambda db: release.wait(5), priority=BULK)
+        bulk = [writer.submit(lambda db, i=i: order.append(f"bulk-{i}"), priority=BULK) for i in range(2)]
+        interactive = writer.submit(lambda db: order.append("interactive"), priority=INTERACTIVE)
+        release.set()
+
+        for future in [blocker, *bulk, interactive]:
+            future.result(5)
+        assert order == ["interactive", "bulk-0", "bulk-1"]
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_retention_through_writer(self, test_session, writer):
+        """Test batched retention deletes run through the writer and are seen by the caller."""
+        user = create_test_user(test_session)
+        channel = create_test_channel(test_session, user=user, server=create_test_server(test_session, owner=user))
+        for _ in range(5):
+            create_test_programme(test_session, channel=channel, start_epoch=0, stop_epoch=1)
+
+        assert await purge_expired_programmes(test_session, batch_size=2) == 5
+        assert test_session.query(Programme).count() == 0
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_interactive_write_between_publish_chunks(self, test_session, writer):
+        """Test an import is published in bounded chunks an interactive write gets in between."""
+        user = create_test_user(test_session)
+        server = create_test_server(test_session, owner=user)
+        test_session.commit()
+        await store_epg_stream(_feed(["Old"] * 6), user.id, server.id, test_session, chunk_size=2)
+
+        order = []
+        finish_import = epg_data_services._finish_import
+        with _interleave(writer, epg_data_services, '_add_staged_programmes', order), \
+                patch.object(epg_data_services, '_finish_import',
+                             side_effect=lambda *args: order.append("publish") or finish_import(*args)):
+            result = await store_epg_stream(_feed(["New"] * 6), user.id, server.id, test_session, chunk_size=2)
+
+        assert result["updated"] == 6
+        assert order[:2] == ["_add_staged_programmes", "interactive"]
+        assert order.count("_add_staged_programmes") >= 3
+        assert order[-1] == "publish"
+        assert {p.title for p in test_session.query(Programme).all()} == {"New"}
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_interactive_write_between_unsubscribe_chunks(self, test_session, writer):
+        """Test an unused source's guide is deleted in bounded chunks an interactive write gets in between."""
+        user = create_test_user(test_session)
+        server = create_test_server(test_session, owner=user)
+        test_session.commit()
+        await store_epg_stream(_feed(["Old"] * 6), user.id, server.id, test_session)
+
+        order = []
+        with _interleave(writer, write_queue, '_delete_batch', order):
+            await delete_epg_data_for_user_server(user.id, server.id, test_session, batch_size=2)
+
+        assert order[:2] == ["_delete_batch", "interactive"]
+        assert order.count("_delete_batch") > 3
+        assert test_session.query(Programme).count() == 0
+        assert test_session.query(Channel).count() == 0
+        assert test_session.query(EPGSource).count() == 0
@@ -0,0 +1,71 @@
+import datetime as dt
+import pytest
+import sqlalchemy as sa
+from unittest.mock import MagicMock, patch
+from sqlalchemy.dialects import postgresql
+
+from app.models.epg_import import epg_import_programmes
+from app.services.config import settings
+from app.utils.bulk_load import bulk_insert, copy_rows, copy_text, insert_rows, supports_copy
+
+
+class TestBulkLoad:
+    """Test cases for bulk row loading."""
+
+    @pytest.mark.unit
+    def test_copy_text_escapes_values(self):
+        """Test rows are encoded in PostgreSQL's COPY text format."""
+        rows = [(
+            "tab\there\nnew\\line",
+            None,
+            True,
+            b"\x01\xff",
+            dt.datetime(2023, 10, 1, 12, 0, tzinfo=dt.timezone.utc),
+            42,
+        )]
+
+        assert copy_text(rows) == (
+            "tab\\there\\nnew\\\\line\t\\N\tt\t\\\\x01ff\t2023-10-01T12:00:00+00:00\t42\n"
+        )
+
+    @pytest.mark.unit
+    def test_copy_rows_with_psycopg2(self):
+        """Test rows are streamed through copy_expert on the session's connection."""
+        cursor = MagicMock(spec=["copy_expert", "close"])
+        db = MagicMock()
+        db.get_bind.return_value.dialect = postgresql.dialect()
+        db.connection.return_value.connection.driver_connection.cursor.return_value = cursor
+
+        copy_rows(db, epg_import_programmes, ("import_id", "action", "programme_id"), [("abc", "keep", 7)])
+
+        sql, buffer = cursor.copy_expert.call_args.args
+        assert sql == "COPY epg_import_programmes (import_id, action, programme_id) FROM STDIN"
+        assert buffer.getvalue() == "abc\tkeep\t7\n"
+        cursor.close.assert_called_once()
+
+    @pytest.mark.unit
+    def test_bulk_insert_falls_back_to_insert(self, test_session):
+        """Test SQLite, or COPY being switched off, uses a plain executemany INSERT."""
+        columns = ("import_id", "action", "programme_id")
+        rows = [("abc", "keep", i) for i in range(3)]
+        db = MagicMock()
+        db.get_bind.return_value.dialect = postgresql.dialect()
+        with patch.object(settings, 'DATABASE_USE_COPY', False):
+            assert not supports_copy(db)
+
+        bulk_insert(test_session, epg_import_programmes, columns, rows)
+        bulk_insert(test_session, epg_import_programmes, columns, [])
+
+        assert test_session.execute(sa.select(sa.func.count()).select_from(epg_import_programmes)).scalar() == 3
+
+    @pytest.mark.unit
+    def test_insert_rows_orders_and_converts_values(self, test_session):
+        """Test tuples in any column order are inserted with their types' bind processing."""
+        created = dt.datetime(2023, 10, 1, 12, 30)
+        insert_rows(test_session, epg_import_programmes, ("date_created", "new", "programme_id", "action", "import_id"),
+                    [(created, True, 1, "insert", "abc"), (None, None, 2, "keep", "abc")])
+
+        rows = test_session.execute(sa.select(
+            epg_import_programmes.c.programme_id, epg_import_programmes.c.date_created, epg_import_programmes.c.new
+        ).order_by(epg_import_programmes.c.programme_id)).all()
+        assert [tuple(row) for row in rows] == [(1, created, True), (2, None, None)]
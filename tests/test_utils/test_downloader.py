@@ -0,0 +1,163 @@
+import json
+import os
+from unittest.mock import MagicMock, patch
+
+import pytest
+import requests
+
+from app.utils.downloader import download_file, IncompleteDownloadError
+
+
+def _response(status_code=200, body=b"", headers=None, fail_after=None):
+    """Build a fake streaming response, optionally dying after `fail_after` chunks."""
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = headers or {}
+    response.__enter__.return_value = response
+
+    def iter_content(chunk_size):
+        chunks = [body[i:i + 4] for i in range(0, len(body), 4)]
+        for index, chunk in enumerate(chunks):
+            if fail_after is not None and index == fail_after:
+                raise requests.ConnectionError("connection reset")
+            yield chunk
+
+    response.iter_content.side_effect = iter_content
+    return response
+
+
+class TestDownloader:
+    """Test cases for resumable downloads."""
+
+    @pytest.mark.unit
+    def test_full_download(self, tmp_path):
+        """Test a clean download ends up at the destination with no leftovers."""
+        dest = str(tmp_path / "epg.xml")
+        body = b"<tv></tv>"
+
+        with patch('app.utils.downloader.requests.get') as mock_get:
+            mock_get.return_value = _response(body=body, headers={"Content-Length": str(len(body))})
+            download_file("http://example.com/epg.xml", dest)
+
+        with open(dest, 'rb') as file:
+            assert file.read() == body
+        assert not os.path.exists(f"{dest}.partial")
+        assert not os.path.exists(f"{dest}.partial.json")
+
+    @pytest.mark.unit
+    def test_interrupted_download_keeps_partial(self, tmp_path):
+        """Test an interrupted download leaves the partial file and validators behind."""
+        dest = str(tmp_path / "epg.xml")
+        body = b"0123456789abcdef"
+
+        with patch('app.utils.downloader.requests.get') as mock_get:
+            mock_get.return_value = _response(
+                body=body, fail_after=2,
+                headers={"ETag": '"v1"', "Accept-Ranges": "bytes", "Content-Length": str(len(body))})
+            with pytest.raises(requests.ConnectionError):
+                download_file("http://example.com/epg.xml", dest)
+
+        assert not os.path.exists(dest)
+        assert os.path.getsize(f"{dest}.partial") == 8
+        with open(f"{dest}.partial.json") as file:
+            meta = json.load(file)
+        assert meta["etag"] == '"v1"'
+        assert meta["accept_ranges"] is True
+
+    @pytest.mark.unit
+    def test_resume_with_range_request(self, tmp_path):
+        """Test the next attempt only fetches the missing bytes."""
+        dest = str(tmp_path / "epg.xml")
+        body = b"0123456789abcdef"
+        headers = {"ETag": '"v1"', "Accept-Ranges": "bytes", "Content-Length": str(len(body))}
+
+        with patch('app.utils.downloader.requests.get') as mock_get:
+            mock_get.return_value = _response(body=body, headers=headers, fail_after=2)
+            with pytest.raises(requests.ConnectionError):
+                download_file("http://example.com/epg.xml", dest)
+
+            mock_get.return_value = _response(
+                status_code=206, body=body[8:],
+                headers={"ETag": '"v1"', "Content-Range": "bytes 8-15/16", "Content-Length": "8"})
+            download_file("http://example.com/epg.xml", dest)
+
+            request_headers = mock_get.call_args.kwargs["headers"]
+            assert request_headers["Range"] == "bytes=8-"
+            assert request_headers["If-Range"] == '"v1"'
+
+        with open(dest, 'rb') as file:
+            assert file.read() == body
+
+    @pytest.mark.unit
+    def test_changed_file_restarts_download(self, tmp_path):
+        """Test a full 200 response to a range request replaces the partial data."""
+        dest = str(tmp_path / "epg.xml")
+        with open(f"{dest}.partial", 'wb') as file:
+            file.write(b"stale")
+        with open(f"{dest}.partial.json", 'w') as file:
+            json.dump({"url": "http://example.com/epg.xml", "etag": '"v1"', "accept_ranges": True}, file)
+
+        with patch('app.utils.downloader.requests.get') as mock_get:
+            mock_get.return_value = _response(body=b"fresh data", headers={"ETag": '"v2"'})
+            download_file("http://example.com/epg.xml", dest)
+
+        with open(dest, 'rb') as file:
+            assert file.read() == b"fresh data"
+
+    @pytest.mark.unit
+    def test_no_range_without_validator(self, tmp_path):
+        """Test a partial file without validators is not resumed."""
+        dest = str(tmp_path / "epg.xml")
+        with open(f"{dest}.partial", 'wb') as file:
+            file.write(b"stale")
+
+        with patch('app.utils.downloader.requests.get') as mock_get:
+            mock_get.return_value = _response(body=b"fresh data")
+            download_file("http://example.com/epg.xml", dest)
+
+            assert "Range" not in mock_get.call_args.kwargs["headers"]
+
+        with open(dest, 'rb') as file:
+            assert file.read() == b"fresh data"
+
+    @pytest.mark.unit
+    def test_short_body_is_incomplete(self, tmp_path):
+        """Test a body shorter than Content-Length is not moved into place."""
+        dest = str(tmp_path / "epg.xml")
+
+        with patch('app.utils.downloader.requests.get') as mock_get:
+            mock_get.return_value = _response(body=b"short", headers={"Content-Length": "100"})
+            with pytest.raises(IncompleteDownloadError):
+                download_file("http://example.com/epg.xml", dest)
+
+        assert not os.path.exists(dest)
+        assert os.path.exists(f"{dest}.partial")
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("stale", [
+        _response(status_code=416, headers={"Content-Range": "bytes */10"}),
+        _response(status_code=206, body=b"6789", headers={"ETag": '"v1"', "Content-Range": "bytes 6-9/10"}),
+    ], ids=["range-not-satisfiable", "content-range-mismatch"])
+    def test_unusable_range_restarts_download(self, tmp_path, stale):
+        """Test a partial file the server can't resume is discarded and the file downloaded in full."""
+        dest = str(tmp_path / "epg.xml")
+        with open(f"{dest}.partial", 'wb') as file:
+            file.write(b"0123456789ab")
+        with open(f"{dest}.partial.json", 'w') as file:
+            json.dump({"url": "http://example.com/epg.xml", "etag": '"v1"', "accept_ranges": True}, file)
+
+        responses = [stale, _response(body=b"0123456789", headers={"Content-Length": "10"})]
+
+        def get(*args, **kwargs):
+            # The retry only starts once the unusable response is closed
+            assert stale.__exit__.called == (len(responses) == 1)
+            return responses.pop(0)
+
+        with patch('app.utils.downloader.requests.get', side_effect=get) as mock_get:
+            download_file("http://example.com/epg.xml", dest)
+
+            assert "Range" not in mock_get.call_args.kwargs["headers"]
+
+        with open(dest, 'rb') as file:
+            assert file.read() == b"0123456789"
+        assert not os.path.exists(f"{dest}.partial.json")
@@ -2,6 +2,7 @@ import pytest
 from unittest.mock import patch, MagicMock, mock_open, AsyncMock
 import os
 import tempfile
+from datetime import datetime, timezone
 from app.utils.epg_parser import EPGParser
 
 
@@ -61,39 +62,70 @@ class TestEPGParser:
 
     @pytest.mark.unit
     @pytest.mark.asyncio
-    @patch('app.utils.epg_parser.requests.get')
-    @patch('app.utils.epg_parser.parse_xmltv_file')
-    @patch('app.utils.epg_parser.store_epg_channels')
+    @patch('app.utils.epg_parser.mark_used')
+    @patch('app.utils.epg_parser.download_file')
+    @patch('app.utils.epg_parser.iter_xmltv_file')
+    @patch('app.utils.epg_parser.store_epg_stream')
+    @patch('app.utils.epg_parser._file_hash')
     @patch('app.utils.epg_parser.is_file_older_cache_time')
     @patch('os.path.isfile')
-    async def test_cache_epg_downloads_when_cache_old(self, mock_isfile, mock_is_old, 
-                                                     mock_store_channels, mock_parse_file, 
-                                                     mock_requests_get, test_session):
+    async def test_cache_epg_downloads_when_cache_old(self, mock_isfile, mock_is_old, mock_file_hash,
+                                                     mock_store_channels, mock_parse_file,
+                                                     mock_download, mock_mark_used, test_session):
         """Test EPG caching downloads when cache is old or doesn't exist."""
         # Setup mocks
         mock_isfile.return_value = True
         mock_is_old.return_value = True  # Cache is old
-        mock_requests_get.return_value.content = b"<tv></tv>"
         mock_parse_file.return_value = []
         mock_store_channels.return_value = {'channels': 0, 'programmes': 0}
-        
+        mock_file_hash.return_value = "new-hash"
+
         parser = EPGParser(
             url="http://example.com/epg.xml",
             server_id=123,
             user_id="test-user-456"
         )
-        
-        with patch('builtins.open', mock_open()) as mock_file:
-            await parser.cache_epg(test_session)
-            
-            # Should download EPG
-            mock_requests_get.assert_called_once_with("http://example.com/epg.xml", timeout=30)
-            # Should write to cache file
-            mock_file.assert_called_once()
-            # Should parse the file
-            mock_parse_file.assert_called_once()
-            # Should store in database
-            mock_store_channels.assert_called_once()
+
+        result = await parser.cache_epg(test_session, previous_hash="old-hash")
+        assert result["changed"] is True
+
+        # Should download EPG to the cache file
+        mock_download.assert_called_once_with("http://example.com/epg.xml", parser._cache_file, timeout=30)
+        # Should parse the file
+        mock_parse_file.assert_called_once()
+        # Should store in database
+        mock_store_channels.assert_called_once()
+        # The import is a use of the cached feed
+        mock_mark_used.assert_called_once_with(os.path.dirname(parser._cache_file))
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    @patch('app.utils.epg_parser.mark_used')
+    @patch('app.utils.epg_parser.download_file')
+    @patch('app.utils.epg_parser.iter_xmltv_file')
+    @patch('app.utils.epg_parser._file_hash')
+    @patch('app.utils.epg_parser.is_file_older_cache_time')
+    async def test_cache_epg_skips_import_when_unchanged(self, mock_is_old, mock_file_hash,
+                                                        mock_parse_file, mock_download, mock_mark_used,
+                                                        test_session):
+        """Test an identical download is not parsed or stored again, and keeps the last import's horizon."""
+        mock_is_old.return_value = True
+        mock_file_hash.return_value = "same-hash"
+
+        parser = EPGParser(
+            url="http://example.com/epg.xml",
+            server_id=123,
+            user_id="test-user-456"
+        )
+
+        horizon_end = datetime(2023, 10, 8, tzinfo=timezone.utc)
+        result = await parser.cache_epg(test_session, previous_hash="same-hash", previous_horizon_end=horizon_end)
+
+        assert result == {"content_hash": "same-hash", "changed": False, "horizon_end": horizon_end}
+        mock_download.assert_called_once()
+        mock_parse_file.assert_not_called()
+        # A refresh alone doesn't make the cached feed recently used
+        mock_mark_used.assert_not_called()
 
     @pytest.mark.unit
     @pytest.mark.asyncio
@@ -111,19 +143,19 @@ class TestEPGParser:
             user_id="test-user-456"
         )
         
-        with patch('app.utils.epg_parser.requests.get') as mock_requests_get:
+        with patch('app.utils.epg_parser.download_file') as mock_download:
             await parser.cache_epg(test_session)
             
             # Should not download EPG
-            mock_requests_get.assert_not_called()
+            mock_download.assert_not_called()
 
     @pytest.mark.unit
     @pytest.mark.asyncio
-    @patch('app.utils.epg_parser.requests.get')
-    async def test_cache_epg_handles_download_error(self, mock_requests_get, test_session):
+    @patch('app.utils.epg_parser.download_file')
+    async def test_cache_epg_handles_download_error(self, mock_download, test_session):
         """Test EPG caching handles download errors gracefully."""
         # Setup mock to raise exception
-        mock_requests_get.side_effect = Exception("Network error")
+        mock_download.side_effect = Exception("Network error")
         
         parser = EPGParser(
             url="http://example.com/epg.xml",
@@ -136,7 +168,7 @@ class TestEPGParser:
             await parser.cache_epg(test_session)
             
             # Verify download was attempted
-            mock_requests_get.assert_called_once()
+            mock_download.assert_called_once()
 
     @pytest.mark.unit
     @pytest.mark.asyncio
@@ -0,0 +1,47 @@
+import pytest
+
+from app.utils.episode_nums import parse_onscreen, parse_xmltv_ns, season_episode
+
+
+class TestEpisodeNums:
+    """Test cases for parsing XMLTV episode numbers."""
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("text,expected", [
+        ("1.4.0/1", (2, 5)),
+        ("0/3.11/12.", (1, 12)),
+        (".4.", (None, 5)),
+        ("2..", (3, None)),
+        ("", (None, None)),
+        ("garbage", (None, None)),
+    ])
+    def test_parse_xmltv_ns(self, text, expected):
+        """Test zero-based xmltv_ns parts become one-based season and episode."""
+        assert parse_xmltv_ns(text) == expected
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("text,expected", [
+        ("S02E05", (2, 5)),
+        ("s2 e5", (2, 5)),
+        ("Season 2, Episode 5", (2, 5)),
+        ("2x05", (2, 5)),
+        ("Ep. 7", (None, 7)),
+        ("Live", (None, None)),
+    ])
+    def test_parse_onscreen(self, text, expected):
+        """Test the common onscreen spellings."""
+        assert parse_onscreen(text) == expected
+
+    @pytest.mark.unit
+    def test_season_episode_prefers_xmltv_ns(self):
+        """Test xmltv_ns wins, onscreen is the fallback and other systems are ignored."""
+        assert season_episode([
+            {"system": "onscreen", "text": "S09E09"},
+            {"system": "xmltv_ns", "text": "0.1.0/1"},
+        ]) == (1, 2)
+        assert season_episode([
+            {"system": "xmltv_ns", "text": "."},
+            {"system": "onscreen", "text": "S3E4"},
+        ]) == (3, 4)
+        assert season_episode([{"system": "dd_progid", "text": "EP01234567.0001"}]) == (None, None)
+        assert season_episode(None) == (None, None)
@@ -150,4 +150,26 @@ class TestXMLTVParser:
         assert "actor" in programme.credits
         assert "writer" in programme.credits
         assert len(programme.credits["actor"]) == 2
-        assert programme.credits["actor"][0]["role"] == "Main Character"
\ No newline at end of file
+        assert programme.credits["actor"][0]["role"] == "Main Character"
+
+    @pytest.mark.unit
+    def test_iter_file_yields_batches(self, tmp_path):
+        """Test the streaming parser yields bounded batches covering the whole feed."""
+        programmes = "".join(
+            f'<programme start="2023100112{i:02d}00 +0000" channel="one"><title>Show {i}</title></programme>'
+            for i in range(5)
+        )
+        xml_file = tmp_path / "epg.xml"
+        xml_file.write_text(
+            '<tv><channel id="one"><display-name>One</display-name></channel>'
+            f'{programmes}<programme start="20231001130000 +0000" channel="two"/></tv>'
+        )
+
+        batches = list(XMLTVParser().iter_file(str(xml_file), batch_size=3))
+
+        assert [len(batch.channels) + len(batch.programmes) for batch in batches] == [3, 3, 1]
+        assert batches[0].channels[0].display_names[0]["text"] == "One"
+        assert batches[0].channels[0].programmes == []
+        all_programmes = [p for batch in batches for p in batch.programmes]
+        assert [p.titles[0]["text"] for p in all_programmes[:5]] == [f"Show {i}" for i in range(5)]
+        assert all_programmes[5].channel == "two"
@@ -0,0 +1,29 @@
+import json
+import pytest
+from unittest.mock import patch
+
+from app.utils import json_codec
+from app.utils.json_codec import dumps, dumps_field
+
+
+class TestJsonCodec:
+    """Test cases for JSON serialization of stored fields."""
+
+    @pytest.mark.unit
+    def test_fallback_matches_orjson(self):
+        """Test both encoders produce the same text, so content hashes agree across nodes."""
+        value = [{"text": "Café \"quoted\"\n", "lang": "fr", "rating": 4.5, "new": True, "icon": None}]
+
+        with patch.object(json_codec, "orjson", None):
+            fallback = dumps(value)
+
+        assert fallback == dumps(value)
+        assert json.loads(fallback) == value
+
+    @pytest.mark.unit
+    def test_dumps_field(self):
+        """Test None stays NULL and empty containers skip the encoder."""
+        assert dumps_field(None) is None
+        assert dumps_field([]) == "[]"
+        assert dumps_field({}) == "{}"
+        assert dumps_field([{"text": "News"}]) == '[{"text":"News"}]'
@@ -3,7 +3,8 @@ from unittest.mock import patch, MagicMock
 import os
 import tempfile
 import time
-from app.utils.time_utils import is_file_older_cache_time
+from datetime import datetime, timezone
+from app.utils.time_utils import is_file_older_cache_time, parse_xmltv_time, to_epoch, xmltv_to_epoch
 
 
 class TestTimeUtils:
@@ -89,4 +90,40 @@ class TestTimeUtils:
             assert result is True
         except OSError:
             # Or it might propagate the exception
-            assert True
\ No newline at end of file
+            assert True
+
+    @pytest.mark.unit
+    def test_parse_xmltv_time_with_offset(self):
+        """Test XMLTV timestamps are normalised to UTC."""
+        parsed = parse_xmltv_time("20231001120000 +0100")
+        assert parsed == datetime(2023, 10, 1, 11, 0, 0, tzinfo=timezone.utc)
+
+        parsed = parse_xmltv_time("20231001120000 -0530")
+        assert parsed == datetime(2023, 10, 1, 17, 30, 0, tzinfo=timezone.utc)
+
+    @pytest.mark.unit
+    def test_parse_xmltv_time_without_offset(self):
+        """Test timestamps without an offset or seconds are treated as UTC."""
+        assert parse_xmltv_time("202310011200") == datetime(2023, 10, 1, 12, 0, 0, tzinfo=timezone.utc)
+
+    @pytest.mark.unit
+    def test_parse_xmltv_time_invalid(self):
+        """Test invalid values return None."""
+        assert parse_xmltv_time(None) is None
+        assert parse_xmltv_time("") is None
+        assert parse_xmltv_time("not a time") is None
+
+    @pytest.mark.unit
+    def test_xmltv_to_epoch(self):
+        """Test XMLTV timestamps with different offsets map to the same epoch."""
+        assert xmltv_to_epoch("20231001120000 +0100") == xmltv_to_epoch("20231001110000 +0000") == 1696158000
+        assert xmltv_to_epoch("garbage") is None
+
+    @pytest.mark.unit
+    def test_to_epoch_accepts_several_types(self):
+        """Test epoch seconds, datetimes and XMLTV strings are all accepted."""
+        assert to_epoch(1696158000) == 1696158000
+        assert to_epoch(datetime(2023, 10, 1, 11, 0, 0, tzinfo=timezone.utc)) == 1696158000
+        assert to_epoch(datetime(2023, 10, 1, 11, 0, 0)) == 1696158000
+        assert to_epoch("20231001110000 +0000") == 1696158000
+        assert to_epoch(None) is None